@@ -0,0 +1,329 @@
+"""Transcription service for many concurrent audio streams on one machine.
+
+Clients connect over a WebSocket (TCP or a Unix socket) and send binary frames
+of 16 kHz mono int16 PCM. Each stream is cut into utterance chunks at pauses
+(or every ``max_chunk_s``) by an energy VAD, and silence never reaches the
+model. A scheduler gathers chunks from all streams into batches and hands each
+batch to a pool of worker processes, each holding its own model. Workers decode
+a batch with one batched encoder/decoder call and fall back to one
+``transcribe`` call per chunk if that fails.
+
+Replies are JSON: ``{"type": "transcript", "text", "start_s", "end_s",
+"latency_ms"}``, where latency runs from the end of the chunk to its text.
+Sending the text message ``{"type": "flush"}`` cuts the pending chunk early;
+``{"type": "stats"}`` is answered with the scheduler's batch and RTF metrics.
+
+    python asr_service.py --port 8766 --workers 2 --threads 2 --model small
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import time
+
+import numpy as np
+import websockets
+
+from vad import block_rms
+
+SAMPLE_RATE = 16000
+
+# Per worker process: the model, its tokenizer and the spoken language
+_model = None
+_tokenizer = None
+_language = None
+
+
+def _init_worker(model_size, threads, language):
+    global _model, _tokenizer, _language
+    from faster_whisper import WhisperModel
+    from faster_whisper.tokenizer import Tokenizer
+
+    _model = WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=threads)
+    _tokenizer = Tokenizer(_model.hf_tokenizer, _model.model.is_multilingual,
+                           task="transcribe", language=language)
+    _language = language
+
+
+def _decode_batched(chunks):
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.transcribe import get_suppressed_tokens
+
+    features = np.stack([pad_or_trim(_model.feature_extractor(c)[..., :-1]) for c in chunks])
+    prompt = _model.get_prompt(_tokenizer, previous_tokens=[], without_timestamps=True)
+    results = _model.model.generate(
+        _model.encode(features),
+        [list(prompt) for _ in chunks],
+        beam_size=1,
+        max_length=_model.max_length,
+        suppress_blank=True,
+        suppress_tokens=get_suppressed_tokens(_tokenizer, [-1]),
+    )
+    return [_tokenizer.decode(r.sequences_ids[0]).strip() for r in results]
+
+
+def transcribe_batch(chunks):
+    """Worker entry point: text for each int16 chunk, plus the seconds spent decoding."""
+    start = time.perf_counter()
+    chunks = [c.astype(np.float32) / 32768 for c in chunks]
+    try:
+        texts = _decode_batched(chunks)
+    except Exception:
+        texts = []
+        for chunk in chunks:
+            segments, _ = _model.transcribe(chunk, beam_size=1, language=_language)
+            texts.append("".join(s.text for s in segments).strip())
+    return texts, time.perf_counter() - start
+
+
+class BatchScheduler:
+    """Groups chunks from all streams into batches for a pool of model processes.
+
+    A batch goes out as soon as a worker is free; while every worker is busy,
+    new chunks accumulate, so batches grow with load and stay at one chunk when
+    the service is idle. ``max_wait_ms`` lets a free worker wait briefly for
+    company.
+    """
+
+    def __init__(self, workers=2, threads=2, model_size="small", language="en",
+                 max_batch=8, max_wait_ms=20):
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_size, threads, language),
+        )
+        self.pending = asyncio.Queue()
+        self.batches = 0
+        self.chunks = 0
+        self.audio_s = 0.0
+        self.decode_s = 0.0
+        self._task = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        # Load every model before the first stream arrives
+        await asyncio.gather(*(
+            loop.run_in_executor(self.pool, transcribe_batch, [np.zeros(SAMPLE_RATE, np.int16)])
+            for _ in range(self.workers)
+        ))
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.pool.shutdown(cancel_futures=True)
+
+    def submit(self, chunk):
+        """Future for the text of one int16 chunk."""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.put_nowait((chunk, future))
+        return future
+
+    async def _run(self):
+        free = asyncio.Semaphore(self.workers)
+        while True:
+            await free.acquire()
+            batch = [await self.pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except asyncio.QueueEmpty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.pending.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            asyncio.create_task(self._decode(batch, free))
+
+    async def _decode(self, batch, free):
+        loop = asyncio.get_running_loop()
+        try:
+            texts, decode_s = await loop.run_in_executor(
+                self.pool, transcribe_batch, [chunk for chunk, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            free.release()
+        self.batches += 1
+        self.chunks += len(batch)
+        self.audio_s += sum(len(chunk) for chunk, _ in batch) / SAMPLE_RATE
+        self.decode_s += decode_s
+        for (_, future), text in zip(batch, texts):
+            if not future.done():
+                future.set_result(text)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "chunks": self.chunks,
+            "mean_batch": self.chunks / self.batches if self.batches else 0.0,
+            "audio_s": self.audio_s,
+            "decode_s": self.decode_s,
+            # Worker time per second of audio; divide by ``workers`` for wall-clock load
+            "rtf": self.decode_s / self.audio_s if self.audio_s else 0.0,
+            "queued": self.pending.qsize(),
+        }
+
+
+class StreamChunker:
+    """Cuts one stream into utterance chunks with an energy VAD.
+
+    ``push`` takes int16 samples and returns the chunks completed by them, as
+    ``(start_s, samples)``. Silence outside an utterance is dropped.
+    """
+
+    def __init__(self, threshold=300, block_ms=30, silence_ms=500, min_chunk_s=0.3, max_chunk_s=8.0):
+        self.threshold = threshold
+        self.block = SAMPLE_RATE * block_ms // 1000
+        self.silence_limit = SAMPLE_RATE * silence_ms // 1000
+        self.min_chunk = int(SAMPLE_RATE * min_chunk_s)
+        self.chunk = np.zeros(int(SAMPLE_RATE * max_chunk_s), dtype=np.int16)
+        self.filled = 0
+        self.silence = 0
+        self.position = 0  # samples seen on this stream
+        self.start = 0
+        self._carry = np.zeros(0, dtype=np.int16)
+
+    def push(self, samples):
+        if len(self._carry):
+            samples = np.concatenate((self._carry, samples))
+        usable = len(samples) - len(samples) % self.block
+        self._carry = samples[usable:].copy()
+        out = []
+        for i in range(0, usable, self.block):
+            block = samples[i:i + self.block]
+            voiced = block_rms(block) >= self.threshold
+            self.position += len(block)
+            if not self.filled:
+                if voiced:
+                    self.start = self.position - len(block)
+                    self._append(block)
+                continue
+            self._append(block)
+            self.silence = 0 if voiced else self.silence + len(block)
+            if self.silence >= self.silence_limit or self.filled + self.block > len(self.chunk):
+                chunk = self.flush()
+                if chunk is not None:
+                    out.append(chunk)
+        return out
+
+    def _append(self, block):
+        self.chunk[self.filled:self.filled + len(block)] = block
+        self.filled += len(block)
+
+    def flush(self):
+        """Cut the pending chunk now; None if it is too short to be speech."""
+        filled, self.filled, self.silence = self.filled, 0, 0
+        if filled < self.min_chunk:
+            return None
+        return self.start / SAMPLE_RATE, self.chunk[:filled].copy()
+
+
+class ASRService:
+    def __init__(self, scheduler, **chunker_kwargs):
+        self.scheduler = scheduler
+        self.chunker_kwargs = chunker_kwargs
+        self.streams = 0
+        self.active = 0
+
+    async def handler(self, ws):
+        self.streams += 1
+        self.active += 1
+        chunker = StreamChunker(**self.chunker_kwargs)
+        replies = set()
+        try:
+            async for message in ws:
+                if isinstance(message, bytes):
+                    chunks = chunker.push(np.frombuffer(message, dtype=np.int16))
+                else:
+                    kind = json.loads(message).get("type")
+                    if kind == "flush":
+                        chunks = [c for c in [chunker.flush()] if c is not None]
+                    elif kind == "stats":
+                        await ws.send(json.dumps({"type": "stats", **self.stats()}))
+                        continue
+                    else:
+                        continue
+                for start_s, samples in chunks:
+                    task = asyncio.create_task(self._reply(ws, start_s, samples))
+                    replies.add(task)
+                    task.add_done_callback(replies.discard)
+            if replies:
+                await asyncio.gather(*replies, return_exceptions=True)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            for task in replies:
+                task.cancel()
+            self.active -= 1
+
+    def stats(self):
+        return {"streams": self.streams, "active": self.active, **self.scheduler.stats()}
+
+    async def _reply(self, ws, start_s, samples):
+        cut_at = time.perf_counter()
+        text = await self.scheduler.submit(samples)
+        await ws.send(json.dumps({
+            "type": "transcript",
+            "text": text,
+            "start_s": start_s,
+            "end_s": start_s + len(samples) / SAMPLE_RATE,
+            "latency_ms": (time.perf_counter() - cut_at) * 1000,
+        }))
+
+
+async def serve(host="127.0.0.1", port=8766, unix_path=None, **kwargs):
+    """Run the service until cancelled."""
+    chunker_keys = ("threshold", "silence_ms", "max_chunk_s")
+    chunker_kwargs = {k: kwargs.pop(k) for k in chunker_keys if k in kwargs}
+    scheduler = BatchScheduler(**kwargs)
+    await scheduler.start()
+    service = ASRService(scheduler, **chunker_kwargs)
+    if unix_path:
+        server = await websockets.unix_serve(service.handler, unix_path, max_size=None)
+        print(f"ASR service on unix:{unix_path}")
+    else:
+        server = await websockets.serve(service.handler, host, port, max_size=None)
+        print(f"ASR service on ws://{host}:{port}")
+    try:
+        async with server:
+            await asyncio.Future()
+    finally:
+        await scheduler.close()
+
+
+def run_service(**kwargs):
+    """Blocking entry point, also used to run the service in a separate process."""
+    asyncio.run(serve(**kwargs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-stream transcription service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--workers", type=int, default=2, help="model processes")
+    parser.add_argument("--threads", type=int, default=2, help="CPU threads per model")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    args = parser.parse_args()
+    try:
+        run_service(host=args.host, port=args.port, unix_path=args.unix, model_size=args.model,
+                    language=args.language, workers=args.workers, threads=args.threads,
+                    max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    except KeyboardInterrupt:
+        pass
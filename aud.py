@@ -1,67 +1,63 @@
 import numpy as np
 import sounddevice as sd
-from faster_whisper import WhisperModel
-import queue
 import threading
 import time
 
-# Load the model (use "tiny" or "small" for faster results)
-model = WhisperModel("small", device="cpu", compute_type="int8")
+import models
+from streaming_asr import StreamingTranscriber, TranscriptionPipeline
 
 sample_rate = 16000
 frame_duration = 1.0  # seconds of audio per frame
-max_buffer = 10       # seconds of rolling audio
+max_buffer = 10       # seconds of not yet committed audio kept for decoding
+max_queue = 8         # frames queued before the oldest is dropped
+max_lag = 3.0         # seconds; older frames are skipped when transcription falls behind
 running = True
 
-# Audio queue for cross-thread communication
-audio_q = queue.Queue()
-
-def record_audio():
-    """Continuously record audio and add frames to queue."""
+def record_audio(pipeline):
+    """Continuously record audio and hand frames to the transcription pipeline."""
     with sd.InputStream(samplerate=sample_rate, channels=1, dtype='float32') as stream:
         print("Listening... press Ctrl+C to stop.")
         while running:
             data, _ = stream.read(int(sample_rate * frame_duration))
-            audio_q.put(np.copy(data))
-
-def transcribe_audio():
-    """Continuously process audio from queue and print live transcription."""
-    buffer = np.zeros(0, dtype=np.float32)
-    last_text = ""
-
-    while running:
-        if not audio_q.empty():
-            frame = audio_q.get()
-            frame = np.squeeze(frame)
-            buffer = np.concatenate((buffer, frame))
-
-            # Keep only recent audio (rolling window)
-            if len(buffer) > sample_rate * max_buffer:
-                buffer = buffer[-sample_rate * max_buffer:]
-
-            # Transcribe buffer
-            segments, _ = model.transcribe(buffer, beam_size=1)
-            text = "".join([segment.text for segment in segments]).strip()
-
-            if text and text != last_text:
-                print("\r" + text, end="", flush=True)
-                last_text = text
-
-        else:
+            pipeline.put(np.copy(data))
+
+def print_event(kind, text):
+    """Show the unstable tail in place; committed text gets its own line."""
+    if kind == "final":
+        print("\r\033[K" + text, flush=True)
+    else:
+        print("\r\033[K" + text, end="", flush=True)
+
+def main():
+    global running
+    # Load the model (use "whisper-tiny" or "whisper-small" for faster results),
+    # warmed up so the first frame does not pay for the first inference
+    print("Loading model...")
+    model = models.get("whisper-small", warm=True)
+
+    transcriber = StreamingTranscriber(model, print_event, samplerate=sample_rate, max_window_s=max_buffer)
+    pipeline = TranscriptionPipeline(transcriber, max_frames=max_queue, max_lag_s=max_lag)
+
+    # Start recording and transcribing in parallel threads
+    record_thread = threading.Thread(target=record_audio, args=(pipeline,))
+    transcribe_thread = threading.Thread(target=pipeline.run)
+
+    record_thread.start()
+    transcribe_thread.start()
+
+    try:
+        while True:
             time.sleep(0.1)
-
-# Start recording and transcribing in parallel threads
-record_thread = threading.Thread(target=record_audio)
-transcribe_thread = threading.Thread(target=transcribe_audio)
-
-record_thread.start()
-transcribe_thread.start()
-
-try:
-    while True:
-        time.sleep(0.1)
-except KeyboardInterrupt:
-    running = False
-    record_thread.join()
-    transcribe_thread.join()
-    print("\nStopped.")
+    except KeyboardInterrupt:
+        running = False
+        record_thread.join()
+        pipeline.stop()
+        transcribe_thread.join()
+        print("\nStopped.")
+        stats = pipeline.stats()
+        print(f"Frames: {stats['frames']} in {stats['batches']} decodes, "
+              f"{stats['dropped']} dropped, {stats['skipped']} skipped as stale")
+        print(f"Lag behind the mic: p50 {stats['lag_p50_s']:.2f} s, max {stats['lag_max_s']:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Audio format negotiation between sound devices and the realtime API wire format."""
+
+# pcm16 on the realtime API is 16-bit mono little-endian at 24 kHz, both directions
+WIRE_RATE = 24000
+
+
+def negotiate_rate(kind, device=None, wire_rate=WIRE_RATE):
+    """Pick the sample rate to open a device at.
+
+    The device's native rate is preferred so the OS does not resample behind our
+    back; the wire rate is the fallback. ``kind`` is "input" or "output".
+    """
+    import sounddevice as sd
+
+    check = sd.check_input_settings if kind == "input" else sd.check_output_settings
+    native = int(sd.query_devices(device, kind)["default_samplerate"])
+    for rate in dict.fromkeys((native, wire_rate)):
+        try:
+            check(device=device, samplerate=rate, channels=1, dtype="int16")
+            return rate
+        except (sd.PortAudioError, ValueError):
+            continue
+    raise RuntimeError(f"No usable {kind} sample rate (tried {native} and {wire_rate} Hz)")
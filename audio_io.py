@@ -0,0 +1,119 @@
+"""Pluggable audio sources and sinks for RealtimeSession."""
+import asyncio
+import wave
+
+import numpy as np
+
+from audio_format import negotiate_rate
+from playback import PlaybackEngine
+
+
+class MicSource:
+    """The default (or given) input device, opened at its native rate."""
+
+    # Opening blocks in PortAudio; sessions run it in a thread
+    threaded_open = True
+
+    def __init__(self, device=None, samplerate=None, block_ms=21):
+        self.device = device
+        self.samplerate = samplerate or negotiate_rate("input", device)
+        self.blocksize = self.samplerate * block_ms // 1000
+        self.stream = None
+
+    def open(self, on_block):
+        import sounddevice as sd
+
+        def callback(indata, frames, time_info, status):
+            on_block(indata[:, 0])
+
+        self.stream = sd.InputStream(
+            device=self.device,
+            callback=callback,
+            channels=1,
+            samplerate=self.samplerate,
+            dtype='int16',
+            blocksize=self.blocksize
+        )
+        self.stream.start()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class WavSource:
+    """Replays a 16-bit mono WAV file at real-time pace (or ``speed`` times faster).
+
+    Blocks are delivered from a task on the event loop, so hundreds of replayed
+    "microphones" need no threads. ``offset_s`` staggers sessions sharing a file.
+    """
+
+    def __init__(self, path, block_ms=20, speed=1.0, loop=True, offset_s=0.0):
+        with wave.open(str(path), "rb") as w:
+            if w.getnchannels() != 1 or w.getsampwidth() != 2:
+                raise ValueError(f"{path}: expected 16-bit mono WAV")
+            self.samplerate = w.getframerate()
+            self.samples = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+        self.blocksize = self.samplerate * block_ms // 1000
+        self.interval = block_ms / 1000 / speed
+        self.loop = loop
+        self.offset = int(offset_s * self.samplerate) % max(len(self.samples), 1)
+        self._task = None
+
+    def open(self, on_block):
+        self._task = asyncio.get_running_loop().create_task(self._run(on_block))
+
+    async def _run(self, on_block):
+        loop = asyncio.get_running_loop()
+        pos = self.offset
+        next_at = loop.time()
+        while True:
+            if pos >= len(self.samples):
+                if not self.loop:
+                    return
+                pos = 0
+            on_block(self.samples[pos:pos + self.blocksize])
+            pos += self.blocksize
+            # Pace against absolute deadlines so timer jitter does not accumulate
+            next_at += self.interval
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class NullSink(PlaybackEngine):
+    """Headless sink: drains the jitter buffer on a simulated device clock.
+
+    Playback metrics, barge-in truncation and echo levels behave as with a real
+    speaker, but nothing is sent to a sound device.
+    """
+
+    # Its clock is a task on the running loop
+    threaded_open = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._clock())
+
+    async def _clock(self):
+        loop = asyncio.get_running_loop()
+        out = np.empty(self.blocksize, dtype=np.int16)
+        interval = self.blocksize / self.samplerate
+        next_at = loop.time()
+        while True:
+            self.render(out)
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,145 @@
+"""Aggregate real-time factor and per-stream latency of asr_service as streams grow.
+
+Starts ``asr_service`` in a separate process, then for each stream count
+replays ``reply_1.wav`` (resampled to 16 kHz) on every stream at real-time
+pace, in 100 ms frames, with starts staggered over the first second. Latency
+is measured per chunk from the moment the client sent the audio that closed
+it to the moment its transcript arrived; chunk boundaries are predicted with
+the same ``StreamChunker`` the service uses.
+
+    python -m benchmarks.asr_service --streams 1 4 16 32 --workers 2 --threads 2
+"""
+import argparse
+import asyncio
+import json
+import signal
+import subprocess
+import sys
+import time
+import wave
+
+import numpy as np
+import websockets
+
+from asr_service import SAMPLE_RATE, StreamChunker
+from benchmarks.token_server import free_port
+from resample import Resampler
+
+FRAME_MS = 100
+
+
+def load_frames(path):
+    with wave.open(path, "rb") as w:
+        rate = w.getframerate()
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    audio = np.clip(Resampler(rate, SAMPLE_RATE).process(samples), -32768, 32767).astype(np.int16)
+    step = SAMPLE_RATE * FRAME_MS // 1000
+    return [audio[i:i + step] for i in range(0, len(audio), step)]
+
+
+def closing_frames(frames):
+    """Index of the frame that completes each chunk, the same way the service cuts them."""
+    chunker = StreamChunker()
+    closes = []
+    for i, frame in enumerate(frames):
+        closes += [i] * len(chunker.push(frame))
+    if chunker.flush() is not None:
+        closes.append(len(frames) - 1)
+    return closes
+
+
+async def stream(url, frames, closes, delay, latencies):
+    await asyncio.sleep(delay)
+    sent_at = {}
+    async with websockets.connect(url, max_size=None) as ws:
+        async def send():
+            next_at = time.monotonic()
+            for i, frame in enumerate(frames):
+                await ws.send(frame.tobytes())
+                sent_at[i] = time.monotonic()
+                next_at += FRAME_MS / 1000
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            await ws.send(json.dumps({"type": "flush"}))
+            sent_at[len(frames) - 1] = time.monotonic()
+
+        sender = asyncio.create_task(send())
+        for close in closes:
+            await ws.recv()
+            latencies.append(time.monotonic() - sent_at.get(close, time.monotonic()))
+        await sender
+
+
+async def run(url, frames, streams):
+    closes = closing_frames(frames)
+    latencies = []
+    start = time.monotonic()
+    await asyncio.gather(*(
+        stream(url, frames, closes, i / streams, latencies)
+        for i in range(streams)
+    ))
+    wall = time.monotonic() - start
+    async with websockets.connect(url) as ws:
+        await ws.send(json.dumps({"type": "stats"}))
+        stats = json.loads(await ws.recv())
+    return wall, latencies, stats
+
+
+async def connect_when_ready(url, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with websockets.connect(url):
+                return
+        except OSError:
+            await asyncio.sleep(0.5)
+    raise RuntimeError("asr_service did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--wav", default="reply_1.wav")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--max-batch", type=int, default=8)
+    args = parser.parse_args()
+
+    frames = load_frames(args.wav)
+    audio_s = len(frames) * FRAME_MS / 1000
+    port = free_port()
+    url = f"ws://127.0.0.1:{port}"
+    # A subprocess rather than a daemon child, since the service spawns its own worker pool
+    service = subprocess.Popen([
+        sys.executable, "asr_service.py", "--port", str(port), "--model", args.model,
+        "--workers", str(args.workers), "--threads", str(args.threads),
+        "--max-batch", str(args.max_batch),
+    ])
+    try:
+        asyncio.run(connect_when_ready(url))
+        print(f"{args.workers} workers x {args.threads} threads, model {args.model}, "
+              f"{audio_s:.1f} s of audio per stream\n")
+        print(f"{'streams':>8}{'audio s':>9}{'batch':>7}{'RTF':>7}{'load':>7}"
+              f"{'lat p50':>9}{'p95':>7}{'max':>7}")
+        previous = {"audio_s": 0.0, "decode_s": 0.0, "chunks": 0, "batches": 0}
+        for n in args.streams:
+            wall, latencies, stats = asyncio.run(run(url, frames, n))
+            audio = stats["audio_s"] - previous["audio_s"]
+            decode = stats["decode_s"] - previous["decode_s"]
+            batches = max(stats["batches"] - previous["batches"], 1)
+            mean_batch = (stats["chunks"] - previous["chunks"]) / batches
+            previous = stats
+            # RTF: model time per second of speech; load: share of the pool's capacity used
+            rtf = decode / audio if audio else 0.0
+            load = decode / (wall * args.workers)
+            p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+            print(f"{n:>8}{n * audio_s:>9.0f}{mean_batch:>7.1f}{rtf:>7.2f}{load:>7.2f}"
+                  f"{p50:>7.0f}ms{p95:>5.0f}ms{max(latencies) * 1000:>5.0f}ms")
+    finally:
+        # SIGINT lets the service shut its worker pool down
+        service.send_signal(signal.SIGINT)
+        service.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
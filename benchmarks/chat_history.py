@@ -0,0 +1,73 @@
+"""Request payload size per turn with the old unbounded history vs ``history.ConversationHistory``.
+
+Replays a synthetic conversation (user questions and assistant replies of
+typical length) and measures the JSON size of the messages each request would
+send. The summarizer is a stand-in that returns a fixed-length summary, so no
+API calls are made; with the real one, each compaction costs one extra cheap
+completion, run while the reply plays.
+
+    python -m benchmarks.chat_history --turns 200
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from history import TOKENIZER, ConversationHistory
+
+SYSTEM_PROMPT = "you are NOA, an AI assistant that responds with both text and audio."
+WORDS = "the a voice model reply audio question answer time because which then about".split()
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS, size=words)).capitalize() + "."
+
+
+def fake_summarizer(previous, messages):
+    return " ".join(["summary"] * 120)
+
+
+def request_bytes(messages):
+    return len(json.dumps(messages).encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--keep-recent", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    unbounded = [{"role": "system", "content": SYSTEM_PROMPT}]
+    history = ConversationHistory(SYSTEM_PROMPT, budget_tokens=args.budget,
+                                  keep_recent=args.keep_recent, summarize=fake_summarizer)
+    sizes = {"unbounded": [], "bounded": []}
+    compact_s = []
+    for _ in range(args.turns):
+        user = sentence(rng, 15)
+        reply = " ".join(sentence(rng, 20) for _ in range(5))
+        unbounded.append({"role": "user", "content": user})
+        history.add("user", user)
+        sizes["unbounded"].append(request_bytes(unbounded))
+        sizes["bounded"].append(request_bytes(history.messages()))
+        unbounded.append({"role": "assistant", "content": reply})
+        history.add("assistant", reply)
+        start = time.perf_counter()
+        history.compact()
+        compact_s.append(time.perf_counter() - start)
+
+    marks = [t for t in (1, 10, 50, 100, 200, 500, 1000) if t <= args.turns]
+    print(f"{args.turns} turns, budget {args.budget} tokens ({TOKENIZER}), "
+          f"keep {args.keep_recent} recent messages\n")
+    print(f"{'request KiB at turn':<22}" + "".join(f"{t:>8}" for t in marks))
+    for mode, values in sizes.items():
+        print(f"{mode:<22}" + "".join(f"{values[t - 1] / 1024:>8.1f}" for t in marks))
+    stats = history.stats()
+    print(f"\n{stats['compactions']} compactions, {stats['folded']} messages summarized, "
+          f"compact() {np.median(compact_s) * 1e6:.0f} us median (excluding the summarizer call)")
+
+
+if __name__ == "__main__":
+    main()
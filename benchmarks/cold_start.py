@@ -0,0 +1,90 @@
+"""Cold start and time to first result, loading models at import vs through ``models``.
+
+Each case runs in a fresh interpreter. "import-time load" mirrors the old
+scripts: import the library, construct the model at module top, then run the
+first real inference. "registry" starts ``models.prewarm`` first, does the
+rest of its startup in parallel (simulated by ``--startup-ms`` of other work),
+then asks for the model. Timings are from interpreter start; run it twice to
+see the warm-cache numbers once the first run has filled ``MODEL_CACHE_DIR``.
+
+    python -m benchmarks.cold_start --model whisper-small --startup-ms 300
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+IMPORT_TIME = """
+import time, json
+t0 = time.perf_counter()
+{load}
+loaded = time.perf_counter()
+{infer}
+done = time.perf_counter()
+print(json.dumps({{"load_s": loaded - t0, "first_result_s": done - t0}}))
+"""
+
+REGISTRY = """
+import time, json
+t0 = time.perf_counter()
+import models
+models.prewarm({name!r})
+time.sleep({startup_s})  # the rest of the app's startup runs meanwhile
+model = models.get({name!r}, warm=True)
+loaded = time.perf_counter()
+{infer}
+done = time.perf_counter()
+print(json.dumps({{"load_s": loaded - t0, "first_result_s": done - t0}}))
+"""
+
+CASES = {
+    "whisper-small": (
+        'from faster_whisper import WhisperModel\n'
+        'model = WhisperModel("small", device="cpu", compute_type="int8")',
+        'import numpy as np\n'
+        'segments, _ = model.transcribe(np.random.default_rng(0).normal(0, 0.1, 16000).astype(np.float32), beam_size=1)\n'
+        'list(segments)',
+    ),
+    "minilm": (
+        'from sentence_transformers import SentenceTransformer\n'
+        'model = SentenceTransformer("all-MiniLM-L6-v2")',
+        'model.encode(["How does AI impact healthcare?"])',
+    ),
+}
+
+
+def run(code):
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", choices=sorted(CASES), default="whisper-small")
+    parser.add_argument("--startup-ms", type=float, default=300,
+                        help="other startup work (device open, connect) overlapped with the load")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    load, infer = CASES[args.model]
+    startup = f"time.sleep({args.startup_ms / 1000})\n"
+    variants = {
+        # The old scripts do their other startup work only after the model is ready
+        "import-time load": IMPORT_TIME.format(load=load + "\n" + startup, infer=infer),
+        "registry": REGISTRY.format(name=args.model, startup_s=args.startup_ms / 1000, infer=infer),
+    }
+
+    print(f"{args.model}, {args.startup_ms:.0f} ms of other startup work, best of {args.runs}\n")
+    print(f"{'mode':<20}{'ready s':>10}{'first result s':>16}{'process s':>12}")
+    for mode, code in variants.items():
+        results = [run(code) for _ in range(args.runs)]
+        best = min(results, key=lambda r: r["first_result_s"])
+        print(f"{mode:<20}{best['load_s']:>10.2f}{best['first_result_s']:>16.2f}{best['process_s']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
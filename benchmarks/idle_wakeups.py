@@ -0,0 +1,83 @@
+"""Idle-CPU benchmark for the uplink sender.
+
+Runs N idle sessions (no microphone audio arriving) on one event loop and counts
+how often the loop wakes up, comparing the old ``wait_for(queue.get(), 0.01)``
+polling sender against the event-driven ``UplinkSender``.
+
+    python -m benchmarks.idle_wakeups --sessions 50 --seconds 5
+"""
+import argparse
+import asyncio
+import selectors
+import time
+
+from uplink import UplinkCoalescer, UplinkSender
+
+
+class CountingSelector(selectors.DefaultSelector):
+    """Selector that counts select() calls, i.e. event loop wakeups."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def select(self, timeout=None):
+        self.calls += 1
+        return super().select(timeout)
+
+
+class NullWebSocket:
+    async def send(self, message):
+        pass
+
+
+async def legacy_sender(ws, queue):
+    """The pre-coalescing sender loop, kept here only as the baseline."""
+    while True:
+        try:
+            audio_b64, is_silent = await asyncio.wait_for(queue.get(), timeout=0.01)
+            await ws.send(audio_b64)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_idle(mode, sessions, seconds):
+    ws = NullWebSocket()
+    if mode == "polling":
+        tasks = [asyncio.create_task(legacy_sender(ws, asyncio.Queue())) for _ in range(sessions)]
+    else:
+        senders = [UplinkSender(ws, UplinkCoalescer()) for _ in range(sessions)]
+        tasks = [asyncio.create_task(s.run()) for s in senders]
+    await asyncio.sleep(seconds)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def measure(mode, sessions, seconds):
+    selector = CountingSelector()
+    loop = asyncio.SelectorEventLoop(selector)
+    try:
+        cpu_start = time.process_time()
+        loop.run_until_complete(run_idle(mode, sessions, seconds))
+        cpu = time.process_time() - cpu_start
+    finally:
+        loop.close()
+    return selector.calls / seconds, cpu / seconds * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.sessions} idle sessions, {args.seconds:.0f}s each run\n")
+    print(f"{'sender':<14}{'wakeups/s':>12}{'CPU %':>10}")
+    for mode in ("polling", "event-driven"):
+        wakeups, cpu = measure(mode, args.sessions, args.seconds)
+        print(f"{mode:<14}{wakeups:>12.0f}{cpu:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Multi-session load test: N RealtimeSessions on one event loop against the mock server.
+
+Each session replays ``reply_1.wav`` as its microphone and plays into a
+NullSink. The mock server runs in a separate process so only client-side cost
+is measured. For every N the report shows CPU and memory per session, event
+loop lag and end-to-end latency (last uplink frame of a turn to the first
+audio delta of the reply, including the mock's scripted think time).
+
+    python -m benchmarks.loadtest --sessions 1 10 50 100 --seconds 20
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import socket
+import time
+
+import numpy as np
+
+from audio_format import WIRE_RATE
+from audio_io import NullSink, WavSource
+from mock_realtime import run_server
+from session import RealtimeSession
+
+SESSION_CONFIG = {
+    "input_audio_format": "pcm16",
+    "output_audio_format": "pcm16",
+    "turn_detection": {"type": "server_vad"},
+    "modalities": ["text", "audio"],
+}
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is a high-water mark (KiB on Linux), the best we have elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def lag_monitor(samples, interval=0.05):
+    """Record how late the loop wakes a sleeper; a busy loop shows up here first."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+
+def pct(values, q):
+    return float(np.percentile(values, q)) * 1000 if len(values) else float("nan")
+
+
+async def run_load(n, seconds, url, wav):
+    sessions = [
+        RealtimeSession(
+            url,
+            {},
+            WavSource(wav, offset_s=i * 0.77),
+            NullSink(samplerate=WIRE_RATE),
+            SESSION_CONFIG,
+            verbose=False,
+        )
+        for i in range(n)
+    ]
+    lags = []
+    monitor = asyncio.create_task(lag_monitor(lags))
+    rss_start = rss_bytes()
+    cpu_start = time.process_time()
+
+    tasks = [asyncio.create_task(s.run()) for s in sessions]
+    await asyncio.sleep(seconds)
+
+    cpu = time.process_time() - cpu_start
+    rss = rss_bytes() - rss_start
+    for task in tasks + [monitor]:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = sum(isinstance(r, Exception) and not isinstance(r, asyncio.CancelledError) for r in results)
+
+    latencies = [lat for s in sessions for lat in s.latencies]
+    underruns = sum(s.sink.underruns for s in sessions)
+    return {
+        "sessions": n,
+        "failed": failed,
+        "cpu_pct": cpu / seconds * 100 / n,
+        "mem_kib": rss / 1024 / n,
+        "lag_p50": pct(lags, 50),
+        "lag_p99": pct(lags, 99),
+        "lag_max": max(lags, default=0.0) * 1000,
+        "turns": len(latencies),
+        "e2e_p50": pct(latencies, 50),
+        "e2e_p95": pct(latencies, 95),
+        "e2e_p99": pct(latencies, 99),
+        "underruns": underruns,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--wav", default="reply_1.wav")
+    parser.add_argument("--turn-ms", type=int, default=3000)
+    parser.add_argument("--reply-ms", type=int, default=2000)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(
+        target=run_server,
+        args=(port,),
+        kwargs={"turn_ms": args.turn_ms, "reply_ms": args.reply_ms},
+        daemon=True,
+    )
+    server.start()
+    time.sleep(0.5)
+    url = f"ws://127.0.0.1:{port}"
+
+    header = (f"{'N':>5}{'CPU%/sess':>11}{'KiB/sess':>10}{'lag p50':>9}{'p99':>7}{'max':>7}"
+              f"{'turns':>7}{'e2e p50':>9}{'p95':>7}{'p99':>7}{'underruns':>11}{'failed':>8}")
+    print(header)
+    try:
+        for n in args.sessions:
+            r = asyncio.run(run_load(n, args.seconds, url, args.wav))
+            print(f"{r['sessions']:>5}{r['cpu_pct']:>11.2f}{r['mem_kib']:>10.0f}"
+                  f"{r['lag_p50']:>9.1f}{r['lag_p99']:>7.1f}{r['lag_max']:>7.1f}"
+                  f"{r['turns']:>7}{r['e2e_p50']:>9.0f}{r['e2e_p95']:>7.0f}{r['e2e_p99']:>7.0f}"
+                  f"{r['underruns']:>11}{r['failed']:>8}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Per-message overhead of the server's /relay endpoint at many concurrent sessions.
+
+Starts the mock realtime server and ``server`` (with REALTIME_URL pointed at
+the mock), then runs N sessions that each ping the upstream with
+``session.update`` and wait for ``session.updated``. The same run is done
+directly against the mock and through the relay; the difference in round-trip
+time is the relay's overhead per message (two forwards per round trip).
+
+    python -m benchmarks.relay_overhead --sessions 100 --messages 50
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import time
+
+import httpx
+import numpy as np
+import websockets
+
+from benchmarks.token_server import free_port, start_uvicorn
+from mock_realtime import run_server
+
+PING = json.dumps({"type": "session.update", "session": {"instructions": "ping"}})
+
+
+async def ping_session(url, messages, rtts):
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.recv()  # session.created
+        for _ in range(messages):
+            start = time.perf_counter()
+            await ws.send(PING)
+            while json.loads(await ws.recv())["type"] != "session.updated":
+                pass
+            rtts.append(time.perf_counter() - start)
+
+
+async def run(url, sessions, messages):
+    rtts = []
+    start = time.perf_counter()
+    await asyncio.gather(*(ping_session(url, messages, rtts) for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return len(rtts) / elapsed, np.percentile(rtts, 50) * 1000, np.percentile(rtts, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--batch-audio", action="store_true")
+    args = parser.parse_args()
+
+    mock_port = free_port()
+    mock = multiprocessing.Process(target=run_server, args=(mock_port,), daemon=True)
+    mock.start()
+    server_port = free_port()
+    server = start_uvicorn("server", server_port, {
+        "OPENAI_API_KEY": "sk-bench",
+        "REALTIME_URL": f"ws://127.0.0.1:{mock_port}",
+        "RELAY_BATCH_AUDIO": "1" if args.batch_audio else "0",
+    })
+
+    print(f"{args.sessions} sessions x {args.messages} round trips\n")
+    print(f"{'path':<10}{'rtt/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    try:
+        results = {}
+        for path, url in (("direct", f"ws://127.0.0.1:{mock_port}"),
+                          ("relay", f"ws://127.0.0.1:{server_port}/relay")):
+            results[path] = asyncio.run(run(url, args.sessions, args.messages))
+            rate, p50, p99 = results[path]
+            print(f"{path:<10}{rate:>10.0f}{p50:>10.2f}{p99:>10.2f}")
+        overhead = (results["relay"][1] - results["direct"][1]) / 2
+        print(f"\nRelay overhead: ~{overhead:.2f} ms per forwarded message (p50)")
+        metrics = httpx.get(f"http://127.0.0.1:{server_port}/relay/metrics").json()
+        print(f"Relay sessions still open: {metrics['active']}")
+    finally:
+        server.terminate()
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
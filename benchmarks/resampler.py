@@ -0,0 +1,48 @@
+"""Resampler cost per second of audio for common device/wire rate pairs.
+
+    python -m benchmarks.resampler --seconds 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from resample import Resampler
+
+PAIRS = [
+    (48000, 24000),
+    (44100, 24000),
+    (16000, 24000),
+    (24000, 48000),
+    (24000, 44100),
+]
+
+
+def measure(in_rate, out_rate, seconds, block_ms):
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(int(in_rate * seconds)) * 3000).astype(np.int16)
+    block = in_rate * block_ms // 1000
+    resampler = Resampler(in_rate, out_rate)
+
+    start = time.perf_counter()
+    for i in range(0, len(audio), block):
+        resampler.process(audio[i:i + block])
+    elapsed = time.perf_counter() - start
+    return elapsed / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--block-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.seconds:.0f}s of audio in {args.block_ms} ms blocks\n")
+    print(f"{'in -> out':<18}{'ms CPU / s audio':>18}{'x realtime':>12}")
+    for in_rate, out_rate in PAIRS:
+        cost = measure(in_rate, out_rate, args.seconds, args.block_ms)
+        print(f"{f'{in_rate} -> {out_rate}':<18}{cost * 1000:>18.2f}{1 / cost:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
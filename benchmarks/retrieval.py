@@ -0,0 +1,110 @@
+"""Add, dedup and search throughput of ``retrieval.EmbeddingStore`` at 10k and 1M docs.
+
+Uses synthetic clustered 384-d embeddings (the size of all-MiniLM-L6-v2) so
+no model is needed; the encoder is a lookup, and its cost is left out. For
+each corpus size it reports:
+
+* add: first insert, and re-adding the same documents (all deduplicated);
+* one-by-one: the old trans.py pattern, one query at a time with a full sort;
+* batched exact: all queries in one blocked matrix product with argpartition;
+* IVF: approximate search after ``build_ivf``, with recall@k against exact.
+
+    python -m benchmarks.retrieval --docs 10000 1000000 --queries 64
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from retrieval import EmbeddingStore, normalize
+
+DIM = 384
+
+
+class SyntheticCorpus:
+    """Clustered unit vectors addressed by their text, ``"doc <i>"``."""
+
+    def __init__(self, n, clusters=256, seed=0):
+        rng = np.random.default_rng(seed)
+        centers = normalize(rng.normal(size=(clusters, DIM)))
+        self.vectors = np.empty((n, DIM), dtype=np.float32)
+        for start in range(0, n, 100_000):
+            m = min(100_000, n - start)
+            noise = rng.normal(scale=0.05, size=(m, DIM)).astype(np.float32)
+            self.vectors[start:start + m] = normalize(centers[rng.integers(clusters, size=m)] + noise)
+        self.texts = [f"doc {i}" for i in range(n)]
+
+    def encode(self, texts):
+        return self.vectors[[int(t.split()[1]) for t in texts]]
+
+
+def one_by_one(store, queries, k):
+    """Per-query scoring with a full argsort, as trans.py did with util.semantic_search."""
+    matrix = np.asarray(store.vectors, dtype=np.float32)
+    out = []
+    for q in queries:
+        scores = matrix @ q
+        out.append(np.argsort(-scores)[:k])
+    return out
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(n, n_queries, k, dtype, nprobe, workdir):
+    corpus = SyntheticCorpus(n)
+    path = os.path.join(workdir, f"store_{n}")
+    store = EmbeddingStore(path, encode=corpus.encode, dtype=dtype)
+
+    added, add_s = timed(lambda: sum(store.add(corpus.texts[i:i + 100_000])
+                                     for i in range(0, n, 100_000)))
+    readded, readd_s = timed(store.add, corpus.texts)
+    rng = np.random.default_rng(1)
+    queries = normalize(corpus.vectors[rng.integers(n, size=n_queries)]
+                        + rng.normal(scale=0.05, size=(n_queries, DIM)))
+
+    rows = []
+    _, s = timed(one_by_one, store, queries, k)
+    rows.append(("one-by-one", s))
+    exact, s = timed(store.search_vectors, queries, k)
+    rows.append(("batched exact", s))
+    _, build_s = timed(store.build_ivf)
+    approx, s = timed(store.search_vectors, queries, k, nprobe)
+    rows.append((f"IVF nprobe={nprobe}", s))
+
+    truth = [{d["hash"] for _, d in r} for r in exact]
+    recall = np.mean([len(truth[i] & {d["hash"] for _, d in r}) / k for i, r in enumerate(approx)])
+
+    print(f"\n{n:,} docs ({dtype}): added {added:,} in {add_s:.1f} s "
+          f"({added / add_s:,.0f} docs/s); re-add skipped {len(corpus.texts) - readded:,} in {readd_s:.2f} s")
+    print(f"IVF build {build_s:.1f} s, recall@{k} {recall:.3f}")
+    print(f"{'search':<18}{'ms/query':>10}{'queries/s':>12}")
+    for name, s in rows:
+        print(f"{name:<18}{s / n_queries * 1000:>10.2f}{n_queries / s:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=64)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="retrieval_bench_")
+    try:
+        for n in args.docs:
+            run(n, args.queries, args.k, args.dtype, args.nprobe, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Lookup and insert cost of ``semantic_cache.SemanticCache`` at 10k and 100k entries.
+
+Offline, with synthetic clustered 384-d embeddings (the size of
+all-MiniLM-L6-v2) like ``benchmarks.retrieval``: the encoder is a dict lookup,
+so the numbers are the cache's own cost, to be added to one MiniLM encode
+(a few ms on CPU) per question that is not an exact repeat. For each size:
+
+* fill: ``put`` per entry while growing, then a missed lookup plus ``put``
+  at capacity, which evicts the least recently used entry;
+* lookup: paraphrases of cached questions (cosine ~0.95, should hit),
+  unrelated questions (should miss) and exact repeats (no embedding);
+* naive: the same misses scored one cached vector at a time in Python, as a
+  list-of-embeddings cache would.
+
+    python -m benchmarks.semantic_cache --entries 10000 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from retrieval import normalize
+from semantic_cache import SemanticCache, normalize_question
+
+DIM = 384
+
+
+class SyntheticQuestions:
+    """Embeddings for ``"q <i>"`` (clustered), ``"p <i>"`` (a paraphrase of q i) and ``"u <i>"``."""
+
+    def __init__(self, n, clusters=256, seed=0):
+        rng = np.random.default_rng(seed)
+        centers = normalize(rng.normal(size=(clusters, DIM)))
+        self.questions = normalize(centers[rng.integers(clusters, size=n)]
+                                   + rng.normal(scale=0.05, size=(n, DIM)).astype(np.float32))
+        self.paraphrases = normalize(self.questions + rng.normal(scale=0.016, size=(n, DIM)).astype(np.float32))
+        self.unrelated = normalize(rng.normal(size=(1000, DIM)))
+
+    def encode(self, texts):
+        kind, i = texts[0].split()
+        table = {"q": self.questions, "p": self.paraphrases, "u": self.unrelated}[kind]
+        return table[int(i)][None, :]
+
+
+def timed_each(fn, items):
+    times = []
+    results = []
+    for item in items:
+        start = time.perf_counter()
+        results.append(fn(item))
+        times.append(time.perf_counter() - start)
+    return results, np.array(times) * 1e6
+
+
+def run(n, n_queries, threshold):
+    data = SyntheticQuestions(n + 1000)
+    cache = SemanticCache(data.encode, threshold=threshold, max_entries=n, ttl_s=3600)
+
+    def insert(i):
+        # What lookup hands back on a miss: the normalized text and its embedding
+        cache.put((normalize_question(f"q {i}"), data.questions[i]), f"answer {i}", cost_s=1.0)
+
+    def ask_and_insert(i):
+        _, query = cache.lookup(f"q {i}")
+        cache.put(query, f"answer {i}", cost_s=1.0)
+
+    _, fill_us = timed_each(insert, range(n))
+    _, full_us = timed_each(ask_and_insert, range(n, n + 200))
+
+    rng = np.random.default_rng(1)
+    picks = rng.integers(200, n, size=n_queries)
+    hits, hit_us = timed_each(lambda i: cache.lookup(f"p {i}")[0], picks)
+    misses, miss_us = timed_each(lambda i: cache.lookup(f"u {i}")[0], range(n_queries))
+    _, exact_us = timed_each(lambda i: cache.lookup(f"q {i}")[0], picks)
+    correct = sum(h is not None and h["answer"] == f"answer {i}" for h, i in zip(hits, picks))
+
+    vectors = [cache.matrix[row] for row in cache.entries]
+    sample = min(n_queries, 20)
+
+    def naive(i):
+        q = data.unrelated[i]
+        best = max(float(np.dot(v, q)) for v in vectors)
+        return best >= threshold
+
+    _, naive_us = timed_each(naive, range(sample))
+    return {
+        "fill_us": np.median(fill_us),
+        "full_us": np.median(full_us),
+        "hit_us": np.median(hit_us),
+        "miss_us": np.median(miss_us),
+        "miss_p99_us": np.percentile(miss_us, 99),
+        "exact_us": np.median(exact_us),
+        "naive_us": np.median(naive_us),
+        "hit_ratio": correct / n_queries,
+        "false_hits": sum(m is not None for m in misses) / n_queries,
+        "matrix_mb": cache.matrix.nbytes / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    args = parser.parse_args()
+
+    print(f"threshold {args.threshold}, {args.queries} queries per kind; medians in µs\n")
+    print(f"{'entries':>8}{'matrix MB':>11}{'put':>7}{'put full':>10}{'hit':>8}{'miss':>8}"
+          f"{'miss p99':>10}{'exact':>7}{'naive':>10}{'hits':>7}{'false':>7}")
+    for n in args.entries:
+        r = run(n, args.queries, args.threshold)
+        print(f"{n:>8}{r['matrix_mb']:>11.0f}{r['fill_us']:>7.0f}{r['full_us']:>10.0f}{r['hit_us']:>8.0f}"
+              f"{r['miss_us']:>8.0f}{r['miss_p99_us']:>10.0f}{r['exact_us']:>7.1f}{r['naive_us']:>10.0f}"
+              f"{r['hit_ratio']:>7.0%}{r['false_hits']:>7.0%}")
+    print("\nput: insert while filling; put full: missed lookup + insert at capacity, evicting the LRU entry")
+    print("hit/miss: paraphrase / unrelated lookups; exact: a repeated question, no embedding; "
+          "naive: a Python loop of dot products")
+
+
+if __name__ == "__main__":
+    main()
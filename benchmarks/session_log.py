@@ -0,0 +1,94 @@
+"""Record a session against the mock server, then replay it from the log at 1x and faster.
+
+Recording: one ``RealtimeSession`` replays the first utterance of
+``reply_1.wav`` with pauses against ``mock_realtime`` (ending turns on
+silence), with and without a ``SessionRecorder``, to show the log size next to
+the same events as JSON text and the recorder's CPU cost.
+
+Replay: ``session_log.replay`` runs a fresh headless session on the recorded mic
+audio against the recorded server events, with no mock and no sound device.
+The assistant audio received matches the recording at every speed, and so do
+the uplink frames at 1x. Faster replays send a few frames more or less: the
+headless sink still plays in real time, so the echo-aware VAD gate sees the
+speaker level at different points of the mic audio.
+
+    python -m benchmarks.session_log --seconds 30 --speeds 1 8
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from audio_format import WIRE_RATE
+from audio_io import NullSink
+from benchmarks.loadtest import SESSION_CONFIG, free_port
+from benchmarks.voice_pipeline import TurnSource
+from mock_realtime import run_server
+from session import RealtimeSession
+from session_log import IN_AUDIO, SessionLog, SessionRecorder, replay
+
+
+async def record(url, wav, seconds, path):
+    source = TurnSource(wav, turns=1000, gap_s=3.0)
+    recorder = SessionRecorder(path, meta={"mic_rate": source.samplerate,
+                                           "session_config": SESSION_CONFIG}) if path else None
+    session = RealtimeSession(url, {}, source, NullSink(samplerate=WIRE_RATE), SESSION_CONFIG,
+                              recorder=recorder, verbose=False)
+    cpu_start = time.process_time()
+    task = asyncio.create_task(session.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    cpu = time.process_time() - cpu_start
+    if recorder is not None:
+        recorder.close()
+    return cpu / seconds * 100, recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--speeds", type=float, nargs="+", default=[1.0, 8.0])
+    parser.add_argument("--wav", default="reply_1.wav")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=run_server, args=(port,), daemon=True,
+                                     kwargs={"silence_ms": 400, "reply_ms": 2000})
+    server.start()
+    time.sleep(0.5)
+    url = f"ws://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix="session_log_")
+    path = os.path.join(workdir, "bench.rtlog")
+    try:
+        cpu_off, _ = asyncio.run(record(url, args.wav, args.seconds, None))
+        cpu_on, recorder = asyncio.run(record(url, args.wav, args.seconds, path))
+        stats = recorder.stats()
+        log = SessionLog(path)
+        info = log.stats()
+        sent = info["out_audio"][0]
+        received = sum(len(log.pcm(i)) for i in log.select(IN_AUDIO))
+        print(f"Recorded {args.seconds:.0f} s: {info['records']} records, "
+              f"log {info['bytes'] / 1024:.0f} KiB + index {os.path.getsize(path + '.idx') / 1024:.0f} KiB")
+        print(f"  events as JSON text {stats['json_bytes'] / 1024:.0f} KiB; in the log "
+              f"{(info['in'][1] + info['out'][1] + info['in_audio'][1] + info['out_audio'][1]) / 1024:.0f} KiB, "
+              f"plus {info['mic'][1] / 1024:.0f} KiB of raw mic audio")
+        print(f"  CPU {cpu_off:.2f}% without the recorder, {cpu_on:.2f}% with it\n")
+        log.close()
+
+        print(f"{'replay':<10}{'wall s':>8}{'uplink frames':>15}{'reply samples':>15}")
+        print(f"{'recorded':<10}{args.seconds:>8.1f}{sent:>15}{received:>15}")
+        for speed in args.speeds:
+            session, elapsed = asyncio.run(replay(path, speed, verbose=False))
+            print(f"{f'{speed:g}x':<10}{elapsed:>8.1f}{session.sender.sent:>15}{session.sink.ring.head:>15}")
+    finally:
+        server.terminate()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Time to ready on cold start and on reconnect, sequential vs parallel startup.
+
+Starts ``stub_openai`` and ``server`` (tokens minted upstream with
+``--upstream-latency-ms``) and a ``mock_realtime`` whose handshakes take
+``--handshake-ms`` and which drops every connection after ``--drop-after-s``.
+The mic and speaker are headless stand-ins whose open blocks for
+``--device-open-ms``, like a PortAudio open. Ready means the devices are open
+and the server has acknowledged ``session.update``.
+
+* sequential: the old order, with a blocking token fetch, then the device
+  opens on the loop, then the handshake;
+* parallel: ``client.TokenSupply`` fetched inside the connect while the devices
+  open in threads, and reconnects served from the spare token;
+* no spare: parallel, but every connection fetches a new token.
+
+    python -m benchmarks.startup --reconnects 5
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+
+import httpx
+import numpy as np
+
+from audio_format import WIRE_RATE
+from audio_io import NullSink
+from benchmarks.loadtest import SESSION_CONFIG
+from benchmarks.token_server import free_port, start_uvicorn
+from benchmarks.voice_pipeline import TurnSource
+from mock_realtime import run_server
+from session import RealtimeSession
+
+
+class SlowSource(TurnSource):
+    """Replayed mic whose open blocks like a device open, then starts on the loop."""
+
+    def __init__(self, path, open_s, threaded):
+        super().__init__(path, turns=100, gap_s=3.0)
+        self.open_s = open_s
+        self.threaded_open = threaded
+        self.loop = None
+
+    def open(self, on_block):
+        time.sleep(self.open_s)
+        self.loop.call_soon_threadsafe(super().open, on_block)
+
+
+class SlowSink(NullSink):
+    def __init__(self, open_s, threaded, **kwargs):
+        super().__init__(**kwargs)
+        self.open_s = open_s
+        self.threaded_open = threaded
+        self.loop = None
+
+    def start(self):
+        time.sleep(self.open_s)
+        self.loop.call_soon_threadsafe(super().start)
+
+
+class NoSpare:
+    """Headers callable that fetches a new token for every connection."""
+
+    def __init__(self, url):
+        self.url = url
+
+    async def headers(self):
+        async with httpx.AsyncClient() as http:
+            resp = await http.post(self.url)
+        return {"Authorization": f"Bearer {resp.json()['client_secret']['value']}"}
+
+
+async def run(mode, args, ws_url, token_url):
+    import client
+
+    loop = asyncio.get_running_loop()
+    threaded = mode != "sequential"
+    source = SlowSource(args.wav, args.device_open_ms / 1000, threaded)
+    sink = SlowSink(args.device_open_ms / 1000, threaded, samplerate=WIRE_RATE)
+    source.loop = sink.loop = loop
+
+    tokens = None
+    token_s = 0.0
+    if mode == "sequential":
+        start = time.monotonic()
+        # Blocking, as the old fetch_token did with requests.post
+        token = httpx.post(token_url).json()["client_secret"]["value"]
+        token_s = time.monotonic() - start
+        headers = {"Authorization": f"Bearer {token}"}
+    elif mode == "parallel":
+        tokens = client.TokenSupply(token_url)
+        headers = tokens.headers
+    else:
+        headers = NoSpare(token_url).headers
+
+    session = RealtimeSession(ws_url, headers, source, sink, SESSION_CONFIG, verbose=False,
+                              reconnect=mode != "sequential", buffer_ms=5000)
+    task = asyncio.create_task(session.run())
+    deadline = loop.time() + 10 + args.reconnects * (args.drop_after_s + 3)
+    want = 1 if mode == "sequential" else args.reconnects + 1
+    while len(session.ready_times) < want and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    if tokens is not None:
+        await tokens.close()
+    cold = [s + token_s for kind, s in session.ready_times if kind == "cold"]
+    warm = [s for kind, s in session.ready_times if kind == "reconnect"]
+    return cold, warm, session.uplink.ring.overruns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wav", default="reply_1.wav")
+    parser.add_argument("--upstream-latency-ms", type=float, default=150)
+    parser.add_argument("--handshake-ms", type=float, default=200)
+    parser.add_argument("--device-open-ms", type=float, default=150)
+    parser.add_argument("--drop-after-s", type=float, default=2.0)
+    parser.add_argument("--reconnects", type=int, default=5)
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = start_uvicorn("stub_openai", stub_port, {"STUB_LATENCY_MS": str(args.upstream_latency_ms)})
+    token_port = free_port()
+    token_server = start_uvicorn("server", token_port, {
+        "OPENAI_API_KEY": "sk-bench", "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "TOKEN_POOL_SIZE": "0",
+    })
+    ws_port = free_port()
+    mock = multiprocessing.Process(target=run_server, args=(ws_port,), daemon=True, kwargs={
+        "silence_ms": 400, "handshake_ms": args.handshake_ms, "drop_after_s": args.drop_after_s,
+    })
+    mock.start()
+    time.sleep(0.5)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    try:
+        print(f"token {args.upstream_latency_ms:.0f} ms upstream, handshake {args.handshake_ms:.0f} ms, "
+              f"device open {args.device_open_ms:.0f} ms x2, drop every {args.drop_after_s:g} s\n")
+        print(f"{'mode':<12}{'cold ms':>10}{'reconnect ms p50':>18}{'max':>8}{'mic overruns':>14}")
+        for mode in ("sequential", "parallel", "no spare"):
+            cold, warm, overruns = asyncio.run(run(mode, args, f"ws://127.0.0.1:{ws_port}",
+                                                   f"http://127.0.0.1:{token_port}/session"))
+            cold_ms = f"{cold[0] * 1000:.0f}" if cold else "-"
+            warm_ms = (f"{np.median(warm) * 1000:>18.0f}{max(warm) * 1000:>8.0f}" if warm
+                       else f"{'-':>18}{'-':>8}")
+            print(f"{mode:<12}{cold_ms:>10}{warm_ms}{overruns:>14}")
+        print("\nreconnect: from the drop to ready, including the jittered backoff (0-250 ms)")
+    finally:
+        mock.terminate()
+        token_server.terminate()
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Real-time factor and CPU of aud.py's transcription loop, old vs streaming.
+
+Replays ``reply_1.wav`` (resampled to 16 kHz) in 1 s frames as fast as the
+decoder allows. The old loop appends every frame to a rolling 10 s buffer and
+re-transcribes all of it; the streaming loop is ``StreamingTranscriber``. RTF
+is processing time over audio time (below 1 keeps up with a live mic), and
+"lag" is how long a frame waits for its decode to finish.
+
+    python -m benchmarks.streaming_asr --model small
+"""
+import argparse
+import time
+import wave
+
+import numpy as np
+from faster_whisper import WhisperModel
+
+from resample import Resampler
+from streaming_asr import StreamingTranscriber
+
+SAMPLE_RATE = 16000
+
+
+def load_wav(path):
+    with wave.open(path, "rb") as w:
+        rate = w.getframerate()
+        # The header of a streamed WAV may claim more frames than exist; read to EOF
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    return Resampler(rate, SAMPLE_RATE).process(samples).astype(np.float32) / 32768
+
+
+def rolling_window(model, frames, max_buffer=10):
+    """The previous aud.transcribe_audio loop."""
+    buffer = np.zeros(0, dtype=np.float32)
+    text = ""
+    lags = []
+    for frame in frames:
+        start = time.perf_counter()
+        buffer = np.concatenate((buffer, frame))
+        if len(buffer) > SAMPLE_RATE * max_buffer:
+            buffer = buffer[-SAMPLE_RATE * max_buffer:]
+        segments, _ = model.transcribe(buffer, beam_size=1)
+        text = "".join([segment.text for segment in segments]).strip()
+        lags.append(time.perf_counter() - start)
+    return text, lags
+
+
+def streaming(model, frames):
+    finals = []
+    transcriber = StreamingTranscriber(
+        model, lambda kind, text: kind == "final" and finals.append(text), samplerate=SAMPLE_RATE
+    )
+    lags = []
+    for frame in frames:
+        start = time.perf_counter()
+        transcriber.feed(frame)
+        lags.append(time.perf_counter() - start)
+    transcriber.finish()
+    return " ".join(finals), lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wav", default="reply_1.wav")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--frame-s", type=float, default=1.0)
+    args = parser.parse_args()
+
+    model = WhisperModel(args.model, device="cpu", compute_type="int8")
+    audio = load_wav(args.wav)
+    step = int(SAMPLE_RATE * args.frame_s)
+    frames = [audio[i:i + step] for i in range(0, len(audio), step)]
+    duration = len(audio) / SAMPLE_RATE
+    model.transcribe(frames[0], beam_size=1)  # warm up
+
+    print(f"{args.wav}: {duration:.1f} s of audio, {len(frames)} frames, model {args.model}\n")
+    print(f"{'loop':<16}{'RTF':>8}{'CPU s':>8}{'lag p50':>10}{'lag max':>10}")
+    texts = {}
+    for name, run in (("rolling 10 s", rolling_window), ("streaming", streaming)):
+        wall, cpu = time.perf_counter(), time.process_time()
+        texts[name], lags = run(model, frames)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        print(f"{name:<16}{wall / duration:>8.2f}{cpu:>8.1f}"
+              f"{np.percentile(lags, 50) * 1000:>8.0f}ms{max(lags) * 1000:>8.0f}ms")
+    for name, text in texts.items():
+        print(f"\n[{name}] {text}")
+
+
+if __name__ == "__main__":
+    main()
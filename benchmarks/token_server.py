@@ -0,0 +1,112 @@
+"""Requests/s and latency of the /session endpoint against the local stub upstream.
+
+Starts ``stub_openai`` and ``server`` under uvicorn, then fires a connection
+storm of concurrent POST /session calls, once minting every token upstream and
+once answering from the pre-minted token pool. A storm longer than the pool
+is bound by upstream either way, so the pool is also measured on a burst
+that fits in it (``--pool-size`` requests).
+
+    python -m benchmarks.token_server --requests 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(module, port, env):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"{module} did not start on port {port}")
+
+
+async def storm(url, requests, concurrency):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            resp = await client.post(url)
+            latencies.append(time.perf_counter() - start)
+            errors += resp.status_code != 200
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return requests / elapsed, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000, errors
+
+
+def wait_for_pool(port, size, timeout=30):
+    deadline = time.monotonic() + timeout
+    while size and time.monotonic() < deadline:
+        if httpx.get(f"http://127.0.0.1:{port}/session/pool").json()["available"] >= size:
+            return
+        time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=64)
+    parser.add_argument("--upstream-latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    stub_port = free_port()
+    stub = start_uvicorn("stub_openai", stub_port, {"STUB_LATENCY_MS": str(args.upstream_latency_ms)})
+    base_env = {"OPENAI_API_KEY": "sk-bench", "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1"}
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"upstream latency {args.upstream_latency_ms:.0f} ms\n")
+    print(f"{'mode':<18}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    try:
+        modes = (
+            ("mint per request", 0, args.requests),
+            ("token pool", args.pool_size, args.requests),
+            ("pool, burst", args.pool_size, args.pool_size),
+        )
+        for mode, pool_size, requests in modes:
+            port = free_port()
+            server = start_uvicorn("server", port, {**base_env, "TOKEN_POOL_SIZE": str(pool_size)})
+            try:
+                wait_for_pool(port, pool_size)
+                rps, p50, p99, errors = asyncio.run(
+                    storm(f"http://127.0.0.1:{port}/session", requests, args.concurrency)
+                )
+                print(f"{mode:<18}{rps:>10.0f}{p50:>10.1f}{p99:>10.1f}{errors:>8}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Time to first audio of chat.speak_text with and without the TTS cache.
+
+Starts ``stub_openai`` and plays ``--turns`` phrases through ``speak_text``: a
+Zipf-weighted draw from stock phrases (greetings, confirmations, error prompts)
+mixed with ``--unique`` of one-off replies. The player is a headless
+``PlaybackEngine`` on a simulated clock running ``--speed`` times real time,
+so only the time to first audio is realistic. Modes:
+
+* uncached: every phrase is synthesized;
+* cold: an empty cache directory, filled as the phrases come;
+* restart: a new cache on that directory, so hits come from memory-mapped files;
+* prewarmed: a new empty directory, stock phrases cached before the first turn.
+
+Then the lookup itself: ``get`` from the memory tier and from a disk file.
+
+    python -m benchmarks.tts_cache --turns 40
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.token_server import free_port, start_uvicorn
+from benchmarks.tts_playback import ClockedPlayer
+from tts_cache import TtsCache
+
+STOCK = [
+    "Hello! How can I help you today?",
+    "Sure.",
+    "Okay, done.",
+    "Sorry, I didn't catch that. Could you say it again?",
+    "One moment please.",
+    "Is there anything else?",
+    "Goodbye, take care!",
+    "I'm having trouble connecting right now. Please try again in a moment.",
+    "Got it.",
+    "Thanks for waiting.",
+]
+
+
+class FastPlayer(ClockedPlayer):
+    """``ClockedPlayer`` whose device clock runs ``speed`` times real time."""
+
+    def __init__(self, speed, **kwargs):
+        super().__init__(**kwargs)
+        self.speed = speed
+
+    def _clock(self):
+        out = np.empty(self.blocksize, dtype=np.int16)
+        interval = self.blocksize / self.samplerate / self.speed
+        next_at = time.monotonic()
+        while self._running:
+            self.render(out)
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+
+
+def workload(turns, unique, seed=0):
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(STOCK))]
+    phrases = []
+    for i in range(turns):
+        if rng.random() < unique:
+            phrases.append(f"Your order number {1000 + i} will arrive on day {rng.randint(1, 28)}.")
+        else:
+            phrases.append(rng.choices(STOCK, weights)[0])
+    return phrases
+
+
+def run(chat, player, phrases, cache):
+    results = [chat.speak_text(text, player, cache=cache) for text in phrases]
+    hits = [r["first_audio_s"] * 1000 for r in results if r["cached"]]
+    misses = [r["first_audio_s"] * 1000 for r in results if not r["cached"]]
+    return results, hits, misses, cache.stats()
+
+
+def lookup_us(cache, key, n=2000):
+    start = time.perf_counter()
+    for _ in range(n):
+        cache.get(key)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--unique", type=float, default=0.3, help="share of one-off phrases")
+    parser.add_argument("--upstream-latency-ms", type=float, default=150)
+    parser.add_argument("--speed", type=float, default=20.0, help="playback clock vs real time")
+    args = parser.parse_args()
+
+    port = free_port()
+    stub = start_uvicorn("stub_openai", port, {"STUB_LATENCY_MS": str(args.upstream_latency_ms)})
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    workdir = tempfile.mkdtemp(prefix="tts_cache_")
+    player = None
+    try:
+        import chat
+
+        player = FastPlayer(args.speed, samplerate=chat.TTS_SAMPLE_RATE)
+        player.start()
+        phrases = workload(args.turns, args.unique)
+        cold_dir, warm_dir = os.path.join(workdir, "cold"), os.path.join(workdir, "prewarmed")
+
+        prewarmed = TtsCache(warm_dir, samplerate=chat.TTS_SAMPLE_RATE)
+        start = time.monotonic()
+        prewarmed.prewarm(STOCK, chat.synthesize, chat.TTS_VOICE, chat.TTS_MODEL).join()
+        prewarm_s = time.monotonic() - start
+
+        modes = [
+            ("uncached", TtsCache(memory_bytes=0)),
+            ("cold", TtsCache(cold_dir, samplerate=chat.TTS_SAMPLE_RATE)),
+            ("restart", lambda: TtsCache(cold_dir, samplerate=chat.TTS_SAMPLE_RATE)),
+            ("prewarmed", prewarmed),
+        ]
+        print(f"{args.turns} phrases ({len(set(phrases))} distinct), upstream latency "
+              f"{args.upstream_latency_ms:.0f} ms; first audio in ms\n")
+        print(f"{'mode':<11}{'hit ratio':>10}{'TTS calls':>11}{'hit p50':>9}{'miss p50':>10}"
+              f"{'all p50':>9}{'all p95':>9}")
+        disk_bytes = {}
+        for mode, cache in modes:
+            cache = cache() if callable(cache) else cache
+            results, hits, misses, stats = run(chat, player, phrases, cache)
+            disk_bytes[mode] = stats["disk_bytes"]
+            first = [r["first_audio_s"] * 1000 for r in results]
+            hit_p50 = f"{np.median(hits):>9.0f}" if hits else f"{'-':>9}"
+            miss_p50 = f"{np.median(misses):>10.0f}" if misses else f"{'-':>10}"
+            print(f"{mode:<11}{stats['hit_ratio']:>10.0%}{len(misses):>11}{hit_p50}{miss_p50}"
+                  f"{np.median(first):>9.0f}{np.percentile(first, 95):>9.0f}")
+        print(f"\nrestart: every hit is a disk hit ({disk_bytes['restart'] / 1024:.0f} KiB on disk); "
+              f"prewarming {len(STOCK)} stock phrases took {prewarm_s:.2f} s in the background")
+
+        cache = TtsCache(cold_dir, samplerate=chat.TTS_SAMPLE_RATE)
+        key = cache.key(STOCK[0], chat.TTS_VOICE, chat.TTS_MODEL)
+        cache.get(key)
+        memory = lookup_us(cache, key)
+        disk = TtsCache(cold_dir, memory_bytes=0, samplerate=chat.TTS_SAMPLE_RATE)
+        print(f"\nget(): memory tier {memory:.1f} µs, disk tier (memory map) {lookup_us(disk, key):.1f} µs")
+    finally:
+        if player is not None:
+            player.close()
+        stub.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
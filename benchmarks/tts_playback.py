@@ -0,0 +1,103 @@
+"""Time to first audio of chat.speak_text against the local stub's streaming TTS.
+
+Starts ``stub_openai`` and points the OpenAI client at it. "buffered" mimics
+the old flow, where the whole response is downloaded before playback starts
+(before the temp file and ffmpeg decode, which only made it slower).
+"streaming" is ``speak_text``, which feeds each HTTP chunk to the player as it
+arrives, with the TTS cache off since every run says the same text
+(``benchmarks.tts_cache`` measures the cache). The player is a
+``PlaybackEngine`` rendered by a thread on a simulated device clock, so no
+sound card is needed.
+
+    python -m benchmarks.tts_playback --words 40 --runs 5
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.token_server import free_port, start_uvicorn
+from playback import PlaybackEngine
+from tts_cache import TtsCache
+
+
+class ClockedPlayer(PlaybackEngine):
+    """Headless player whose device callback runs on a thread at real-time pace."""
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._clock, daemon=True)
+        self._thread.start()
+
+    def _clock(self):
+        out = np.empty(self.blocksize, dtype=np.int16)
+        interval = self.blocksize / self.samplerate
+        next_at = time.monotonic()
+        while self._running:
+            self.render(out)
+            next_at += interval
+            time.sleep(max(0.0, next_at - time.monotonic()))
+
+    def close(self):
+        self._running = False
+
+
+def buffered(chat, text, player):
+    """Download everything, then play: the old flow minus the temp file and ffmpeg."""
+    marks = {}
+    player.on_start = lambda: marks.setdefault("audio", time.monotonic())
+    start = time.monotonic()
+    with chat.client.audio.speech.with_streaming_response.create(
+        model="gpt-4o-mini-tts", voice="alloy", input=text, response_format="pcm",
+    ) as resp:
+        data = resp.read()
+    player.feed_bytes(data)
+    player.mark_done()
+    while player.is_active():
+        time.sleep(0.01)
+    player.on_start = None
+    return {"first_audio_s": marks["audio"] - start, "total_s": time.monotonic() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--upstream-latency-ms", type=float, default=150)
+    parser.add_argument("--pace", type=float, default=4.0, help="synthesis speed vs real time")
+    args = parser.parse_args()
+
+    port = free_port()
+    stub = start_uvicorn("stub_openai", port, {
+        "STUB_LATENCY_MS": str(args.upstream_latency_ms),
+        "STUB_TTS_PACE": str(args.pace),
+    })
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    player = None
+    try:
+        import chat
+
+        text = " ".join(["word"] * args.words)
+        player = ClockedPlayer(samplerate=chat.TTS_SAMPLE_RATE)
+        player.start()
+        print(f"{args.words} words (~{args.words * 0.35:.1f} s of speech), upstream latency "
+              f"{args.upstream_latency_ms:.0f} ms, synthesis {args.pace:g}x real time\n")
+        print(f"{'mode':<12}{'first audio ms':>16}{'total s':>10}")
+        uncached = TtsCache(memory_bytes=0)
+        for mode, speak in (("buffered", lambda: buffered(chat, text, player)),
+                            ("streaming", lambda: chat.speak_text(text, player, cache=uncached))):
+            results = [speak() for _ in range(args.runs)]
+            first = np.median([r["first_audio_s"] for r in results]) * 1000
+            total = np.median([r["total_s"] for r in results])
+            print(f"{mode:<12}{first:>16.0f}{total:>10.2f}")
+    finally:
+        if player is not None:
+            player.close()
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
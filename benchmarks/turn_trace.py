@@ -0,0 +1,114 @@
+"""Per-turn latency breakdown from ``metrics.TurnTracer``, and what tracing costs.
+
+Runs ``--sessions`` RealtimeSessions against the mock server, each replaying the
+first utterance of ``reply_1.wav`` followed by a pause, once with tracing off
+(``NullTracer``) and once with a ``TurnTracer`` per session writing JSONL and
+one of them served over the Prometheus endpoint. Reports CPU per session for
+both, the median milestone intervals of the traced run and a scrape.
+
+The mock ends a turn after ``--silence-ms`` of quiet appended audio, a crude
+stand-in for server VAD's ``silence_duration_ms``; it has to be shorter than
+the client's VAD hangover or the gate closes before the server sees enough.
+
+    python -m benchmarks.turn_trace --sessions 10 --seconds 30
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from audio_format import WIRE_RATE
+from audio_io import NullSink
+from benchmarks.loadtest import SESSION_CONFIG, free_port
+from benchmarks.voice_pipeline import TurnSource
+from metrics import INTERVALS, TurnTracer, serve_prometheus
+from mock_realtime import run_server
+from session import RealtimeSession
+
+HANGOVER_MS = 600
+
+
+async def scrape(port):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    data = await reader.read()
+    writer.close()
+    return data.decode().split("\r\n\r\n", 1)[1]
+
+
+async def run(n, seconds, url, wav, gap_s, traced, workdir):
+    tracers = [TurnTracer(os.path.join(workdir, f"turns_{i}.jsonl"), hangover_ms=HANGOVER_MS,
+                          config={"session": i}) if traced else None for i in range(n)]
+    sessions = [
+        RealtimeSession(url, {}, TurnSource(wav, turns=1000, gap_s=gap_s),
+                        NullSink(samplerate=WIRE_RATE), SESSION_CONFIG,
+                        hangover_ms=HANGOVER_MS, tracer=tracers[i], verbose=False)
+        for i in range(n)
+    ]
+    server = None
+    port = free_port()
+    if traced:
+        server = await serve_prometheus(tracers[0], port)
+    cpu_start = time.process_time()
+    tasks = [asyncio.create_task(s.run()) for s in sessions]
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    text = await scrape(port) if traced else None
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if server is not None:
+        server.close()
+    for tracer in tracers:
+        if tracer is not None:
+            tracer.close()
+    return cpu / seconds * 100 / n, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--wav", default="reply_1.wav")
+    parser.add_argument("--gap-s", type=float, default=4.0)
+    parser.add_argument("--silence-ms", type=int, default=400)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=run_server, args=(port,), daemon=True,
+                                     kwargs={"silence_ms": args.silence_ms, "reply_ms": 2000})
+    server.start()
+    time.sleep(0.5)
+    url = f"ws://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix="turn_trace_")
+    try:
+        off, _ = asyncio.run(run(args.sessions, args.seconds, url, args.wav, args.gap_s, False, workdir))
+        on, text = asyncio.run(run(args.sessions, args.seconds, url, args.wav, args.gap_s, True, workdir))
+
+        records = []
+        for name in os.listdir(workdir):
+            with open(os.path.join(workdir, name)) as f:
+                records += [r for r in map(json.loads, f) if r["type"] == "turn"]
+        print(f"{args.sessions} sessions, {args.seconds:.0f} s each run\n")
+        print(f"CPU per session: tracing off {off:.2f}%, on {on:.2f}%\n")
+        print(f"{len(records)} traced turns, medians:")
+        for name in INTERVALS:
+            values = [r[name] for r in records if name in r]
+            if values:
+                print(f"  {name:<16}{np.median(values):>8.1f} ms")
+        print("\nPrometheus scrape (session 0):")
+        print("\n".join(line for line in text.splitlines() if "quantile=\"0.5\"" in line or "_total" in line))
+    finally:
+        server.terminate()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Per-stage and end-to-end turn latency of chat.py's voice loop against the local stub.
+
+Starts ``stub_openai`` (transcription, streaming chat, streaming PCM TTS) and
+replays the first utterance of ``reply_1.wav`` as a microphone, followed by a
+pause long enough for the reply, for ``--turns`` turns. "pipelined" is
+``chat.VoicePipeline`` with a headless player; "sequential" runs the same
+requests one after another the way the old loop did (full transcription,
+full chat completion, full TTS download, then play), timed from the end of
+speech. The old loop's fixed 6 s recording window comes on top of that.
+
+    python -m benchmarks.voice_pipeline --turns 5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from audio_io import NullSink, WavSource
+from benchmarks.token_server import free_port, start_uvicorn
+from tts_cache import TtsCache
+
+UTTERANCE_S = 2.5
+
+
+class TurnSource(WavSource):
+    """Speaks the same utterance, then stays silent for ``gap_s``, ``turns`` times."""
+
+    def __init__(self, path, turns, gap_s):
+        super().__init__(path, loop=False)
+        utterance = self.samples[:int(UTTERANCE_S * self.samplerate)]
+        gap = np.zeros(int(gap_s * self.samplerate), dtype=np.int16)
+        self.samples = np.concatenate([utterance, gap] * turns)
+
+
+def sequential_turn(chat, audio, samplerate):
+    speech_end = time.monotonic()
+    text = chat.client.audio.transcriptions.create(
+        model="gpt-4o-mini-transcribe",
+        file=("speech.wav", chat.wav_bytes(audio, samplerate), "audio/wav"),
+    ).text
+    transcribed = time.monotonic()
+    reply = chat.chat_with_gpt(text)
+    replied = time.monotonic()
+    with chat.client.audio.speech.with_streaming_response.create(
+        model="gpt-4o-mini-tts", voice="alloy", input=reply, response_format="pcm",
+    ) as resp:
+        resp.read()
+    # Playback would start now
+    done = time.monotonic()
+    return {
+        "transcribe_ms": (transcribed - speech_end) * 1000,
+        "first_sentence_ms": (replied - transcribed) * 1000,
+        "tts_first_byte_ms": (done - replied) * 1000,
+        "first_audio_ms": (done - speech_end) * 1000,
+    }
+
+
+async def pipelined(chat, path, turns, gap_s):
+    source = TurnSource(path, turns, gap_s)
+    player = NullSink(samplerate=chat.TTS_SAMPLE_RATE)
+    # Every turn gets the same reply; keep the TTS cache out of the comparison
+    pipeline = chat.VoicePipeline(source, player, barge_in=False, tts_cache=TtsCache(memory_bytes=0),
+                                  verbose=False)
+    player.start()
+    task = asyncio.create_task(pipeline.run())
+    await asyncio.sleep(len(source.samples) / source.samplerate + 2)
+    task.cancel()
+    player.close()
+    return pipeline.metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wav", default="reply_1.wav")
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--gap-s", type=float, default=14.0, help="silence after each utterance")
+    parser.add_argument("--upstream-latency-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    port = free_port()
+    stub = start_uvicorn("stub_openai", port, {"STUB_LATENCY_MS": str(args.upstream_latency_ms)})
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+    try:
+        import chat
+
+        runs = {"pipelined": asyncio.run(pipelined(chat, args.wav, args.turns, args.gap_s))}
+        wav = WavSource(args.wav)
+        audio = wav.samples[:int(UTTERANCE_S * wav.samplerate)]
+        runs["sequential"] = [sequential_turn(chat, audio, wav.samplerate) for _ in range(args.turns)]
+
+        print(f"{args.turns} turns, upstream latency {args.upstream_latency_ms:.0f} ms (medians)\n")
+        print(f"{'mode':<12}{'transcribe':>12}{'+chat':>10}{'+TTS':>10}{'first audio':>13}")
+        for mode, metrics in runs.items():
+            if not metrics:
+                print(f"{mode:<12}  no completed turns")
+                continue
+            med = {k: np.median([m[k] for m in metrics]) for k in metrics[0]}
+            print(f"{mode:<12}{med['transcribe_ms']:>10.0f}ms{med['first_sentence_ms']:>8.0f}ms"
+                  f"{med['tts_first_byte_ms']:>8.0f}ms{med['first_audio_ms']:>11.0f}ms")
+        print("\ntranscribe: pipelined includes the VAD hangover that ends the turn; "
+              "sequential excludes the fixed 6 s window")
+        print("+chat: to the first sentence (pipelined) or the full reply (sequential); "
+              "+TTS: to its first byte or the full download")
+    finally:
+        stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
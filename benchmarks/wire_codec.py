@@ -0,0 +1,181 @@
+"""Wire codec cost and bandwidth: pcm16 at 24 kHz against G.711 μ-law / A-law at 8 kHz.
+
+Throughput: a minute of ``reply_1.wav`` at a ``--device-rate`` mic goes through
+what a session does per block, resampling to the codec's rate and encoding
+(uplink), then decoding and resampling back to the device rate (downlink).
+Reported as multiples of real time, with the codec step on its own and
+``audioop``'s C implementation alongside when the stdlib still has it.
+
+Bandwidth: the same minute through an ``UplinkCoalescer`` at ``--flush-ms``,
+counting the ``input_audio_buffer.append`` JSON actually sent, plus the codec's
+quantization SNR at its own rate (going to 8 kHz also drops everything above
+4 kHz, which no codec setting brings back).
+
+Live: one headless session per format against ``mock_realtime`` for
+``--seconds``, to check the negotiated format end to end (uplink bytes per
+minute and reply samples played).
+
+    python -m benchmarks.wire_codec --device-rate 48000 --seconds 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+import warnings
+
+import numpy as np
+
+from audio_format import WIRE_RATE
+from audio_io import NullSink, WavSource
+from benchmarks.loadtest import SESSION_CONFIG, free_port
+from benchmarks.voice_pipeline import TurnSource
+from mock_realtime import run_server
+from resample import Resampler
+from session import RealtimeSession
+from uplink import UplinkCoalescer
+from wire_codec import CODECS
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:  # removed in Python 3.13
+        audioop = None
+
+AUDIOOP = {"g711_ulaw": ("lin2ulaw", "ulaw2lin"), "g711_alaw": ("lin2alaw", "alaw2lin")}
+
+
+def speech(path, seconds):
+    """``seconds`` of the wav at the 24 kHz wire rate, looped if it is shorter."""
+    source = WavSource(path, loop=False)
+    samples = Resampler(source.samplerate, WIRE_RATE).process(source.samples)
+    reps = -(-int(seconds * WIRE_RATE) // len(samples))
+    return np.tile(samples, reps)[:int(seconds * WIRE_RATE)]
+
+
+def blocks(samples, size):
+    return [samples[i:i + size] for i in range(0, len(samples), size)]
+
+
+def best_of(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def throughput(codec, mic, device_rate, block):
+    """Seconds of audio per second of CPU for each stage, at ``block`` samples per call."""
+    seconds = len(mic) / device_rate
+    at_codec = Resampler(device_rate, codec.rate).process(mic)
+    code_blocks = blocks(at_codec, block * codec.rate // device_rate)
+    encoded = [codec.encode(b) for b in code_blocks]
+
+    def uplink():
+        resampler = Resampler(device_rate, codec.rate)
+        for b in blocks(mic, block):
+            codec.encode(resampler.process(b))
+
+    def downlink():
+        resampler = Resampler(codec.rate, device_rate)
+        for data in encoded:
+            resampler.process(codec.decode(data))
+
+    row = {
+        "encode": seconds / best_of(lambda: [codec.encode(b) for b in code_blocks]),
+        "decode": seconds / best_of(lambda: [codec.decode(d) for d in encoded]),
+        "uplink": seconds / best_of(uplink),
+        "downlink": seconds / best_of(downlink),
+    }
+    if audioop is not None and codec.name in AUDIOOP:
+        lin2x, x2lin = (getattr(audioop, f) for f in AUDIOOP[codec.name])
+        raw = [b.tobytes() for b in code_blocks]
+        row["ref_encode"] = seconds / best_of(lambda: [lin2x(r, 2) for r in raw])
+        row["ref_decode"] = seconds / best_of(lambda: [x2lin(d, 2) for d in encoded])
+    return row
+
+
+def wire_bytes(codec, wire, flush_ms):
+    """Append JSON bytes for ``wire`` (24 kHz) sent at ``codec``'s rate, and the codec's SNR."""
+    at_codec = Resampler(WIRE_RATE, codec.rate).process(wire)
+    uplink = UplinkCoalescer(samplerate=codec.rate, flush_ms=flush_ms, codec=codec,
+                             capacity_ms=len(wire) * 1000 // WIRE_RATE + 1000)
+    uplink.push(at_codec)
+    sent = 0
+    while (message := uplink.pop_message(partial=True)) is not None:
+        sent += len(message)
+    encoded = codec.encode(at_codec)
+    ref = at_codec.astype(np.float64)
+    err = codec.decode(encoded).astype(np.float64) - ref
+    noise = np.sum(err ** 2)
+    snr = 10 * np.log10(np.sum(ref ** 2) / noise) if noise else float("inf")
+    return sent, len(encoded), snr
+
+
+async def live(url, wav, name, seconds):
+    config = {**SESSION_CONFIG, "input_audio_format": name, "output_audio_format": name}
+    sink = NullSink(samplerate=WIRE_RATE, source_rate=CODECS[name].rate)
+    session = RealtimeSession(url, {}, TurnSource(wav, turns=1000, gap_s=3.0), sink, config,
+                              verbose=False)
+    task = asyncio.create_task(session.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return session.uplink.stats.snapshot()["wire_bytes"], sink.ring.head
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wav", default="reply_1.wav")
+    parser.add_argument("--device-rate", type=int, default=48000)
+    parser.add_argument("--block-ms", type=int, default=21)
+    parser.add_argument("--flush-ms", type=int, default=60)
+    parser.add_argument("--seconds", type=float, default=10.0, help="live session per format, 0 to skip")
+    args = parser.parse_args()
+
+    wire = speech(args.wav, 60)
+    mic = Resampler(WIRE_RATE, args.device_rate).process(wire)
+    block = args.device_rate * args.block_ms // 1000
+
+    print(f"1 min of speech, mic at {args.device_rate} Hz in {args.block_ms} ms blocks; x real time\n")
+    print(f"{'codec':<11}{'encode':>10}{'decode':>10}{'audioop enc':>13}{'audioop dec':>13}"
+          f"{'uplink':>10}{'downlink':>10}")
+    for name, codec in CODECS.items():
+        row = throughput(codec, mic, args.device_rate, block)
+        ref = (f"{row['ref_encode']:>13.0f}{row['ref_decode']:>13.0f}" if "ref_encode" in row
+               else f"{'-':>13}{'-':>13}")
+        print(f"{name:<11}{row['encode']:>10.0f}{row['decode']:>10.0f}{ref}"
+              f"{row['uplink']:>10.0f}{row['downlink']:>10.0f}")
+    print("\nuplink: resample from the device rate + encode; downlink: decode + resample back")
+
+    print(f"\nBytes per minute of speech, {args.flush_ms} ms append frames\n")
+    print(f"{'codec':<11}{'rate':>7}{'payload KiB':>13}{'on wire KiB':>13}{'vs pcm16':>10}{'SNR dB':>8}")
+    base = None
+    for name, codec in CODECS.items():
+        sent, payload, snr = wire_bytes(codec, wire, args.flush_ms)
+        base = base or sent
+        print(f"{name:<11}{codec.rate:>7}{payload / 1024:>13.0f}{sent / 1024:>13.0f}"
+              f"{sent / base:>10.0%}{snr:>8.1f}")
+    print("\nSNR: decode(encode(x)) against x at the codec's rate")
+
+    if args.seconds <= 0:
+        return
+    port = free_port()
+    server = multiprocessing.Process(target=run_server, args=(port,), daemon=True,
+                                     kwargs={"silence_ms": 400, "reply_ms": 2000})
+    server.start()
+    time.sleep(0.5)
+    try:
+        print(f"\nLive against the mock, {args.seconds:g} s per format (VAD-gated mic)\n")
+        print(f"{'codec':<11}{'uplink KiB/min':>16}{'reply samples':>15}")
+        for name in CODECS:
+            sent, played = asyncio.run(live(f"ws://127.0.0.1:{port}", args.wav, name, args.seconds))
+            print(f"{name:<11}{sent / 1024 * 60 / args.seconds:>16.0f}{played:>15}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,123 @@
-from openai import OpenAI
-from pydub import AudioSegment
-from pydub.playback import play
+from openai import APIError, AsyncOpenAI, OpenAI
 import sounddevice as sd
 from scipy.io.wavfile import write
+import asyncio
+import io
+import re
+import sys
 import tempfile
 import os
+import wave
 from dotenv import load_dotenv
+import httpx
 import time
 
+import numpy as np
+
+from audio_format import negotiate_rate
+from audio_io import MicSource
+from playback import PlaybackEngine
+from ringbuffer import PcmRing
+from semantic_cache import SemanticCache
+from tts_cache import TtsCache
+from vad import VadGate
+
 load_dotenv()
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+aclient = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+SYSTEM_PROMPT = "You are a concise and helpful assistant."
+
+# response_format="pcm" is raw 24 kHz 16-bit mono little-endian, no container to decode
+TTS_SAMPLE_RATE = 24000
+TTS_CHUNK_BYTES = 4096
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "alloy"
+
+# Synthesized audio is cached by (text, voice, model, format), so phrases said
+# again play at once with no TTS request (see tts_cache.py). An empty
+# TTS_CACHE_DIR keeps the cache in memory only.
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "realtime-tts"))
+TTS_CACHE_MEMORY_MB = 32
+TTS_CACHE_DISK_MB = 512
+# Optional file of stock phrases, one per line, cached at startup
+TTS_PREWARM_FILE = os.getenv("TTS_PREWARM_FILE")
+
+# SEMANTIC_CACHE=1: a question close enough to one answered in the last
+# SEMANTIC_CACHE_TTL_S gets the same answer without a chat request (see
+# semantic_cache.py; needs sentence-transformers)
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_TTL_S = 3600
+SEMANTIC_CACHE_SIZE = 10_000
+
+# Pipelined mode: a turn ends after VAD_HANGOVER_MS of silence instead of a fixed 6 s
+VAD_THRESHOLD = 500
+VAD_PREROLL_MS = 300
+VAD_HANGOVER_MS = 700
+MAX_UTTERANCE_S = 30
+# A reply is spoken sentence by sentence, starting before the rest is generated
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_player = None
+_tts_cache = None
+_answer_cache = None
+
+def get_player():
+    """Shared output stream, opened once at the device's native rate."""
+    global _player
+    if _player is None:
+        _player = PlaybackEngine(samplerate=negotiate_rate("output"), source_rate=TTS_SAMPLE_RATE)
+        _player.start()
+    return _player
+
+def get_tts_cache():
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TtsCache(TTS_CACHE_DIR or None, memory_bytes=TTS_CACHE_MEMORY_MB * 2**20,
+                              disk_bytes=TTS_CACHE_DISK_MB * 2**20, samplerate=TTS_SAMPLE_RATE)
+    return _tts_cache
+
+def get_answer_cache():
+    """The shared semantic answer cache, or None when SEMANTIC_CACHE is off."""
+    global _answer_cache
+    if SEMANTIC_CACHE and _answer_cache is None:
+        import models
+
+        # Load the embedding model before the first question arrives
+        models.prewarm("minilm")
+        _answer_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE,
+                                      ttl_s=SEMANTIC_CACHE_TTL_S)
+    return _answer_cache
+
+def print_answer_cache_stats(cache):
+    stats = cache.stats() if cache is not None else {"lookups": 0}
+    if stats["lookups"]:
+        print(f"🧠 Answer cache: {stats['hit_ratio']:.0%} of {stats['lookups']} questions answered from it, "
+              f"{stats['saved_s']:.1f} s of model time saved (lookup p50 {stats['p50_ms']:.1f} ms)")
+
+def synthesize(text):
+    """The whole TTS response for ``text`` as raw PCM bytes."""
+    with client.audio.speech.with_streaming_response.create(
+        model=TTS_MODEL, voice=TTS_VOICE, input=text, response_format="pcm",
+    ) as resp:
+        return resp.read()
+
+def prewarm_tts():
+    """Cache the stock phrases from TTS_PREWARM_FILE in the background, if set."""
+    if not TTS_PREWARM_FILE:
+        return None
+    with open(TTS_PREWARM_FILE, encoding="utf-8") as f:
+        phrases = [line.strip() for line in f if line.strip()]
+    print(f"🔥 Caching {len(phrases)} stock phrases from {TTS_PREWARM_FILE}")
+    return get_tts_cache().prewarm(phrases, synthesize, TTS_VOICE, TTS_MODEL)
+
+def print_tts_cache_stats(cache):
+    stats = cache.stats()
+    if stats["lookups"]:
+        print(f"🗃 TTS cache: {stats['hit_ratio']:.0%} of {stats['lookups']} phrases cached "
+              f"({stats['memory_hits']} memory, {stats['disk_hits']} disk), "
+              f"{stats['served_s']:.0f} s of audio not synthesized again")
 
 def record_audio(duration=6, samplerate=44100):
     print(" Listening...")
@@ -31,28 +139,301 @@ def chat_with_gpt(prompt):
     reply = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=[
-            {"role": "system", "content": "You are a concise and helpful assistant."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ]
     )
     return reply.choices[0].message.content
 
-def speak_text(text):
-    with client.audio.speech.with_streaming_response.create(
-        model="gpt-4o-mini-tts",
-        voice="alloy",
-        input=text,
-    ) as resp:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp:
-            resp.stream_to_file(tmp.name)
-            path = tmp.name
-    audio = AudioSegment.from_file(path, format="mp3")
-    play(audio)
-    os.remove(path)
+def answer(prompt, cache=None):
+    """``(reply, hit)``: the cached answer to a close enough earlier question, else the model's."""
+    if cache is None:
+        return chat_with_gpt(prompt), None
+    hit, query = cache.lookup(prompt)
+    if hit is not None:
+        return hit["answer"], hit
+    start = time.monotonic()
+    reply = chat_with_gpt(prompt)
+    cache.put(query, reply, cost_s=time.monotonic() - start)
+    return reply, None
+
+def speak_text(text, player=None, cache=None):
+    """Stream TTS as raw PCM into the output ring; playback starts with the first chunk.
+
+    Phrases in the TTS cache are played from it without a request. Returns
+    seconds from the request (or lookup) to the first byte, the first audio
+    played and the end of playback.
+    """
+    player = player or get_player()
+    cache = cache or get_tts_cache()
+    key = cache.key(text, TTS_VOICE, TTS_MODEL, "pcm")
+    marks = {}
+    player.on_start = lambda: marks.setdefault("audio", time.monotonic())
+    start = time.monotonic()
+    pcm = cache.get(key)
+    if pcm is not None:
+        marks["first_byte"] = time.monotonic()
+        player.feed(pcm)
+    else:
+        audio = bytearray()
+        with client.audio.speech.with_streaming_response.create(
+            model=TTS_MODEL,
+            voice=TTS_VOICE,
+            input=text,
+            response_format="pcm",
+        ) as resp:
+            for chunk in resp.iter_bytes(TTS_CHUNK_BYTES):
+                marks.setdefault("first_byte", time.monotonic())
+                player.feed_bytes(chunk)
+                audio += chunk
+        cache.put(key, audio)
+    player.mark_done()
+    while player.is_active():
+        time.sleep(0.01)
+    player.on_start = None
+    end = time.monotonic()
+
+    timings = {
+        "first_byte_s": marks.get("first_byte", end) - start,
+        "first_audio_s": marks.get("audio", end) - start,
+        "total_s": end - start,
+        "cached": pcm is not None,
+    }
+    print(f"🔈 First audio after {timings['first_audio_s'] * 1000:.0f} ms"
+          f"{' (cached)' if timings['cached'] else ''}")
+    return timings
+
+def wav_bytes(samples, samplerate):
+    """An int16 mono recording as an in-memory WAV file."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(samplerate)
+        w.writeframes(samples.tobytes())
+    return buf.getvalue()
+
+async def stream_sentences(prompt):
+    """Yield the reply to ``prompt`` one sentence at a time, as it streams in."""
+    stream = await aclient.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        stream=True,
+    )
+    pending = ""
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        pending += chunk.choices[0].delta.content or ""
+        *sentences, pending = SENTENCE_END.split(pending)
+        for sentence in sentences:
+            yield sentence
+    if pending.strip():
+        yield pending.strip()
+
+class VoicePipeline:
+    """Record, transcribe, chat and speak with the stages overlapping.
+
+    A VAD gate on the mic ends each turn at the first pause. The recording is
+    uploaded from memory, the chat reply streams, and each sentence goes to
+    TTS as soon as it is complete, so the first sentence plays while later
+    ones are still being generated. The mic stays open during playback; with
+    ``barge_in`` the user speaking over a reply cuts it off. Sentences in
+    ``tts_cache`` are played from it without a TTS request, and questions
+    found in ``answer_cache`` (a ``SemanticCache``) skip the chat request.
+    """
+
+    def __init__(self, source, player, barge_in=True, tts_cache=None, answer_cache=None, verbose=True):
+        self.source = source
+        self.player = player
+        self.tts_cache = tts_cache or get_tts_cache()
+        self.answer_cache = answer_cache
+        self.barge_in = barge_in
+        self.verbose = verbose
+        self.recording = PcmRing(source.samplerate * MAX_UTTERANCE_S)
+        self.gate = VadGate(
+            self.recording.write,
+            samplerate=source.samplerate,
+            threshold=VAD_THRESHOLD,
+            preroll_ms=VAD_PREROLL_MS,
+            hangover_ms=VAD_HANGOVER_MS,
+            # The assistant's own voice must not start a turn
+            echo_level=lambda: player.far_end_level,
+        )
+        self.turns = asyncio.Queue()
+        self.metrics = []
+        self._reply = None
+        self._interrupted = False
+        self._loop = None
+
+    def log(self, *args, **kwargs):
+        if self.verbose:
+            print(*args, **kwargs)
+
+    # --- audio thread side ---
+
+    def _on_block(self, samples):
+        state = self.gate.process(samples)
+        if state == "open":
+            self._loop.call_soon_threadsafe(self._on_speech_onset)
+        elif state == "close":
+            # The gate closes a hangover after the last loud block
+            speech_end = time.monotonic() - VAD_HANGOVER_MS / 1000
+            self._loop.call_soon_threadsafe(self.turns.put_nowait, (speech_end, self.recording.read()))
+
+    # --- event loop side ---
+
+    def _on_speech_onset(self):
+        self.log("\n Listening...")
+        if self.barge_in and self._reply is not None and self.player.is_active():
+            self._interrupted = True
+            self._reply.cancel()
+            self.player.flush()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self.source.open(self._on_block)
+        try:
+            while True:
+                speech_end, audio = await self.turns.get()
+                self._reply = asyncio.create_task(self.respond(speech_end, audio))
+                try:
+                    await self._reply
+                except asyncio.CancelledError:
+                    if not self._interrupted:
+                        raise
+                    self.log("(Interrupted)")
+                except (APIError, httpx.HTTPError) as e:
+                    # One failed request costs this turn, not the session
+                    self.log(f"⚠ Turn failed: {type(e).__name__}: {e}")
+                self._reply = None
+                self._interrupted = False
+        finally:
+            self.source.close()
+
+    async def respond(self, speech_end, audio):
+        m = {"speech_end": speech_end}
+        result = await aclient.audio.transcriptions.create(
+            model="gpt-4o-mini-transcribe",
+            file=("speech.wav", wav_bytes(audio, self.source.samplerate), "audio/wav"),
+        )
+        m["transcribed"] = time.monotonic()
+        text = result.text
+        if not text.strip():
+            self.log("(No speech detected, retrying...)")
+            return
+        self.log(f"\n You said: {text}")
+
+        hit = None
+        if self.answer_cache is not None:
+            # Embedding takes milliseconds of CPU; keep the loop free
+            loop = asyncio.get_running_loop()
+            hit, query = await loop.run_in_executor(None, self.answer_cache.lookup, text)
+        sentences = asyncio.Queue()
+        speaker = asyncio.create_task(self._speak(sentences, m))
+        try:
+            if hit is not None:
+                # Split as when it streamed, so the sentences hit the TTS cache too
+                m["first_sentence"] = time.monotonic()
+                reply = SENTENCE_END.split(hit["answer"])
+                for sentence in reply:
+                    sentences.put_nowait(sentence)
+                self.log(f"(Answered from cache, similarity {hit['score']:.2f})")
+            else:
+                reply = []
+                async for sentence in stream_sentences(text):
+                    m.setdefault("first_sentence", time.monotonic())
+                    reply.append(sentence)
+                    sentences.put_nowait(sentence)
+            m["chat_done"] = time.monotonic()
+            sentences.put_nowait(None)
+            if hit is None and self.answer_cache is not None:
+                self.answer_cache.put(query, " ".join(reply), cost_s=m["chat_done"] - m["transcribed"])
+            self.log(f"Assistant: {' '.join(reply)}\n")
+            await speaker
+        finally:
+            speaker.cancel()
+        self.report(m)
+
+    async def _speak(self, sentences, m):
+        self.player.on_start = lambda: m.setdefault("first_audio", time.monotonic())
+        try:
+            while (sentence := await sentences.get()) is not None:
+                key = self.tts_cache.key(sentence, TTS_VOICE, TTS_MODEL, "pcm")
+                # Inline: a memory hit is a dict lookup, a disk hit only maps the file
+                pcm = self.tts_cache.get(key)
+                if pcm is not None:
+                    m.setdefault("tts_first_byte", time.monotonic())
+                    self.player.feed(pcm)
+                    continue
+                audio = bytearray()
+                async with aclient.audio.speech.with_streaming_response.create(
+                    model=TTS_MODEL,
+                    voice=TTS_VOICE,
+                    input=sentence,
+                    response_format="pcm",
+                ) as resp:
+                    async for chunk in resp.iter_bytes(TTS_CHUNK_BYTES):
+                        m.setdefault("tts_first_byte", time.monotonic())
+                        self.player.feed_bytes(chunk)
+                        audio += chunk
+                # Only complete sentences are cached; a barge-in cancels before this.
+                # The file write runs off the loop, which handles onsets and barge-in
+                await asyncio.to_thread(self.tts_cache.put, key, bytes(audio))
+            self.player.mark_done()
+            while self.player.is_active():
+                await asyncio.sleep(0.01)
+            m["played"] = time.monotonic()
+        finally:
+            self.player.on_start = None
+
+    def report(self, m):
+        # Timed from the end of speech, so the VAD hangover counts towards the first stage
+        end = m["speech_end"]
+        stages = {
+            "transcribe_ms": (m["transcribed"] - end) * 1000,
+            "first_sentence_ms": (m.get("first_sentence", m["transcribed"]) - m["transcribed"]) * 1000,
+            "tts_first_byte_ms": (m.get("tts_first_byte", m["chat_done"]) - m.get("first_sentence", m["chat_done"])) * 1000,
+            "first_audio_ms": (m.get("first_audio", m["played"]) - end) * 1000,
+            "turn_s": m["played"] - end,
+        }
+        self.metrics.append(stages)
+        self.log(
+            f"⏱ end of turn + transcribe {stages['transcribe_ms']:.0f} ms, first sentence +{stages['first_sentence_ms']:.0f} ms, "
+            f"TTS first byte +{stages['tts_first_byte_ms']:.0f} ms -> first audio "
+            f"{stages['first_audio_ms']:.0f} ms after you stopped (turn {stages['turn_s']:.1f} s)"
+        )
+
+    def summary(self):
+        if not self.metrics:
+            return {}
+        return {key: float(np.median([m[key] for m in self.metrics])) for key in self.metrics[0]}
+
+async def pipelined_main():
+    print("=== GPT-4o-mini Continuous Voice Chat (pipelined) ===")
+    print("Press Ctrl+C to stop.\n")
+    prewarm_tts()
+    pipeline = VoicePipeline(MicSource(), get_player(), answer_cache=get_answer_cache())
+    try:
+        await pipeline.run()
+    finally:
+        print_tts_cache_stats(pipeline.tts_cache)
+        print_answer_cache_stats(pipeline.answer_cache)
+        summary = pipeline.summary()
+        if summary:
+            print(f"\n Median over {len(pipeline.metrics)} turns: first audio "
+                  f"{summary['first_audio_ms']:.0f} ms after speech end "
+                  f"(transcribe {summary['transcribe_ms']:.0f} ms, "
+                  f"first sentence +{summary['first_sentence_ms']:.0f} ms, "
+                  f"TTS first byte +{summary['tts_first_byte_ms']:.0f} ms)")
 
 def main():
     print("=== GPT-4o-mini Continuous Voice Chat ===")
     print("Press Ctrl+C to stop.\n")
+    prewarm_tts()
     try:
         while True:
             audio_path = record_audio(duration=6)
@@ -65,13 +446,24 @@ def main():
 
             print(f"\n You said: {text}")
             print("Thinking...")
-            reply = chat_with_gpt(text)
+            reply, hit = answer(text, get_answer_cache())
+            if hit is not None:
+                print(f"(Answered from cache, similarity {hit['score']:.2f})")
             print(f"Assistant: {reply}\n")
             speak_text(reply)
             time.sleep(0.5)
 
     except KeyboardInterrupt:
+        print_tts_cache_stats(get_tts_cache())
+        print_answer_cache_stats(get_answer_cache())
         print("\n Exiting cleanly. Goodbye!")
 
 if __name__ == "__main__":
-    main()
+    # --sequential: the original fixed-length record -> transcribe -> chat -> speak loop
+    if "--sequential" in sys.argv:
+        main()
+    else:
+        try:
+            asyncio.run(pipelined_main())
+        except KeyboardInterrupt:
+            print("\n Exiting cleanly. Goodbye!")
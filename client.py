@@ -1,282 +1,339 @@
 import asyncio
+import os
+import time
 import websockets
 import json
-import base64
-import sounddevice as sd
-import time
-import numpy as np
-import requests
-import queue
-import threading
-
-SERVER_URL = "http://localhost:8000/session"
+import httpx
 
-# Global queue for audio playback
-playback_queue = queue.Queue()
-
-def audio_playback_thread(samplerate):
-    """Separate thread for smooth audio playback"""
-    stream = sd.OutputStream(samplerate=samplerate, channels=1, dtype='int16', blocksize=4096)
-    stream.start()
-
-    try:
-        while True:
-            audio_data = playback_queue.get()
-            if audio_data is None:  # Poison pill to stop thread
-                break
-            stream.write(audio_data)
-    finally:
-        stream.stop()
-        stream.close()
+from audio_format import negotiate_rate
+from audio_io import MicSource
+from metrics import TurnTracer, serve_prometheus
+from session_log import SessionRecorder
+from playback import PlaybackEngine
+from session import REALTIME_URL, RealtimeSession
+from wire_codec import get_codec
 
-async def sender(ws, queue):
-    """Sends audio from the queue to the WebSocket with minimal latency."""
-    assistant_is_speaking = False
-    
-    try:
+SERVER_URL = "http://localhost:8000/session"
+# A spare token with less validity than this left is replaced before use
+TOKEN_MIN_TTL = 20
+
+# Reconnect after a dropped socket: jittered exponential backoff from
+# RECONNECT_BACKOFF_S, mic audio buffered up to RECONNECT_BUFFER_MS meanwhile
+RECONNECT_BACKOFF_S = 0.25
+RECONNECT_BACKOFF_MAX_S = 8.0
+RECONNECT_MAX_RETRIES = 10
+RECONNECT_BUFFER_MS = 5000
+# Set to e.g. ws://localhost:8000/relay to go through the server's relay instead
+# of opening our own upstream connection with an ephemeral token
+RELAY_URL = os.getenv("RELAY_URL")
+
+# Uplink coalescing: one append event per flush budget instead of per 512-sample block
+UPLINK_FLUSH_MS = 60
+UPLINK_MAX_BYTES = None
+UPLINK_QUEUE_SIZE = 16                # Encoded frames allowed to wait on a stalled socket
+UPLINK_BACKPRESSURE = "drop_oldest"   # or "block" to hold audio in the uplink ring
+
+# Client-side VAD gate. The hangover must outlast the server's silence_duration_ms
+# so server VAD still sees the trailing silence that ends the turn.
+VAD_ENERGY_THRESHOLD = int(os.getenv("VAD_ENERGY_THRESHOLD", "300"))  # Lower threshold for faster detection
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "300"))    # Audio kept from before onset (>= server prefix_padding_ms)
+VAD_HANGOVER_MS = int(os.getenv("VAD_HANGOVER_MS", "600"))  # Trailing silence sent before the gate closes
+VAD_ECHO_GAIN = 1.0         # Mic must beat this x speaker level while the assistant talks
+
+# Server VAD. silence_duration_ms is most of the wait between the user stopping
+# and the reply starting; tune it against the traces below.
+SERVER_VAD_THRESHOLD = float(os.getenv("SERVER_VAD_THRESHOLD", "0.5"))
+SERVER_VAD_PREFIX_MS = int(os.getenv("SERVER_VAD_PREFIX_MS", "200"))
+SERVER_VAD_SILENCE_MS = int(os.getenv("SERVER_VAD_SILENCE_MS", "400"))
+
+# Wire audio format, both directions: pcm16 (24 kHz) or g711_ulaw / g711_alaw
+# (8 kHz, one byte per sample, a sixth of pcm16's bandwidth) for slow uplinks
+WIRE_FORMAT = os.getenv("WIRE_FORMAT", "pcm16")
+
+# Device block sizes: smaller blocks cut capture and playout latency at more wakeups
+MIC_BLOCK_MS = int(os.getenv("MIC_BLOCK_MS", "21"))
+PLAYBACK_BLOCKSIZE = int(os.getenv("PLAYBACK_BLOCKSIZE", "480"))
+
+# Per-turn latency tracing (see metrics.py): JSONL file and/or a Prometheus
+# scrape port. Both unset leaves tracing off.
+METRICS_JSONL = os.getenv("METRICS_JSONL")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Record every event and the raw mic audio to this file for offline replay
+# (python session_log.py replay <file>)
+SESSION_LOG = os.getenv("SESSION_LOG")
+
+# Retrieval: when set, passages from this embedding store (see retrieval.py and
+# trans.py) matching each user turn are added to the conversation before replying
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR")
+RAG_TOP_K = 3
+RAG_CACHE_SIZE = 256
+# Answer without passages if a turn's transcript takes longer than this
+RAG_TRANSCRIPT_TIMEOUT_S = 3.0
+
+# ✅ Enable input AND output audio transcription with FASTER VAD
+SESSION_CONFIG = {
+    "instructions": "You are a sweet calm and friendly therapist listening to my conversations and answering my issues only and only in English language",
+    "voice": "alloy",
+    "input_audio_format": WIRE_FORMAT,
+    "output_audio_format": WIRE_FORMAT,
+    "input_audio_transcription": {
+        "model": "whisper-1"
+    },
+    "turn_detection": {
+        "type": "server_vad",
+        "threshold": SERVER_VAD_THRESHOLD,           # Lower = more sensitive, faster response
+        "prefix_padding_ms": SERVER_VAD_PREFIX_MS,   # Reduced from 300ms
+        "silence_duration_ms": SERVER_VAD_SILENCE_MS  # Reduced from 800ms - triggers faster
+    },
+    "modalities": ["text", "audio"]
+}
+
+
+class TokenSupply:
+    """Ephemeral tokens from our server, fetched without blocking the loop.
+
+    One spare token is fetched ahead and refreshed before it gets within
+    ``min_ttl`` seconds of expiry, so a reconnect does not wait on the token
+    round trip. Used as the session's per-connection ``headers`` callable.
+    """
+
+    def __init__(self, url, min_ttl=TOKEN_MIN_TTL):
+        self.url = url
+        self.min_ttl = min_ttl
+        self.spare = None
+        self.hits = 0
+        self.misses = 0
+        self._http = None
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    @staticmethod
+    def expires_at(session_info):
+        return session_info["client_secret"]["expires_at"]
+
+    def _fresh(self, session_info):
+        return session_info is not None and self.expires_at(session_info) > time.time() + self.min_ttl
+
+    async def _fetch(self):
+        resp = await self._http.post(self.url)
+        resp.raise_for_status()
+        session_info = resp.json()
+        if not session_info.get("client_secret", {}).get("value"):
+            print("❌ Error: Could not find 'client_secret' in server response.")
+            print("Full response:", json.dumps(session_info, indent=2))
+            raise ValueError("no client_secret in the server response")
+        if not session_info["client_secret"].get("expires_at"):
+            # Never fresh, so _keep_spare would fetch again at once, forever
+            print("❌ Error: the server's token has no 'expires_at'.")
+            raise ValueError("no client_secret.expires_at in the server response")
+        return session_info
+
+    async def get(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=10)
+        session_info, self.spare = self.spare, None
+        if self._fresh(session_info):
+            self.hits += 1
+        else:
+            self.misses += 1
+            try:
+                session_info = await self._fetch()
+            except httpx.HTTPError:
+                print(f"❌ Error connecting to the server at {self.url}.")
+                print("Please make sure the server is running with 'uvicorn server:app --reload'")
+                raise
+        if self._task is None:
+            self._task = asyncio.create_task(self._keep_spare())
+        self._wakeup.set()
+        return session_info["client_secret"]["value"]
+
+    async def headers(self):
+        return {
+            "Authorization": f"Bearer {await self.get()}",
+            "OpenAI-Beta": "realtime=v1"
+        }
+
+    async def _keep_spare(self):
+        backoff = 1.0
         while True:
+            self._wakeup.clear()
+            if not self._fresh(self.spare):
+                try:
+                    self.spare = await self._fetch()
+                    backoff = 1.0
+                except (httpx.HTTPError, ValueError):
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+            # Sleep until the spare is taken or needs replacing
+            timeout = max(0.0, self.expires_at(self.spare) - self.min_ttl - time.time())
             try:
-                # Send audio immediately without buffering
-                audio_b64, is_silent = await asyncio.wait_for(queue.get(), timeout=0.01)
-                
-                # Don't send audio while assistant is speaking (prevent feedback)
-                if not assistant_is_speaking:
-                    await ws.send(json.dumps({
-                        "type": "input_audio_buffer.append",
-                        "audio": audio_b64
-                    }))
-
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
             except asyncio.TimeoutError:
                 pass
 
-    except asyncio.CancelledError:
-        pass
-    except Exception as e:
-        print(f"⚠ Sender error: {e}")
-
-async def receiver(ws, sender_control):
-    """Receives messages and handles both user and assistant transcription."""
-    assistant_text_buffer = ""
-    is_assistant_responding = False
-
-    try:
-        async for msg in ws:
-            data = json.loads(msg)
-            msg_type = data.get("type")
-            now = time.time()
-
-            # Track when assistant starts/stops speaking
-            if msg_type == "response.audio.delta":
-                sender_control['assistant_speaking'] = True
-                audio_b64 = data.get("delta")
-                if audio_b64:
-                    audio = np.frombuffer(base64.b64decode(audio_b64), dtype=np.int16)
-                    playback_queue.put(audio)
-            
-            elif msg_type == "response.audio.done":
-                sender_control['assistant_speaking'] = False
-
-            # ✅ Assistant text output
-            elif msg_type == "response.text.delta":
-                delta = data.get("delta", "")
-                if delta:
-                    if not is_assistant_responding:
-                        print(f"\n🤖 [Assistant]: ", end="", flush=True)
-                        is_assistant_responding = True
-                    print(f"{delta}", end="", flush=True)
-                    assistant_text_buffer += delta
-            
-            # ✅ Assistant audio transcript
-            elif msg_type == "response.audio_transcript.delta":
-                delta = data.get("delta", "")
-                if delta:
-                    if not is_assistant_responding:
-                        print(f"\n🤖 [Assistant]: ", end="", flush=True)
-                        is_assistant_responding = True
-                    print(f"{delta}", end="", flush=True)
-                    assistant_text_buffer += delta
-            
-            elif msg_type == "response.audio_transcript.done":
-                transcript = data.get("transcript", "").strip()
-                if transcript:
-                    if not is_assistant_responding and not assistant_text_buffer:
-                        print(f"\n🤖 [Assistant]: {transcript}")
-                    # Mark as done
-                    pass
-
-            # ✅ User speech transcription (from File 1)
-            elif msg_type == "conversation.item.input_audio_transcription.completed":
-                transcript = data.get("transcript", "").strip()
-                if transcript:
-                    print(f"\n{'-' * 60}")
-                    print(f"- YOU: {transcript}")
-                    print(f"{'-' * 60}")
-
-            # Debug: Print all message types to see what we're receiving
-
-            # Status events
-            elif msg_type == "input_audio_buffer.speech_started":
-                print("\n\n👂 Listening...", flush=True)
-
-            elif msg_type == "input_audio_buffer.speech_stopped":
-                print("⚙️  Processing...", flush=True)
-
-            elif msg_type == "session.created":
-                print("\n" + "=" * 60)
-                print("✅ Session established")
-
-            elif msg_type == "session.updated":
-                print("✅ Transcription enabled")
-                print("=" * 60)
-                print("\n🎙️ Start speaking now...\n")
-
-            elif msg_type == "response.done":
-                if is_assistant_responding:
-                    print("\n")  # Add spacing after response
-                    is_assistant_responding = False
-                    assistant_text_buffer = ""
-
-            elif msg_type == "error":
-                error_msg = data.get("error", {}).get("message", "")
-                if "buffer" not in error_msg.lower():
-                    print(f"\n❌ Error: {error_msg}")
-
-    except asyncio.CancelledError:
-        pass
-    except Exception as e:
-        print(f"⚠ Receiver error: {e}")
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._http is not None:
+            await self._http.aclose()
 
 
 async def audio_stream():
-    # Fetch ephemeral token
-    try:
-        resp = requests.post(SERVER_URL)
-        resp.raise_for_status()
-        session_info = resp.json()
-        print("✅ Session token received")
-    except requests.exceptions.RequestException:
-        print(f"❌ Error connecting to the server at {SERVER_URL}.")
-        print("Please make sure the server is running with 'uvicorn server:app --reload'")
-        return
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return
-
-    client_secret_obj = session_info.get('client_secret', {})
-    token = client_secret_obj.get('value')
-
-    if not token:
-        print("❌ Error: Could not find 'client_secret' in server response.")
-        print("Full response:", json.dumps(session_info, indent=2))
-        return
-
-    realtime_ws_url = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "OpenAI-Beta": "realtime=v1"
-    }
+    tokens = None
+    if RELAY_URL:
+        # The relay authenticates upstream itself
+        url, headers = RELAY_URL, {}
+        print(f"🔁 Using relay at {RELAY_URL}")
+    else:
+        # Fetched inside the session's connect, while the audio devices open
+        tokens = TokenSupply(SERVER_URL)
+        url, headers = REALTIME_URL, tokens.headers
 
     print("🔌 Connecting to WebSocket...")
 
-    samplerate = 16000
-    playback_thread = threading.Thread(target=audio_playback_thread, args=(samplerate,), daemon=True)
-    playback_thread.start()
+    retriever = None
+    if RAG_INDEX_DIR:
+        from retrieval import CachedRetriever, EmbeddingStore
+        import models
+
+        # Load the embedding model while the session connects
+        models.prewarm("minilm")
+        retriever = CachedRetriever(EmbeddingStore(RAG_INDEX_DIR), k=RAG_TOP_K, cache_size=RAG_CACHE_SIZE)
+        print(f"📚 Retrieval from {RAG_INDEX_DIR}")
+
+    # Open devices at their native rates and resample to/from the wire codec's rate
+    codec = get_codec(WIRE_FORMAT)
+    source = MicSource(block_ms=MIC_BLOCK_MS)
+    playback = PlaybackEngine(samplerate=negotiate_rate("output"), source_rate=codec.rate,
+                              blocksize=PLAYBACK_BLOCKSIZE)
+
+    tracer = None
+    metrics_server = None
+    if METRICS_JSONL or METRICS_PORT:
+        tracer = TurnTracer(METRICS_JSONL, hangover_ms=VAD_HANGOVER_MS, config={
+            "vad_threshold": VAD_ENERGY_THRESHOLD,
+            "vad_preroll_ms": VAD_PREROLL_MS,
+            "vad_hangover_ms": VAD_HANGOVER_MS,
+            "server_vad": SESSION_CONFIG["turn_detection"],
+            "mic_rate": source.samplerate,
+            "mic_blocksize": source.blocksize,
+            "playback_rate": playback.samplerate,
+            "playback_blocksize": playback.blocksize,
+            "uplink_flush_ms": UPLINK_FLUSH_MS,
+        })
+        if METRICS_PORT:
+            metrics_server = await serve_prometheus(tracer, METRICS_PORT)
+            print(f"📈 Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+        if METRICS_JSONL:
+            print(f"📈 Tracing turns to {METRICS_JSONL}")
+    recorder = None
+    if SESSION_LOG:
+        recorder = SessionRecorder(SESSION_LOG, meta={
+            "mic_rate": source.samplerate,
+            "session_config": SESSION_CONFIG,
+        })
+        print(f"📼 Recording session to {SESSION_LOG}")
+
+    session = RealtimeSession(
+        url,
+        headers,
+        source,
+        playback,
+        SESSION_CONFIG,
+        flush_ms=UPLINK_FLUSH_MS,
+        max_bytes=UPLINK_MAX_BYTES,
+        queue_size=UPLINK_QUEUE_SIZE,
+        backpressure=UPLINK_BACKPRESSURE,
+        vad_threshold=VAD_ENERGY_THRESHOLD,
+        preroll_ms=VAD_PREROLL_MS,
+        hangover_ms=VAD_HANGOVER_MS,
+        echo_gain=VAD_ECHO_GAIN,
+        retriever=retriever,
+        transcript_timeout_s=RAG_TRANSCRIPT_TIMEOUT_S,
+        tracer=tracer,
+        recorder=recorder,
+        reconnect=True,
+        backoff_s=RECONNECT_BACKOFF_S,
+        backoff_max_s=RECONNECT_BACKOFF_MAX_S,
+        max_retries=RECONNECT_MAX_RETRIES,
+        buffer_ms=RECONNECT_BUFFER_MS,
+    )
+    print(f"🎙️ Recording at {source.samplerate}Hz, playing at {playback.samplerate}Hz "
+          f"(wire {codec.name} {codec.rate}Hz). Speak clearly when ready!\n")
 
     try:
-        async with websockets.connect(
-            realtime_ws_url,
-            additional_headers=headers,
-            ping_interval=20,
-            ping_timeout=20
-        ) as ws:
-            print("✅ Connected. Listening for audio...\n")
-
-            # ✅ Enable input AND output audio transcription with FASTER VAD
-            await ws.send(json.dumps({
-                "type": "session.update",
-                "session": {
-                    "instructions": "You are a sweet calm and friendly therapist listening to my conversations and answering my issues only and only in English language",
-                    "voice": "alloy",
-                    "input_audio_format": "pcm16",
-                    "output_audio_format": "pcm16",
-                    "input_audio_transcription": {
-                        "model": "whisper-1"
-                    },
-                    "turn_detection": {
-                        "type": "server_vad",
-                        "threshold": 0.5,              # Lower = more sensitive, faster response
-                        "prefix_padding_ms": 200,      # Reduced from 300ms
-                        "silence_duration_ms": 400     # Reduced from 800ms - triggers faster
-                    },
-                    "modalities": ["text", "audio"]
-                }
-            }))
-
-            loop = asyncio.get_running_loop()
-            queue = asyncio.Queue()
-            
-            # Shared control for preventing feedback
-            sender_control = {'assistant_speaking': False}
-
-            energy_threshold = 300  # Lower threshold for faster detection
-
-            def callback(indata, frames, time_info, status):
-                # Don't process input while assistant is speaking
-                if sender_control['assistant_speaking']:
-                    return
-
-                # Flatten the audio buffer and ensure correct dtype
-                samples = indata[:, 0].astype(np.int16)
-
-                # Compute RMS safely (avoid int16 overflow)
-                energy = np.sqrt(np.mean(samples.astype(np.float32) ** 2))
-                is_silent = energy < energy_threshold
-
-                # Serialize audio to bytes for sending
-                audio_bytes = samples.tobytes()
-                b64 = base64.b64encode(audio_bytes).decode("utf-8")
-
-                loop.call_soon_threadsafe(queue.put_nowait, (b64, is_silent))
-
-            input_samplerate = 24000  # Match output samplerate for better performance
-            blocksize = 512  # Smaller blocks = lower latency
-            print(f"🎙️ Recording at {input_samplerate}Hz. Speak clearly when ready!\n")
-
-            with sd.InputStream(
-                callback=callback,
-                channels=1,
-                samplerate=input_samplerate,
-                dtype='int16',
-                blocksize=blocksize
-            ):
-                sender_task = asyncio.create_task(sender(ws, queue))
-                receiver_task = asyncio.create_task(receiver(ws, sender_control))
-
-                try:
-                    await asyncio.wait(
-                        [sender_task, receiver_task],
-                        return_when=asyncio.FIRST_COMPLETED,
-                    )
-                except KeyboardInterrupt:
-                    print("\n\n🛑 Stopping...")
-                finally:
-                    for task in [sender_task, receiver_task]:
-                        task.cancel()
-                        try:
-                            await task
-                        except asyncio.CancelledError:
-                            pass
-
+        await session.run()
+    except KeyboardInterrupt:
+        print("\n\n🛑 Stopping...")
     except websockets.exceptions.InvalidStatusCode as e:
         print(f"❌ WebSocket connection failed with status {e.status_code}")
     except Exception as e:
         print(f"⚠ WebSocket error: {type(e).__name__}: {e}")
     finally:
-        playback_queue.put(None)
-        playback_thread.join(timeout=1)
+        print_summary(session)
+        if metrics_server is not None:
+            metrics_server.close()
+        if tracer is not None:
+            tracer.close()
+        if recorder is not None:
+            recorder.close()
+        if tokens is not None:
+            await tokens.close()
+
+
+def print_summary(session):
+    stats = session.stats()
+    uplink = stats['uplink']
+    print(
+        f"📤 Uplink: {uplink['frames']} frames "
+        f"({uplink['frames_per_s']:.1f}/s), "
+        f"{uplink['wire_bytes'] / 1024:.1f} KiB on the wire "
+        f"({uplink['wire_bytes_per_s'] / 1024:.1f} KiB/s), "
+        f"{stats['uplink_dropped']} dropped, "
+        f"VAD passed {stats['vad_pass_ratio']:.0%} of mic audio"
+    )
+    playback = stats['playback']
+    print(
+        f"🔈 Playback: {playback['underruns']} underruns, "
+        f"jitter buffer {playback['target_ms']:.0f} ms, "
+        f"added latency {playback['added_latency_ms']:.0f} ms "
+        f"(max {playback['max_added_latency_ms']:.0f} ms)"
+    )
+    if playback['interrupts']:
+        print(
+            f"✋ Barge-in: {playback['interrupts']} interrupts, interrupt-to-silence "
+            f"{playback['interrupt_latency_ms']:.0f} ms (max {playback['max_interrupt_latency_ms']:.0f} ms)"
+        )
+    retrieval = stats['retrieval']
+    if retrieval and retrieval['lookups']:
+        print(
+            f"📚 Retrieval: {retrieval['lookups']} lookups, {retrieval['hits']} cache hits, "
+            f"added {retrieval['p50_ms']:.0f} ms per turn (max {retrieval['max_ms']:.0f} ms)"
+        )
+    ready = stats['ready']
+    if ready:
+        cold = [s for kind, s in ready if kind == "cold"]
+        warm = sorted(s for kind, s in ready if kind == "reconnect")
+        line = f"⚡ Ready: cold start {cold[0] * 1000:.0f} ms" if cold else "⚡ Ready:"
+        if warm:
+            line += (f", {len(warm)} reconnects ({stats['reconnects']} attempts) in "
+                     f"{warm[len(warm) // 2] * 1000:.0f} ms median")
+        print(line)
+    trace = stats['trace']
+    if trace and trace['turns']:
+        print(
+            f"📈 Turns: {trace['turns']} traced, time to first audio "
+            f"{trace.get('ttfa_ms', float('nan')):.0f} ms median (server VAD "
+            f"{trace.get('server_vad_ms', float('nan')):.0f} ms, response "
+            f"{trace.get('response_ms', float('nan')):.0f} ms, playout "
+            f"{trace.get('playout_ms', float('nan')):.0f} ms), "
+            f"max loop lag {trace['max_loop_lag_ms']:.1f} ms"
+        )
 
 if __name__ == "__main__":
     try:
         asyncio.run(audio_stream())
     except KeyboardInterrupt:
-        print("\n👋 Goodbye!")
\ No newline at end of file
+        print("\n👋 Goodbye!")
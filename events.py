@@ -0,0 +1,113 @@
+"""Table-driven dispatch of realtime server events.
+
+Handlers are registered per event type. The type is found by scanning the
+start of the raw message, so events nobody handles are never parsed, and
+"raw" handlers (used for ``response.audio.delta``) can slice the fields they
+need out of the string without building a dict around a large base64 payload.
+Full parsing uses orjson when it is installed.
+"""
+import json
+
+try:
+    import orjson
+
+    loads = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:
+    loads = json.loads
+    JSON_BACKEND = "json"
+
+
+def _span_at(raw, key, start=0):
+    """``(begin, end)`` of the first ``"key": "..."`` string value at or after ``start``, else None.
+
+    Returns None as well when the value contains escapes, so callers fall back
+    to a full parse instead of returning a wrongly sliced value.
+    """
+    i = raw.find(f'"{key}"', start)
+    if i < 0:
+        return None
+    i += len(key) + 2
+    n = len(raw)
+    while i < n and raw[i] in ' \t\r\n':
+        i += 1
+    if i >= n or raw[i] != ':':
+        return None
+    i += 1
+    while i < n and raw[i] in ' \t\r\n':
+        i += 1
+    if i >= n or raw[i] != '"':
+        return None
+    end = raw.find('"', i + 1)
+    if end < 0 or raw.find('\\', i + 1, end) >= 0:
+        return None
+    return i + 1, end
+
+
+def _string_at(raw, key, start=0):
+    span = _span_at(raw, key, start)
+    return raw[span[0]:span[1]] if span else None
+
+
+def peek_type(raw):
+    """Event type read from the raw text, or None if it is not a top-level leading key."""
+    i = raw.find('"type"')
+    # Only trust it when no nested object opens before it
+    if i < 0 or raw.find('{', 1, i) >= 0:
+        return None
+    return _string_at(raw, "type", i)
+
+
+def slice_field(raw, key):
+    """Top-level string field sliced out of the raw text (None if absent or escaped).
+
+    Only meant for events whose layout is known, like audio deltas where the
+    field is not repeated inside a nested object.
+    """
+    return _string_at(raw, key)
+
+
+def field_span(raw, key):
+    """Where ``slice_field``'s value sits in ``raw``: ``(begin, end)``, or None."""
+    return _span_at(raw, key)
+
+
+class EventDispatcher:
+    """Maps event types to handlers; ``dispatch`` returns whatever the handler returns."""
+
+    def __init__(self):
+        self.handlers = {}
+        self.raw_handlers = {}
+        self.unhandled = 0
+
+    def on(self, event_type):
+        """Register ``handler(event_dict)`` for an event type."""
+        def register(handler):
+            self.handlers[event_type] = handler
+            return handler
+        return register
+
+    def on_raw(self, event_type):
+        """Register ``handler(raw_text)`` for an event type; the message is not parsed."""
+        def register(handler):
+            self.raw_handlers[event_type] = handler
+            return handler
+        return register
+
+    def dispatch(self, raw):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        event_type = peek_type(raw)
+        data = None
+        if event_type is None:
+            data = loads(raw)
+            event_type = data.get("type")
+
+        handler = self.raw_handlers.get(event_type)
+        if handler is not None:
+            return handler(raw)
+        handler = self.handlers.get(event_type)
+        if handler is None:
+            self.unhandled += 1
+            return None
+        return handler(data if data is not None else loads(raw))
@@ -0,0 +1,136 @@
+"""Bounded conversation history for chat-completions requests.
+
+Every request resends the conversation, so an unbounded list makes each turn
+slower and larger than the last. ``ConversationHistory`` keeps the most recent
+turns verbatim and, once they exceed a token budget, folds the oldest ones into
+a rolling summary (or drops them when no summarizer is given). The request
+payload then stays around ``budget_tokens`` however long the conversation runs.
+
+Token counts use tiktoken when it is installed and a characters/4 estimate
+otherwise; the budget is a target, not an exact limit.
+"""
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text):
+        return len(_encoding.encode(text))
+
+    TOKENIZER = "tiktoken"
+except ImportError:
+    def count_tokens(text):
+        return (len(text) + 3) // 4
+
+    TOKENIZER = "estimate"
+
+# Per-message framing (role, separators) the API adds on top of the content
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation so far in a few sentences for the assistant's own "
+    "reference. Keep names, facts, preferences and open questions; drop small talk."
+)
+
+
+def message_tokens(message):
+    return count_tokens(message["content"] or "") + MESSAGE_OVERHEAD
+
+
+class ConversationHistory:
+    """Recent turns plus a rolling summary of older ones, within ``budget_tokens``.
+
+    ``summarize(previous_summary, messages)`` returns a new summary string that
+    covers both; it is only called when the budget is exceeded. ``keep_recent``
+    messages are never folded, so the last exchanges stay verbatim. Compaction
+    trims down to ``low_water`` x the budget, so the summarizer runs every few
+    turns rather than on every one.
+    """
+
+    def __init__(self, system_prompt, budget_tokens=1500, keep_recent=4,
+                 summarize=None, summary_tokens=300, low_water=0.6):
+        self.system = {"role": "system", "content": system_prompt}
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens
+        self.low_water = low_water
+        self.summary = ""
+        self.turns = []
+        self.folded = 0
+        self.dropped = 0
+        self.compactions = 0
+
+    def add(self, role, content):
+        self.turns.append({"role": role, "content": content})
+
+    def messages(self):
+        """The message list to send: system prompt, summary if any, recent turns."""
+        out = [self.system]
+        if self.summary:
+            out.append({"role": "system", "content": f"Earlier in this conversation: {self.summary}"})
+        return out + self.turns
+
+    def tokens(self):
+        return sum(message_tokens(m) for m in self.messages())
+
+    def compact(self):
+        """Fold or drop the oldest turns until the history fits the budget.
+
+        Returns True when anything changed. Call it after a turn completes (e.g.
+        while the reply plays) so summarizing never delays a request.
+        """
+        if self.tokens() <= self.budget_tokens:
+            return False
+        over = self.tokens() - int(self.budget_tokens * self.low_water)
+        cut = 0
+        freed = 0
+        # Oldest first, never into the last keep_recent messages
+        while cut < len(self.turns) - self.keep_recent and freed < over:
+            freed += message_tokens(self.turns[cut])
+            cut += 1
+        if cut == 0:
+            return False
+        old, self.turns = self.turns[:cut], self.turns[cut:]
+        if self.summarize is not None:
+            self.summary = self._clip(self.summarize(self.summary, old))
+            self.folded += len(old)
+        else:
+            self.dropped += len(old)
+        self.compactions += 1
+        return True
+
+    def _clip(self, text):
+        # A summarizer that ignores the length instruction must not grow the payload
+        limit = self.summary_tokens * 4
+        while text and count_tokens(text) > self.summary_tokens:
+            text = text[:limit]
+            limit = int(limit * 0.9)
+        return text.strip()
+
+    def stats(self):
+        return {
+            "turns": len(self.turns),
+            "tokens": self.tokens(),
+            "summary_tokens": count_tokens(self.summary) if self.summary else 0,
+            "folded": self.folded,
+            "dropped": self.dropped,
+            "compactions": self.compactions,
+        }
+
+
+def chat_summarizer(client, model="gpt-4o-mini"):
+    """``summarize`` callback backed by a (cheap) chat model."""
+    def summarize(previous, messages):
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        if previous:
+            transcript = f"Summary so far: {previous}\n\n{transcript}"
+        reply = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+        )
+        return reply.choices[0].message.content or previous
+    return summarize
@@ -0,0 +1,230 @@
+"""Per-turn latency tracing for realtime sessions, exported as JSONL and Prometheus text.
+
+A turn runs from the local VAD opening on the user's speech to the end of the
+assistant's reply. Its milestones are ``time.monotonic()`` timestamps:
+
+* ``mic_onset`` / ``mic_close``: the VAD gate opening and closing, stamped in
+  the input callback (so they include no event loop delay);
+* ``last_uplink``: the last audio frame of the turn written to the socket;
+* ``speech_stopped``: the server VAD's end of turn;
+* ``response_created`` / ``first_delta`` / ``response_done``: server events;
+* ``first_played``: the first reply sample handed to the output device,
+  stamped in the output callback.
+
+Audio threads only take a timestamp and hand it to the event loop, which owns
+all tracer state. Derived metrics (time to first audio and its parts,
+underruns, queue depths, event loop lag) are computed when the turn ends.
+
+``NullTracer`` has the same interface and does nothing; sessions use it unless
+tracing is asked for.
+"""
+import asyncio
+import collections
+import json
+import time
+
+import numpy as np
+
+# Derived per-turn metrics, in milliseconds: name -> (later milestone, earlier milestone)
+# speech_end is mic_close minus the local VAD hangover, i.e. when the user stopped talking
+INTERVALS = {
+    "server_vad_ms": ("speech_stopped", "speech_end"),
+    "uplink_tail_ms": ("last_uplink", "mic_close"),
+    "response_ms": ("first_delta", "speech_stopped"),
+    "playout_ms": ("first_played", "first_delta"),
+    "ttfa_ms": ("first_played", "speech_end"),
+    "reply_ms": ("response_done", "response_created"),
+}
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class TurnTracer:
+    """Collects milestones per turn; finished turns go to ``jsonl_path`` and the summaries.
+
+    ``config`` (VAD and blocksize settings, say) is written as the first JSONL
+    line so traces from different tuning runs can be told apart. ``window``
+    finished turns are kept for the Prometheus quantiles.
+    """
+
+    enabled = True
+
+    def __init__(self, jsonl_path=None, config=None, window=1024, hangover_ms=0):
+        self.jsonl = open(jsonl_path, "a", buffering=1) if jsonl_path else None
+        self.hangover = hangover_ms / 1000
+        self.turns = 0
+        self.interrupted = 0
+        self.underruns = 0
+        self.values = {name: collections.deque(maxlen=window) for name in INTERVALS}
+        self.totals = {name: [0.0, 0] for name in INTERVALS}
+        self.loop_lag = 0.0
+        self.max_loop_lag = 0.0
+        self._turn = None
+        self._gauges = {}
+        self._turn_lag = 0.0
+        self._underruns_at_start = 0
+        if self.jsonl and config:
+            self.jsonl.write(json.dumps({"type": "config", "wall_time": time.time(), **config}) + "\n")
+
+    # --- event loop side ---
+
+    def speech_onset(self, t, underruns=0):
+        """The local VAD opened at ``t``; starts a turn unless one is still being spoken."""
+        turn = self._turn
+        if turn is not None:
+            if "speech_stopped" not in turn:
+                # A pause within the same utterance: keep the first onset
+                return
+            self.finish(underruns, interrupted="response_done" not in turn)
+        self._turn = {"mic_onset": t}
+        self._gauges = {}
+        self._turn_lag = 0.0
+        self._underruns_at_start = underruns
+
+    @property
+    def current(self):
+        """The open turn's milestones (compare by identity to see if a turn is still open)."""
+        return self._turn
+
+    def mark(self, name, t=None):
+        """Record milestone ``name`` for the current turn, keeping the first occurrence."""
+        turn = self._turn
+        if turn is not None and name not in turn:
+            turn[name] = time.monotonic() if t is None else t
+
+    def mark_last(self, name, t=None):
+        """Like ``mark``, but later occurrences overwrite earlier ones (e.g. the gate closing)."""
+        if self._turn is not None:
+            self._turn[name] = time.monotonic() if t is None else t
+
+    def sample(self, **gauges):
+        """Attach gauge readings (queue depths) to the current turn, keeping the first."""
+        if self._turn is not None:
+            for name, value in gauges.items():
+                self._gauges.setdefault(name, value)
+
+    def finish(self, underruns=0, interrupted=False):
+        """Close the current turn and export it."""
+        turn, self._turn = self._turn, None
+        if turn is None:
+            return None
+        if "mic_close" in turn:
+            turn["speech_end"] = turn["mic_close"] - self.hangover
+        record = {"type": "turn", "turn": self.turns, "interrupted": interrupted}
+        start = turn["mic_onset"]
+        for name, t in turn.items():
+            record[name] = round((t - start) * 1000, 2)  # ms since onset
+        record.update(self._gauges)
+        for name, (later, earlier) in INTERVALS.items():
+            if later in turn and earlier in turn:
+                ms = (turn[later] - turn[earlier]) * 1000
+                record[name] = round(ms, 2)
+                self.values[name].append(ms)
+                self.totals[name][0] += ms
+                self.totals[name][1] += 1
+        record["underruns"] = underruns - self._underruns_at_start
+        record["loop_lag_max_ms"] = round(self._turn_lag * 1000, 2)
+        self.turns += 1
+        self.interrupted += interrupted
+        self.underruns += record["underruns"]
+        if self.jsonl:
+            self.jsonl.write(json.dumps(record) + "\n")
+        return record
+
+    async def watch_loop(self, interval=0.05):
+        """Measure how late the loop wakes a sleeper; run as a task next to the session."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, loop.time() - start - interval)
+            self.max_loop_lag = max(self.max_loop_lag, self.loop_lag)
+            self._turn_lag = max(self._turn_lag, self.loop_lag)
+
+    def close(self):
+        if self.jsonl:
+            self.jsonl.close()
+            self.jsonl = None
+
+    # --- export ---
+
+    def summary(self):
+        out = {"turns": self.turns, "interrupted": self.interrupted, "underruns": self.underruns,
+               "max_loop_lag_ms": self.max_loop_lag * 1000}
+        for name, values in self.values.items():
+            if values:
+                out[name] = float(np.median(values))
+        return out
+
+    def prometheus(self, prefix="realtime"):
+        """Prometheus text exposition format (0.0.4) of the counters and summaries."""
+        lines = [
+            f"# TYPE {prefix}_turns_total counter",
+            f"{prefix}_turns_total {self.turns}",
+            f"# TYPE {prefix}_interrupted_turns_total counter",
+            f"{prefix}_interrupted_turns_total {self.interrupted}",
+            f"# TYPE {prefix}_playback_underruns_total counter",
+            f"{prefix}_playback_underruns_total {self.underruns}",
+            f"# TYPE {prefix}_event_loop_lag_seconds gauge",
+            f"{prefix}_event_loop_lag_seconds {self.loop_lag:.6f}",
+            f"# TYPE {prefix}_event_loop_lag_max_seconds gauge",
+            f"{prefix}_event_loop_lag_max_seconds {self.max_loop_lag:.6f}",
+        ]
+        for name, values in self.values.items():
+            metric = f"{prefix}_{name[:-3]}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            if values:
+                for q, v in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                    lines.append(f'{metric}{{quantile="{q}"}} {v / 1000:.6f}')
+            total, count = self.totals[name]
+            lines.append(f"{metric}_sum {total / 1000:.6f}")
+            lines.append(f"{metric}_count {count}")
+        return "\n".join(lines) + "\n"
+
+
+class NullTracer:
+    """Tracing switched off: every call is a no-op."""
+
+    enabled = False
+    current = None
+
+    def speech_onset(self, t, underruns=0):
+        pass
+
+    def mark(self, name, t=None):
+        pass
+
+    def mark_last(self, name, t=None):
+        pass
+
+    def sample(self, **gauges):
+        pass
+
+    def finish(self, underruns=0, interrupted=False):
+        return None
+
+    def close(self):
+        pass
+
+    def summary(self):
+        return None
+
+
+async def serve_prometheus(tracer, port, host="127.0.0.1"):
+    """Serve ``tracer.prometheus()`` over plain HTTP on every request path (for scraping)."""
+    async def handle(reader, writer):
+        try:
+            # Only the request head matters; the body of a GET is empty
+            await reader.readuntil(b"\r\n\r\n")
+            body = tracer.prometheus().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\n"
+                         b"Content-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                         b"Connection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
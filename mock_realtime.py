@@ -0,0 +1,188 @@
+"""Local mock of the realtime WebSocket API for load tests and benchmarks.
+
+Speaks just enough of the protocol for RealtimeSession: it acknowledges
+``session.update``, counts appended audio, and after every ``turn_ms`` of user
+audio emits ``speech_stopped`` followed by a scripted response of ``reply_ms``
+of ``response.audio.delta`` events. With ``silence_ms`` the turn instead ends
+like server VAD does, once that much appended audio stays below
+``silence_rms``. ``handshake_ms`` delays every WebSocket handshake (standing in
+for TLS to a remote host) and ``drop_after_s`` closes each connection
+abnormally after that long, to exercise reconnects. ``response.cancel`` and
+``conversation.item.truncate`` are honoured so barge-in can be exercised, and
+so are the ``input_audio_format`` / ``output_audio_format`` of ``session.update``.
+
+    python mock_realtime.py --port 8765
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+
+import numpy as np
+import websockets
+
+from vad import block_rms
+from wire_codec import CODECS, get_codec
+
+
+class MockRealtimeServer:
+    def __init__(self, turn_ms=3000, reply_ms=2000, chunk_ms=100, think_ms=150, pace=4.0,
+                 silence_ms=None, silence_rms=300, handshake_ms=0, drop_after_s=None):
+        self.turn_ms = turn_ms
+        self.handshake = handshake_ms / 1000
+        self.drop_after_s = drop_after_s
+        self.silence_ms = silence_ms
+        self.silence_rms = silence_rms
+        self.chunk_ms = chunk_ms
+        self.chunks = max(1, reply_ms // chunk_ms)
+        self.think = think_ms / 1000
+        # Deltas go out ``pace`` times faster than real time, like the real API
+        self.chunk_interval = chunk_ms / 1000 / pace
+        # One reply chunk per wire format, encoded once
+        self.chunk_b64 = {}
+        for name, codec in CODECS.items():
+            t = np.arange(codec.rate * chunk_ms // 1000) / codec.rate
+            tone = (np.sin(2 * np.pi * 220 * t) * 4000).astype(np.int16)
+            self.chunk_b64[name] = base64.b64encode(codec.encode(tone)).decode("ascii")
+        self.ids = itertools.count(1)
+        self.connections = 0
+
+    async def serve(self, host="127.0.0.1", port=0):
+        return await websockets.serve(self.handler, host, port, max_size=None,
+                                      process_request=self._delay_handshake if self.handshake else None)
+
+    async def _delay_handshake(self, connection, request):
+        await asyncio.sleep(self.handshake)
+        return None
+
+    async def handler(self, ws):
+        self.connections += 1
+        n = next(self.ids)
+        await ws.send(json.dumps({"type": "session.created", "session": {"id": f"sess_{n}"}}))
+        dropper = None
+        if self.drop_after_s:
+            dropper = asyncio.create_task(self._drop(ws))
+        received_ms = 0.0
+        silent_ms = 0.0
+        speaking = False
+        response = None
+        input_codec = output_codec = CODECS["pcm16"]
+
+        try:
+            async for raw in ws:
+                event = json.loads(raw)
+                kind = event.get("type")
+
+                if kind == "session.update":
+                    session = event.get("session", {})
+                    input_codec = get_codec(session.get("input_audio_format", input_codec.name))
+                    output_codec = get_codec(session.get("output_audio_format", output_codec.name))
+                    await ws.send(json.dumps({"type": "session.updated", "session": event.get("session", {})}))
+
+                elif kind == "input_audio_buffer.append":
+                    # base64 chars -> bytes -> samples -> ms at the codec's rate
+                    chunk_ms = (len(event.get("audio", "")) * 3 / 4 / input_codec.bytes_per_sample
+                                * 1000 / input_codec.rate)
+                    received_ms += chunk_ms
+                    if self.silence_ms is None:
+                        loud, ended = True, received_ms >= self.turn_ms
+                    else:
+                        pcm = input_codec.decode(base64.b64decode(event.get("audio", "")))
+                        loud = block_rms(pcm) >= self.silence_rms
+                        silent_ms = 0.0 if loud else silent_ms + chunk_ms
+                        ended = speaking and silent_ms >= self.silence_ms
+                    if not speaking and loud:
+                        speaking = True
+                        silent_ms = 0.0
+                        await ws.send(json.dumps({"type": "input_audio_buffer.speech_started"}))
+                    if ended:
+                        received_ms = 0.0
+                        speaking = False
+                        await ws.send(json.dumps({"type": "input_audio_buffer.speech_stopped"}))
+                        if response is not None:
+                            response.cancel()
+                        response = asyncio.create_task(self.respond(ws, output_codec))
+
+                elif kind == "response.create":
+                    if response is not None:
+                        response.cancel()
+                    response = asyncio.create_task(self.respond(ws, output_codec))
+
+                elif kind == "response.cancel":
+                    if response is not None:
+                        response.cancel()
+                        response = None
+
+                elif kind == "conversation.item.truncate":
+                    await ws.send(json.dumps({
+                        "type": "conversation.item.truncated",
+                        "item_id": event.get("item_id"),
+                        "content_index": event.get("content_index", 0),
+                        "audio_end_ms": event.get("audio_end_ms", 0),
+                    }))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if response is not None:
+                response.cancel()
+            if dropper is not None:
+                dropper.cancel()
+
+    async def _drop(self, ws):
+        await asyncio.sleep(self.drop_after_s)
+        await ws.close(1011, "mock: connection dropped")
+
+    async def respond(self, ws, codec):
+        n = next(self.ids)
+        response_id, item_id = f"resp_{n}", f"item_{n}"
+        try:
+            await asyncio.sleep(self.think)
+            await ws.send(json.dumps({"type": "response.created", "response": {"id": response_id}}))
+            delta = json.dumps({
+                "type": "response.audio.delta",
+                "response_id": response_id,
+                "item_id": item_id,
+                "output_index": 0,
+                "content_index": 0,
+                "delta": self.chunk_b64[codec.name],
+            })
+            for _ in range(self.chunks):
+                await ws.send(delta)
+                await asyncio.sleep(self.chunk_interval)
+            await ws.send(json.dumps({"type": "response.audio.done", "response_id": response_id, "item_id": item_id}))
+            await ws.send(json.dumps({"type": "response.done", "response": {"id": response_id, "status": "completed"}}))
+        except asyncio.CancelledError:
+            done = {"type": "response.done", "response": {"id": response_id, "status": "cancelled"}}
+            try:
+                await ws.send(json.dumps(done))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+def run_server(port, host="127.0.0.1", **kwargs):
+    """Blocking entry point, also used to run the mock in a separate process."""
+    async def main():
+        server = MockRealtimeServer(**kwargs)
+        async with await server.serve(host, port):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock realtime WebSocket server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--turn-ms", type=int, default=3000)
+    parser.add_argument("--reply-ms", type=int, default=2000)
+    parser.add_argument("--silence-ms", type=int, default=None, help="end turns on silence instead of --turn-ms")
+    args = parser.parse_args()
+    print(f"Mock realtime server on ws://{args.host}:{args.port}")
+    try:
+        run_server(args.port, args.host, turn_ms=args.turn_ms, reply_ms=args.reply_ms,
+                   silence_ms=args.silence_ms)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,113 @@
+"""Shared registry of heavy models, loaded lazily and cached on local disk.
+
+Nothing is imported or loaded until a model is first asked for: ``get`` loads
+it once, under a per-model lock, and every later call (from any thread) gets
+the same instance. ``prewarm`` does the load plus a dummy inference on a
+background thread so the first real request does not pay for either.
+
+Weights live under ``MODEL_CACHE_DIR``. Once a model is there it is opened
+with ``local_files_only``, so a warm start makes no network round trips to the
+model hub.
+"""
+import os
+import threading
+import time
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "realtime-models"))
+
+
+def _load_whisper(cache_dir, size="small", compute_type="int8"):
+    from faster_whisper import WhisperModel
+
+    root = os.path.join(cache_dir, "whisper")
+    try:
+        return WhisperModel(size, device="cpu", compute_type=compute_type,
+                            download_root=root, local_files_only=True)
+    except Exception:
+        # Not cached yet: download once into the cache
+        return WhisperModel(size, device="cpu", compute_type=compute_type, download_root=root)
+
+
+def _warm_whisper(model):
+    import numpy as np
+
+    segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1)
+    list(segments)
+
+
+def _load_sentence_transformer(cache_dir, name="all-MiniLM-L6-v2"):
+    from sentence_transformers import SentenceTransformer
+
+    folder = os.path.join(cache_dir, "sentence-transformers")
+    try:
+        return SentenceTransformer(name, cache_folder=folder, local_files_only=True)
+    except Exception:
+        return SentenceTransformer(name, cache_folder=folder)
+
+
+def _warm_sentence_transformer(model):
+    model.encode(["warm up"])
+
+
+class ModelRegistry:
+    """Named model loaders; each model is loaded at most once per process."""
+
+    def __init__(self, cache_dir=MODEL_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.loaders = {}
+        self.models = {}
+        self.timings = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warmup=None, **kwargs):
+        """``loader(cache_dir, **kwargs)`` builds the model; ``warmup(model)`` runs a dummy inference."""
+        with self._lock:
+            self.loaders[name] = (loader, warmup, kwargs)
+            self._locks[name] = threading.Lock()
+
+    def get(self, name, warm=False):
+        """The model, loading it on first use; blocks while another thread is loading it."""
+        model = self.models.get(name)
+        if model is not None and (not warm or "warmup_s" in self.timings[name]):
+            return model
+        with self._locks[name]:
+            model = self.models.get(name)
+            if model is None:
+                loader, _, kwargs = self.loaders[name]
+                os.makedirs(self.cache_dir, exist_ok=True)
+                start = time.perf_counter()
+                model = loader(self.cache_dir, **kwargs)
+                self.timings[name] = {"load_s": time.perf_counter() - start}
+                self.models[name] = model
+            warmup = self.loaders[name][1]
+            if warm and warmup is not None and "warmup_s" not in self.timings[name]:
+                start = time.perf_counter()
+                warmup(model)
+                self.timings[name]["warmup_s"] = time.perf_counter() - start
+            return model
+
+    def prewarm(self, *names):
+        """Load and warm up models on a background thread; returns the thread."""
+        def run():
+            for name in names:
+                try:
+                    self.get(name, warm=True)
+                except Exception as e:
+                    print(f"⚠ Prewarm of {name} failed: {e}")
+
+        thread = threading.Thread(target=run, name="model-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def loaded(self, name):
+        return name in self.models
+
+
+registry = ModelRegistry()
+registry.register("whisper-small", _load_whisper, _warm_whisper, size="small")
+registry.register("whisper-tiny", _load_whisper, _warm_whisper, size="tiny")
+registry.register("minilm", _load_sentence_transformer, _warm_sentence_transformer)
+
+get = registry.get
+prewarm = registry.prewarm
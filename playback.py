@@ -0,0 +1,204 @@
+"""Callback-driven audio playback with a preallocated adaptive jitter buffer."""
+import base64
+import time
+
+import numpy as np
+
+from resample import Resampler
+from ringbuffer import PcmRing
+from vad import block_rms
+
+
+class PlaybackEngine:
+    """Feeds a PortAudio output callback from a preallocated int16 ring.
+
+    Deltas are written into the ring as they arrive and the device callback
+    pulls exactly one block at a time, so write sizes no longer follow delta
+    sizes. A burst only starts playing once ``target_ms`` is buffered; every
+    underrun raises the target (up to ``max_target_ms``) and it decays back
+    towards ``min_target_ms`` after ``adapt_window_s`` of clean playback.
+
+    ``samplerate`` is the device rate; audio fed at ``source_rate`` (the wire
+    rate) is resampled on the way into the ring when the two differ.
+
+    For barge-in the engine tracks how much of the current conversation item
+    has actually been played, and ``far_end_level`` follows the RMS of what was
+    sent to the speaker (peak-hold with ``echo_decay`` per block) so the mic VAD
+    can discount the assistant's own voice.
+
+    ``on_start``, if set, is called from the audio thread whenever a burst
+    starts playing (useful for measuring time to first audio).
+    """
+
+    # start() blocks in PortAudio; sessions run it in a thread
+    threaded_open = True
+
+    def __init__(self, samplerate=24000, source_rate=None, blocksize=480, capacity_s=120,
+                 target_ms=60, min_target_ms=20, max_target_ms=300, adapt_window_s=5.0,
+                 echo_decay=0.9):
+        self.samplerate = samplerate
+        self.resampler = Resampler(source_rate or samplerate, samplerate)
+        self.blocksize = blocksize
+        self.ring = PcmRing(samplerate * capacity_s)
+        self.min_target = samplerate * min_target_ms // 1000
+        self.max_target = samplerate * max_target_ms // 1000
+        self.target = min(max(samplerate * target_ms // 1000, self.min_target), self.max_target)
+        self.adapt_window = int(samplerate * adapt_window_s)
+        self.echo_decay = echo_decay
+        self.stream = None
+        self.on_start = None
+
+        self.playing = False
+        self.underruns = 0
+        self.played = 0
+        self.added_latency = 0.0
+        self.max_added_latency = 0.0
+        self.far_end_level = 0.0
+        self.interrupts = 0
+        self.interrupt_latency = 0.0
+        self.max_interrupt_latency = 0.0
+        self.item_id = None
+        self._item_start = 0
+        self._flush_requested = None
+        self._eos = True
+        self._clean_samples = 0
+        self._burst_started = None
+        self._carry = b""
+
+    # --- producer side (event loop) ---
+
+    def feed(self, pcm, item_id=None):
+        """Queue int16 samples at ``source_rate`` for playback."""
+        if not len(pcm):
+            return
+        if item_id is not None and item_id != self.item_id:
+            self.item_id = item_id
+            self._item_start = self.ring.head
+        pcm = self.resampler.process(pcm)
+        if self._burst_started is None and not self.playing:
+            self._burst_started = time.monotonic()
+        self._eos = False
+        self.ring.write(pcm)
+
+    def feed_b64(self, audio_b64, item_id=None):
+        """Decode a base64 ``response.audio.delta`` payload into the ring.
+
+        The stdlib has no base64 decode-into, so the decoded bytes are viewed
+        as int16 in place and copied exactly once, into the ring (plus the
+        resampler's output when the device rate differs from the wire rate).
+        """
+        self.feed(np.frombuffer(base64.b64decode(audio_b64), dtype=np.int16), item_id)
+
+    def feed_bytes(self, data, item_id=None):
+        """Queue raw little-endian int16 PCM that may be split at any byte, e.g. HTTP chunks."""
+        if self._carry:
+            data = self._carry + data
+        usable = len(data) & ~1
+        self._carry = data[usable:]
+        self.feed(np.frombuffer(data, dtype=np.int16, count=usable // 2), item_id)
+
+    def mark_done(self):
+        """The current response has no more audio; drain without counting underruns."""
+        self._eos = True
+
+    def is_active(self):
+        return self.playing or len(self.ring) > 0
+
+    def item_played_ms(self):
+        """Milliseconds of the current item that have reached the speaker."""
+        played = max(0, self.ring.tail - self._item_start)
+        return played * 1000 // self.samplerate
+
+    def flush(self):
+        """Drop everything queued (barge-in); returns ms of the current item played."""
+        played_ms = self.item_played_ms()
+        self._flush_requested = time.monotonic()
+        self.ring.clear()
+        self.resampler.reset()
+        self._carry = b""
+        self.playing = False
+        self._eos = True
+        self._burst_started = None
+        self.interrupts += 1
+        return played_ms
+
+    # --- consumer side (audio thread) ---
+
+    def render(self, out):
+        """Fill one device block; ``out`` is a 1-D int16 view of the output buffer."""
+        frames = len(out)
+        if self._flush_requested is not None:
+            # First block rendered after a barge-in flush
+            self.interrupt_latency = time.monotonic() - self._flush_requested
+            if self.stream is not None:
+                self.interrupt_latency += self.stream.latency
+            self.max_interrupt_latency = max(self.max_interrupt_latency, self.interrupt_latency)
+            self._flush_requested = None
+        self.far_end_level *= self.echo_decay
+        if not self.playing:
+            depth = len(self.ring)
+            if depth == 0 or (depth < self.target and not self._eos):
+                out[:] = 0
+                return
+            self.playing = True
+            if self._burst_started is not None:
+                self.added_latency = time.monotonic() - self._burst_started
+                self.max_added_latency = max(self.max_added_latency, self.added_latency)
+                self._burst_started = None
+            if self.on_start is not None:
+                self.on_start()
+
+        n = self.ring.read_into(out)
+        self.played += n
+        self.far_end_level = max(self.far_end_level, block_rms(out[:n]))
+        if n == frames:
+            self._clean_samples += n
+            if self._clean_samples >= self.adapt_window:
+                self._clean_samples = 0
+                self.target = max(self.min_target, int(self.target * 0.9))
+            return
+
+        out[n:] = 0
+        self.playing = False
+        self._clean_samples = 0
+        if not self._eos:
+            # Starved mid-response: count it and buffer deeper before resuming
+            self.underruns += 1
+            self.target = min(self.max_target, int(self.target * 1.5) + self.blocksize)
+            self._burst_started = time.monotonic()
+
+    def _callback(self, outdata, frames, time_info, status):
+        self.render(outdata[:, 0])
+
+    def start(self):
+        # Imported here so headless sinks can use the engine without PortAudio
+        import sounddevice as sd
+
+        self.stream = sd.OutputStream(
+            samplerate=self.samplerate,
+            channels=1,
+            dtype='int16',
+            blocksize=self.blocksize,
+            latency='low',
+            callback=self._callback,
+        )
+        self.stream.start()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def stats(self):
+        return {
+            "depth_ms": len(self.ring) * 1000 / self.samplerate,
+            "target_ms": self.target * 1000 / self.samplerate,
+            "underruns": self.underruns,
+            "added_latency_ms": self.added_latency * 1000,
+            "max_added_latency_ms": self.max_added_latency * 1000,
+            "overruns": self.ring.overruns,
+            "interrupts": self.interrupts,
+            "interrupt_latency_ms": self.interrupt_latency * 1000,
+            "max_interrupt_latency_ms": self.max_interrupt_latency * 1000,
+        }
@@ -0,0 +1,147 @@
+"""Relay of realtime events between a local client and the upstream realtime API.
+
+Each direction is a pipe: a reader task puts messages into a bounded queue and
+a writer task forwards them. When a queue is full the reader stops reading, so
+a slow side pushes back on the fast one through its socket instead of growing
+server memory. Sides are given as plain ``recv``/``send`` coroutines, so the
+relay does not care whether a socket is a Starlette or a websockets one.
+"""
+import asyncio
+import base64
+import collections
+import json
+import time
+
+from events import field_span, peek_type, slice_field
+
+
+def _audio_of(message):
+    # Escaped values (e.g. "\/") fall back to a full parse
+    audio = slice_field(message, "audio")
+    return audio if audio is not None else json.loads(message)["audio"]
+
+
+def merge_appends(messages):
+    """Merge consecutive ``input_audio_buffer.append`` messages into one.
+
+    The first message's envelope (``event_id`` and any other fields) is kept;
+    only its ``audio`` is replaced.
+    """
+    audio = b"".join(base64.b64decode(_audio_of(m)) for m in messages)
+    merged = base64.b64encode(audio).decode("ascii")
+    first = messages[0]
+    span = field_span(first, "audio")
+    if span is None:
+        event = json.loads(first)
+        event["audio"] = merged
+        return json.dumps(event)
+    return first[:span[0]] + merged + first[span[1]:]
+
+
+def quantile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RelayPipe:
+    """One direction of a relay: bounded queue, optional audio batching, metrics."""
+
+    def __init__(self, recv, send, queue_size=64, batch_audio=False):
+        self.recv = recv
+        self.send = send
+        self.queue = asyncio.Queue(queue_size)
+        self.batch_audio = batch_audio
+        self.messages = 0
+        self.bytes = 0
+        self.merged = 0
+        self.stalls = 0
+        # Seconds from receipt to forward, for the most recent messages
+        self.latencies = collections.deque(maxlen=2048)
+
+    async def read(self):
+        while True:
+            message = await self.recv()
+            if self.queue.full():
+                self.stalls += 1
+            await self.queue.put((time.perf_counter(), message))
+
+    async def write(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.batch_audio:
+                while not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+            for received_at, message in self._coalesce(batch):
+                await self.send(message)
+                self.messages += 1
+                self.bytes += len(message)
+                self.latencies.append(time.perf_counter() - received_at)
+
+    def _coalesce(self, batch):
+        if len(batch) == 1:
+            return batch
+        out = []
+        run = []
+        for item in batch + [(None, None)]:
+            if item[1] is not None and peek_type(item[1]) == "input_audio_buffer.append":
+                run.append(item)
+                continue
+            if len(run) > 1:
+                out.append((run[0][0], merge_appends([m for _, m in run])))
+                self.merged += len(run) - 1
+            else:
+                out.extend(run)
+            run = []
+            if item[1] is not None:
+                out.append(item)
+        return out
+
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "merged": self.merged,
+            "stalls": self.stalls,
+            "queued": self.queue.qsize(),
+            "latency_p50_ms": quantile(latencies, 0.5) * 1000,
+            "latency_p99_ms": quantile(latencies, 0.99) * 1000,
+        }
+
+
+class RelaySession:
+    """Both directions between one client and its upstream connection."""
+
+    def __init__(self, client_recv, client_send, upstream_recv, upstream_send,
+                 queue_size=64, batch_audio=False):
+        self.uplink = RelayPipe(client_recv, upstream_send, queue_size, batch_audio)
+        self.downlink = RelayPipe(upstream_recv, client_send, queue_size)
+        self.started = time.monotonic()
+
+    async def run(self):
+        """Relay until either side closes or fails."""
+        tasks = [
+            asyncio.create_task(self.uplink.read()),
+            asyncio.create_task(self.uplink.write()),
+            asyncio.create_task(self.downlink.read()),
+            asyncio.create_task(self.downlink.write()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        uplink, downlink = self.uplink.stats(), self.downlink.stats()
+        return {
+            "age_s": elapsed,
+            "uplink": uplink,
+            "downlink": downlink,
+            "uplink_msgs_per_s": uplink["messages"] / elapsed,
+            "downlink_msgs_per_s": downlink["messages"] / elapsed,
+        }
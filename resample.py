@@ -0,0 +1,63 @@
+"""Streaming polyphase resampler for mono int16 audio."""
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class Resampler:
+    """Rational-ratio polyphase FIR resampler that keeps state between blocks.
+
+    The Kaiser-windowed sinc prototype is split into ``up`` phases once, so each
+    output sample costs one dot product of ``taps`` input samples. A whole block
+    is computed at once: output positions map to (input index, phase) pairs and
+    the dot products run as a single einsum over strided input windows.
+    """
+
+    def __init__(self, in_rate, out_rate, half_width=8, beta=8.0):
+        g = gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.passthrough = self.up == self.down
+        if self.passthrough:
+            return
+
+        # Taps per phase, in input samples: half_width zero crossings either side
+        # of the lower of the two Nyquist frequencies.
+        self.taps = int(np.ceil(2 * half_width * max(1.0, self.down / self.up)))
+        n = self.up * self.taps
+        cutoff = 0.5 / max(self.up, self.down)  # cycles per upsampled sample
+        t = np.arange(n) - (n - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(n, beta)
+        h *= self.up / h.sum()
+
+        # phases[p, j] multiplies x[i - (taps - 1 - j)] for output phase p
+        idx = np.arange(self.up)[:, None] + (self.taps - 1 - np.arange(self.taps))[None, :] * self.up
+        self.phases = h[idx].astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        if self.passthrough:
+            return
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.consumed = 0   # input samples consumed so far
+        self.next_out = 0   # index of the next output sample
+
+    def process(self, samples):
+        """Resample one block of int16 samples; returns a new int16 array."""
+        if self.passthrough or not len(samples):
+            return samples
+        buf = np.concatenate((self.history, samples.astype(np.float32)))
+        last = self.consumed + len(samples) - 1
+        end = ((last + 1) * self.up + self.down - 1) // self.down
+
+        pos = np.arange(self.next_out, end, dtype=np.int64) * self.down
+        windows = sliding_window_view(buf, self.taps)
+        y = np.einsum("nt,nt->n", self.phases[pos % self.up], windows[pos // self.up - self.consumed])
+
+        self.history = buf[len(buf) - (self.taps - 1):]
+        self.consumed += len(samples)
+        self.next_out = end
+        return np.clip(np.rint(y), -32768, 32767).astype(np.int16)
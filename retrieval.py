@@ -0,0 +1,297 @@
+"""Persistent embedding store for semantic search over a document collection.
+
+A store is a directory holding:
+
+* ``vectors.bin``: raw row-major float32 or float16 embeddings, L2-normalized,
+  opened as a memory map so a large corpus is paged in on demand;
+* ``docs.jsonl``: one line per row with the document's content hash, text and
+  optional metadata;
+* ``store.json``: dimension and dtype;
+* ``ivf.npz`` (optional): an inverted-file index for approximate search.
+
+Documents are identified by a hash of their text, so ``add`` never embeds the
+same document twice. Searches embed all queries in one call and score them
+against the matrix block by block (cosine similarity as a dot product), keeping
+the top k with ``argpartition`` instead of sorting every score.
+
+``CachedRetriever`` wraps a store for use from an event loop during a live
+conversation.
+"""
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+
+def content_hash(text):
+    return hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Indices of the ``k`` highest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def minilm_encoder(texts):
+    """Default encoder: the shared all-MiniLM-L6-v2 model from ``models``."""
+    import models
+
+    return models.get("minilm").encode(list(texts), batch_size=64, convert_to_numpy=True,
+                                        normalize_embeddings=True)
+
+
+class EmbeddingStore:
+    """Memory-mapped embedding matrix plus document metadata, persisted in ``path``.
+
+    ``encode(list_of_texts)`` returns one embedding per text; it is only called
+    for documents that are not in the store yet and for queries.
+    """
+
+    def __init__(self, path, encode=minilm_encoder, dim=None, dtype="float32", block_rows=65536):
+        self.path = path
+        self.encode = encode
+        self.block_rows = block_rows
+        os.makedirs(path, exist_ok=True)
+
+        header = os.path.join(path, "store.json")
+        if os.path.exists(header):
+            with open(header) as f:
+                info = json.load(f)
+            self.dim, self.dtype = info["dim"], np.dtype(info["dtype"])
+        else:
+            self.dim, self.dtype = dim, np.dtype(dtype)
+
+        self.docs = []
+        self.hashes = {}
+        docs_path = os.path.join(path, "docs.jsonl")
+        if os.path.exists(docs_path):
+            with open(docs_path, "rb") as f:
+                data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                # A crash mid-append left a torn last line
+                with open(docs_path, "r+b") as f:
+                    f.truncate(end)
+            for line in data[:end].splitlines():
+                doc = json.loads(line)
+                self.hashes[doc["hash"]] = len(self.docs)
+                self.docs.append(doc)
+
+        self.vectors = None
+        self._check_vectors()
+        self._open_vectors()
+        self.ivf = None
+        ivf_path = os.path.join(path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as data:
+                self.ivf = {key: data[key] for key in data.files}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _check_vectors(self):
+        """Cut ``vectors.bin`` back to one row per document.
+
+        Rows are paired with documents by position, and ``add`` appends the
+        vectors first, so a crash before the documents were written leaves
+        trailing rows that would shift every later document onto the wrong
+        vector. Fewer rows than documents cannot be repaired and raise.
+        """
+        path = os.path.join(self.path, "vectors.bin")
+        if self.dim is None or not os.path.exists(path):
+            if self.docs:
+                raise ValueError(f"{self.path}: {len(self.docs)} documents but no vectors")
+            return
+        row = self.dim * self.dtype.itemsize
+        size = os.path.getsize(path)
+        if size < len(self.docs) * row:
+            raise ValueError(f"{path}: {size // row} vectors for {len(self.docs)} documents")
+        if size > len(self.docs) * row:
+            with open(path, "r+b") as f:
+                f.truncate(len(self.docs) * row)
+
+    def _open_vectors(self):
+        if self.docs:
+            self.vectors = np.memmap(os.path.join(self.path, "vectors.bin"), dtype=self.dtype,
+                                     mode="r", shape=(len(self.docs), self.dim))
+
+    def add(self, texts, metas=None):
+        """Embed and store the texts that are not in the store yet; returns how many were added."""
+        metas = metas or [None] * len(texts)
+        new = {}
+        for text, meta in zip(texts, metas):
+            h = content_hash(text)
+            if h not in self.hashes and h not in new:
+                new[h] = (text, meta)
+        if not new:
+            return 0
+
+        vectors = normalize(self.encode([text for text, _ in new.values()]))
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(os.path.join(self.path, "store.json"), "w") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"embedding dimension {vectors.shape[1]} does not match store ({self.dim})")
+
+        # Vectors first: a crash between the two appends leaves orphan rows, which
+        # _check_vectors cuts off on the next open
+        with open(os.path.join(self.path, "vectors.bin"), "ab") as f:
+            f.write(vectors.astype(self.dtype).tobytes())
+        start = len(self.docs)
+        with open(os.path.join(self.path, "docs.jsonl"), "a") as f:
+            for h, (text, meta) in new.items():
+                doc = {"hash": h, "text": text}
+                if meta is not None:
+                    doc["meta"] = meta
+                f.write(json.dumps(doc) + "\n")
+                self.hashes[h] = len(self.docs)
+                self.docs.append(doc)
+        self._open_vectors()
+        if self.ivf is not None:
+            self._assign_to_ivf(start, vectors)
+        return len(new)
+
+    def search(self, queries, k=5, nprobe=None):
+        """Top-k ``(score, doc)`` pairs for each query string, embedded in one batch."""
+        if not queries or not self.docs:
+            return [[] for _ in queries]
+        return self.search_vectors(self.encode(list(queries)), k, nprobe)
+
+    def search_vectors(self, queries, k=5, nprobe=None):
+        q = normalize(np.atleast_2d(queries))
+        if self.ivf is not None and nprobe:
+            return [self._search_ivf(row, k, nprobe) for row in q]
+        return self._search_exact(q, k)
+
+    def _search_exact(self, q, k):
+        # Running top-k over blocks keeps memory at block_rows x queries
+        best_scores = np.empty((len(q), 0), dtype=np.float32)
+        best_ids = np.empty((len(q), 0), dtype=np.int64)
+        for start in range(0, len(self.docs), self.block_rows):
+            block = np.asarray(self.vectors[start:start + self.block_rows], dtype=np.float32)
+            scores = np.concatenate([best_scores, q @ block.T], axis=1)
+            ids = np.concatenate([best_ids, np.broadcast_to(
+                np.arange(start, start + len(block)), (len(q), len(block)))], axis=1)
+            keep = top_k(scores, k)
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+            best_ids = np.take_along_axis(ids, keep, axis=1)
+        return [[(float(s), self.docs[i]) for s, i in zip(srow, irow)]
+                for srow, irow in zip(best_scores, best_ids)]
+
+    # --- approximate search ---
+
+    def build_ivf(self, nlist=None, iters=10, sample=100_000, seed=0):
+        """Cluster the vectors into ``nlist`` lists (k-means) for ``search(..., nprobe=n)``."""
+        n = len(self.docs)
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        train = np.asarray(self.vectors[np.sort(rng.choice(n, min(n, sample), replace=False))],
+                           dtype=np.float32)
+        centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, self.block_rows):
+            block = np.asarray(self.vectors[start:start + self.block_rows], dtype=np.float32)
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self.ivf = {"centroids": centroids, "assign": assign}
+        self._index_ivf()
+
+    def _assign_to_ivf(self, start, vectors):
+        assign = np.argmax(vectors @ self.ivf["centroids"].T, axis=1).astype(np.int32)
+        self.ivf["assign"] = np.concatenate([self.ivf["assign"][:start], assign])
+        self._index_ivf()
+
+    def _index_ivf(self):
+        assign = self.ivf["assign"]
+        self.ivf["order"] = np.argsort(assign, kind="stable")
+        self.ivf["offsets"] = np.concatenate(
+            [[0], np.cumsum(np.bincount(assign, minlength=len(self.ivf["centroids"])))])
+        np.savez(os.path.join(self.path, "ivf.npz"), **self.ivf)
+
+    def _search_ivf(self, q, k, nprobe):
+        centroids, order, offsets = self.ivf["centroids"], self.ivf["order"], self.ivf["offsets"]
+        lists = top_k((centroids @ q)[None, :], nprobe)[0]
+        ids = np.sort(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists]))
+        if not len(ids):
+            return []
+        scores = (np.asarray(self.vectors[ids], dtype=np.float32) @ q)[None, :]
+        keep = top_k(scores, k)[0]
+        return [(float(scores[0, i]), self.docs[ids[i]]) for i in keep]
+
+
+class CachedRetriever:
+    """Async top-k lookup for live turns, with an LRU cache of recent queries.
+
+    Embedding and search run in a thread pool so the caller's event loop keeps
+    going; repeated (case- and whitespace-insensitive) queries are answered from
+    the cache. ``timings`` holds the seconds each lookup took, hits included.
+    """
+
+    def __init__(self, store, k=3, min_score=0.3, cache_size=256, executor=None):
+        self.store = store
+        self.k = k
+        self.min_score = min_score
+        self.cache_size = cache_size
+        self.executor = executor
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.timings = collections.deque(maxlen=1024)
+
+    @staticmethod
+    def _key(query):
+        return " ".join(query.lower().split())
+
+    async def lookup(self, query):
+        """Texts of the best passages for ``query`` scoring at least ``min_score``."""
+        start = time.perf_counter()
+        key = self._key(query)
+        passages = self.cache.get(key)
+        if passages is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.executor, self.store.search, [query], self.k)
+            passages = [doc["text"] for score, doc in results[0] if score >= self.min_score]
+            self.cache[key] = passages
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+        self.timings.append(time.perf_counter() - start)
+        return passages
+
+    def stats(self):
+        timings = sorted(self.timings) or [0.0]
+        return {
+            "lookups": self.hits + self.misses,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "p50_ms": timings[len(timings) // 2] * 1000,
+            "max_ms": timings[-1] * 1000,
+        }
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+
+
+class PcmRing:
+    """Preallocated ring of PCM samples shared between an audio thread and the event loop.
+
+    ``head`` and ``tail`` are running totals of samples written and read, so the
+    fill level is always ``head - tail``. When the ring is full the oldest unread
+    samples are overwritten and counted in ``overruns``.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.buf = np.zeros(self.capacity, dtype=dtype)
+        self.head = 0
+        self.tail = 0
+        self.overruns = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def write(self, samples):
+        """Append samples; returns how many unread samples had to be dropped."""
+        n = len(samples)
+        if n == 0:
+            return 0
+        with self._lock:
+            if n > self.capacity:
+                skip = n - self.capacity
+                self.head += skip
+                samples = samples[skip:]
+                n = self.capacity
+            start = self.head % self.capacity
+            first = min(n, self.capacity - start)
+            self.buf[start:start + first] = samples[:first]
+            if first < n:
+                self.buf[:n - first] = samples[first:]
+            self.head += n
+            dropped = self.head - self.tail - self.capacity
+            if dropped > 0:
+                self.tail += dropped
+                self.overruns += dropped
+                return dropped
+            return 0
+
+    def read_into(self, out):
+        """Copy up to ``len(out)`` samples into ``out``; returns the count copied."""
+        with self._lock:
+            n = min(len(out), self.head - self.tail)
+            start = self.tail % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self.buf[start:start + first]
+            if first < n:
+                out[first:n] = self.buf[:n - first]
+            self.tail += n
+            return n
+
+    def read(self, n=None):
+        """Return up to ``n`` samples (all pending by default) as a new array."""
+        available = len(self)
+        n = available if n is None else min(n, available)
+        out = np.empty(n, dtype=self.buf.dtype)
+        count = self.read_into(out)
+        return out[:count]
+
+    def clear(self):
+        """Discard everything pending; returns the number of samples dropped."""
+        with self._lock:
+            dropped = self.head - self.tail
+            self.tail = self.head
+            return dropped
@@ -0,0 +1,201 @@
+"""Semantic answer cache: near-duplicate questions are answered without the model.
+
+A question is normalized (case, punctuation, whitespace) and embedded with the
+same all-MiniLM-L6-v2 encoder as ``retrieval``. Cached questions live as rows
+of one L2-normalized float32 matrix, so a lookup is a single matrix-vector
+product and an argmax; the best match is a hit when its cosine similarity is
+at least ``threshold``. A question whose normalized text was seen before is
+answered from a dict without embedding at all.
+
+Entries expire ``ttl_s`` after they were stored and the least recently used
+one is evicted once ``max_entries`` are cached, or once the answers' audio
+adds up to more than ``max_audio_bytes``. Expired rows are dropped
+lazily, when a lookup would hit them or when room is needed, and freed rows
+are zeroed so they can never match.
+"""
+import collections
+import re
+import threading
+import time
+
+import numpy as np
+
+from retrieval import minilm_encoder
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_question(text):
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+class SemanticCache:
+    """Answers to past questions, looked up by embedding similarity.
+
+    ``lookup`` returns ``(entry, query)``: the cached entry (a dict with the
+    ``question``, ``answer``, optional ``audio`` and ``score``) or None, and
+    the query to hand to ``put`` with the model's answer on a miss, so the
+    question is not embedded twice. ``put``'s ``cost_s`` is how long the
+    model took; every later hit on that entry adds it to ``saved_s``.
+
+    ``audio`` is counted by ``len``; a single answer whose audio alone is over
+    ``max_audio_bytes`` is not cached.
+
+    ``encode(list_of_texts)`` returns one embedding per text. ``clock`` is
+    ``time.monotonic`` unless a test or benchmark needs another.
+    """
+
+    def __init__(self, encode=minilm_encoder, threshold=0.9, max_entries=10_000, ttl_s=3600.0,
+                 max_audio_bytes=64 * 2**20, clock=time.monotonic):
+        self.encode = encode
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_audio_bytes = max_audio_bytes
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self.matrix = None
+        self.expires = np.zeros(0)
+        self.entries = {}                           # row -> entry
+        self.lru = collections.OrderedDict()        # row -> None, least recently used first
+        self.exact = {}                             # normalized question -> row
+        self.free = []
+        self.size = 0                               # rows ever used (high-water mark)
+        self.audio_bytes = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_s = 0.0
+        self.timings = collections.deque(maxlen=1024)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, question):
+        """``(entry or None, query)`` for ``question``; see the class docstring."""
+        start = time.perf_counter()
+        text = normalize_question(question)
+        with self._lock:
+            row = self.exact.get(text)
+            if row is not None and self._alive(row):
+                self.exact_hits += 1
+                entry = self._hit(row, 1.0)
+                self.timings.append(time.perf_counter() - start)
+                return entry, (text, None)
+        vector = self._embed(text)
+        with self._lock:
+            entry = self._search(vector)
+        self.timings.append(time.perf_counter() - start)
+        return entry, (text, vector)
+
+    def _embed(self, text):
+        vector = np.asarray(self.encode([text]), dtype=np.float32)[0]
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _alive(self, row):
+        if self.expires[row] > self.clock():
+            return True
+        self._drop(row)
+        self.expirations += 1
+        return False
+
+    def _search(self, vector):
+        if not self.entries:
+            self.misses += 1
+            return None
+        scores = self.matrix[:self.size] @ vector
+        while True:
+            row = int(np.argmax(scores))
+            score = float(scores[row])
+            if score < self.threshold:
+                self.misses += 1
+                return None
+            # Freed rows are zero, so they only come up with a threshold <= 0
+            if row in self.entries and self._alive(row):
+                self.hits += 1
+                return self._hit(row, score)
+            scores[row] = -1.0
+
+    def _hit(self, row, score):
+        self.lru.move_to_end(row)
+        entry = self.entries[row]
+        self.saved_s += entry["cost_s"]
+        return {**entry, "score": score}
+
+    def put(self, query, answer, audio=None, cost_s=0.0):
+        """Cache ``answer`` (and its audio, if any) for the query ``lookup`` returned."""
+        text, vector = query
+        if audio is not None and len(audio) > self.max_audio_bytes:
+            return
+        if vector is None:
+            # An expired exact match: embed it now
+            vector = self._embed(text)
+        with self._lock:
+            old = self.exact.get(text)
+            if old is not None:
+                self._drop(old)
+            row = self._allocate(len(vector))
+            self.matrix[row] = vector
+            self.expires[row] = self.clock() + self.ttl_s
+            self.entries[row] = {"question": text, "answer": answer, "audio": audio, "cost_s": cost_s}
+            self.lru[row] = None
+            self.exact[text] = row
+            if audio is not None:
+                self.audio_bytes += len(audio)
+                while self.audio_bytes > self.max_audio_bytes:
+                    self._drop(next(iter(self.lru)))
+                    self.evictions += 1
+
+    def _allocate(self, dim):
+        if self.matrix is None:
+            self.matrix = np.zeros((min(self.max_entries, 1024), dim), dtype=np.float32)
+            self.expires = np.zeros(len(self.matrix))
+        if len(self.entries) >= self.max_entries:
+            # Reclaim everything expired at once, else the least recently used
+            expired = np.flatnonzero((self.expires[:self.size] <= self.clock())
+                                     & (self.expires[:self.size] > 0))
+            for row in expired:
+                self._drop(int(row))
+            self.expirations += len(expired)
+            if not len(expired):
+                self._drop(next(iter(self.lru)))
+                self.evictions += 1
+        if self.free:
+            return self.free.pop()
+        if self.size == len(self.matrix):
+            grown = min(self.max_entries, 2 * len(self.matrix))
+            self.matrix = np.concatenate([self.matrix, np.zeros((grown - self.size, dim), np.float32)])
+            self.expires = np.concatenate([self.expires, np.zeros(grown - self.size)])
+        self.size += 1
+        return self.size - 1
+
+    def _drop(self, row):
+        entry = self.entries.pop(row)
+        del self.lru[row]
+        if entry["audio"] is not None:
+            self.audio_bytes -= len(entry["audio"])
+        if self.exact.get(entry["question"]) == row:
+            del self.exact[entry["question"]]
+        self.matrix[row] = 0.0
+        self.expires[row] = 0.0
+        self.free.append(row)
+
+    def stats(self):
+        lookups = self.hits + self.exact_hits + self.misses
+        timings = sorted(self.timings) or [0.0]
+        return {
+            "lookups": lookups,
+            "hits": self.hits + self.exact_hits,
+            "exact_hits": self.exact_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.exact_hits) / lookups if lookups else 0.0,
+            "saved_s": self.saved_s,
+            "entries": len(self.entries),
+            "audio_bytes": self.audio_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "p50_ms": timings[len(timings) // 2] * 1000,
+            "max_ms": timings[-1] * 1000,
+        }
@@ -2,42 +2,271 @@
 # uvicorn server:app --reload --host 0.0.0.0 --port 8000
 
 
+import asyncio
+import bisect
+import collections
+import itertools
 import os
-import requests
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import websockets
+from fastapi import FastAPI, WebSocket
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 
-load_dotenv()
+from relay import RelaySession
 
-app = FastAPI()
+load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+
+# Pre-minted token pool. 0 disables it and every /session call goes upstream.
+TOKEN_POOL_SIZE = int(os.getenv("TOKEN_POOL_SIZE", "0"))
+# Tokens with less validity than this left are evicted instead of handed out
+TOKEN_MIN_TTL = float(os.getenv("TOKEN_MIN_TTL", "20"))
+# Upstream mints the refill task keeps in flight at once, so a drained pool
+# does not hit upstream with a burst on top of the requests minting inline
+TOKEN_REFILL_CONCURRENCY = int(os.getenv("TOKEN_REFILL_CONCURRENCY", "8"))
+
+# WebSocket relay: clients connect to /relay and the server holds the upstream socket
+REALTIME_URL = os.getenv("REALTIME_URL", "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview")
+RELAY_QUEUE_SIZE = int(os.getenv("RELAY_QUEUE_SIZE", "64"))
+RELAY_BATCH_AUDIO = os.getenv("RELAY_BATCH_AUDIO", "0") == "1"
+
+SESSION_PAYLOAD = {
+    "model": "gpt-4o-realtime-preview",
+    "voice": "alloy",
+    "modalities": ["audio", "text"],
+}
+
+
+async def mint_session(http):
+    """Ask upstream for a short-lived Realtime session token."""
+    resp = await http.post("/realtime/sessions", json=SESSION_PAYLOAD)
+    resp.raise_for_status()
+    session = resp.json()
+    # Without an expiry the pool cannot tell when to replace a token
+    if not session.get("client_secret", {}).get("expires_at"):
+        raise ValueError("upstream session has no client_secret.expires_at")
+    return session
+
+
+class TokenPool:
+    """Pre-minted session tokens, refilled in the background ahead of expiry.
+
+    Tokens are kept in expiry order, so the first to expire sits at the left
+    of the deque. ``take`` answers from memory and wakes the refill task, or
+    mints inline when the pool is empty.
+
+    The refill keeps at most ``concurrency`` mints in flight, adds each token
+    as soon as it arrives and pauses while requests are minting inline: in a
+    storm longer than the pool, upstream is the bottleneck, and refill mints
+    would queue in front of the requests waiting on it. A failed mint
+    (including a token without an expiry, see ``mint_session``) backs off
+    before the next attempt.
+    """
+
+    def __init__(self, mint, size, min_ttl=TOKEN_MIN_TTL, concurrency=TOKEN_REFILL_CONCURRENCY):
+        self.mint = mint
+        self.size = size
+        self.min_ttl = min_ttl
+        self.concurrency = max(1, concurrency)
+        self.tokens = collections.deque()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.errors = 0
+        self.inline = 0
+        self._wakeup = asyncio.Event()
+
+    @staticmethod
+    def expires_at(session):
+        return session["client_secret"]["expires_at"]
+
+    def _evict_stale(self):
+        deadline = time.time() + self.min_ttl
+        while self.tokens and self.expires_at(self.tokens[0]) < deadline:
+            self.tokens.popleft()
+            self.evicted += 1
+
+    async def take(self):
+        self._evict_stale()
+        self._wakeup.set()
+        if self.tokens:
+            self.hits += 1
+            return self.tokens.popleft()
+        self.misses += 1
+        self.inline += 1
+        try:
+            return await self.mint()
+        finally:
+            self.inline -= 1
+            self._wakeup.set()
+
+    async def run(self):
+        backoff = 1.0
+        while True:
+            # Cleared before looking at the pool so a take() racing with the refill wakes us again
+            self._wakeup.clear()
+            self._evict_stale()
+            if self.inline:
+                # Woken again as inline mints finish
+                await self._wakeup.wait()
+                continue
+            missing = min(self.size - len(self.tokens), self.concurrency)
+            if missing > 0:
+                failed = 0
+                mints = [asyncio.ensure_future(self.mint()) for _ in range(missing)]
+                try:
+                    for minted in asyncio.as_completed(mints):
+                        try:
+                            bisect.insort(self.tokens, await minted, key=self.expires_at)
+                        except Exception:
+                            failed += 1
+                finally:
+                    # Cancelled at shutdown: don't leave mints running unowned
+                    for mint in mints:
+                        mint.cancel()
+                if failed:
+                    self.errors += failed
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30.0)
+                    continue
+                backoff = 1.0
+                if len(self.tokens) < self.size:
+                    continue
+
+            # Sleep until someone takes a token or the oldest one needs replacing
+            timeout = None
+            if self.tokens:
+                timeout = max(0.0, self.expires_at(self.tokens[0]) - self.min_ttl - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "available": len(self.tokens),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "errors": self.errors,
+        }
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # One keep-alive connection pool for all upstream calls: no TLS handshake per token
+    app.state.http = httpx.AsyncClient(
+        base_url=OPENAI_BASE_URL,
+        headers={
+            "Authorization": f"Bearer {OPENAI_API_KEY}",
+            "Content-Type": "application/json",
+        },
+        timeout=httpx.Timeout(10.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    app.state.token_pool = None
+    app.state.relays = {}
+    refill_task = None
+    if TOKEN_POOL_SIZE > 0 and OPENAI_API_KEY:
+        app.state.token_pool = TokenPool(lambda: mint_session(app.state.http), TOKEN_POOL_SIZE)
+        refill_task = asyncio.create_task(app.state.token_pool.run())
+    try:
+        yield
+    finally:
+        if refill_task is not None:
+            refill_task.cancel()
+        await app.state.http.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+relay_ids = itertools.count(1)
+
 
 @app.post("/session")
-def create_session():
+async def create_session():
     """Mint a short-lived Realtime session token"""
     if not OPENAI_API_KEY:
         return JSONResponse(
             {"error": "OPENAI_API_KEY not set"},
             status_code=500
         )
-    
-    resp = requests.post(
-        "https://api.openai.com/v1/realtime/sessions",
-        headers={
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "application/json",
-        },
-        json={
-            "model": "gpt-4o-realtime-preview",
-            "voice": "alloy",
-            "modalities": ["audio", "text"],
-        },
+
+    pool = app.state.token_pool
+    try:
+        session = await (pool.take() if pool is not None else mint_session(app.state.http))
+    except httpx.HTTPStatusError as e:
+        return JSONResponse(
+            {"error": f"Upstream returned {e.response.status_code}"},
+            status_code=502
+        )
+    except httpx.RequestError:
+        return JSONResponse({"error": "Upstream unreachable"}, status_code=502)
+    except ValueError:
+        return JSONResponse({"error": "Upstream returned an invalid session"}, status_code=502)
+    return JSONResponse(session)
+
+
+@app.get("/session/pool")
+def token_pool_stats():
+    pool = app.state.token_pool
+    return pool.stats() if pool is not None else {"size": 0}
+
+
+@app.websocket("/relay")
+async def relay(client: WebSocket):
+    """Proxy realtime events between a local client and the upstream API"""
+    await client.accept()
+    if not OPENAI_API_KEY:
+        await client.close(code=1011, reason="OPENAI_API_KEY not set")
+        return
+
+    try:
+        upstream = await websockets.connect(
+            REALTIME_URL,
+            additional_headers={
+                "Authorization": f"Bearer {OPENAI_API_KEY}",
+                "OpenAI-Beta": "realtime=v1",
+            },
+            max_size=None,
+        )
+    except (OSError, websockets.exceptions.WebSocketException) as e:
+        await client.close(code=1011, reason=f"Upstream connect failed: {type(e).__name__}")
+        return
+
+    session = RelaySession(
+        client.receive_text,
+        client.send_text,
+        upstream.recv,
+        upstream.send,
+        queue_size=RELAY_QUEUE_SIZE,
+        batch_audio=RELAY_BATCH_AUDIO,
     )
-    resp.raise_for_status()
-    return JSONResponse(resp.json())
+    relay_id = next(relay_ids)
+    app.state.relays[relay_id] = session
+    try:
+        await session.run()
+    finally:
+        del app.state.relays[relay_id]
+        await upstream.close()
+        try:
+            await client.close()
+        except RuntimeError:
+            pass  # already closed by the client
+
+
+@app.get("/relay/metrics")
+def relay_metrics():
+    sessions = {relay_id: s.stats() for relay_id, s in app.state.relays.items()}
+    return {"active": len(sessions), "sessions": sessions}
+
 
 @app.get("/")
 def read_root():
-    return {"message": "Server is running"}
\ No newline at end of file
+    return {"message": "Server is running"}
@@ -0,0 +1,539 @@
+"""A realtime voice session, independent of where its audio comes from or goes to."""
+import asyncio
+import base64
+import json
+import random
+import time
+
+import websockets
+
+from events import EventDispatcher, loads, slice_field
+from metrics import NullTracer
+from resample import Resampler
+from uplink import UplinkCoalescer, UplinkSender
+from vad import VadGate
+from wire_codec import get_codec
+
+REALTIME_URL = "wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview"
+
+
+class RealtimeSession:
+    """One realtime conversation over a WebSocket.
+
+    ``source`` delivers mic blocks: it has a ``samplerate`` and ``open(on_block)``
+    / ``close()``, and calls ``on_block`` with 1-D int16 arrays, from any thread.
+    ``sink`` plays assistant audio at the wire rate: a ``PlaybackEngine`` or
+    anything with the same interface.
+
+    The wire codecs follow ``session_config``'s ``input_audio_format`` and
+    ``output_audio_format`` (``wire_codec``; pcm16 when absent): mic audio is
+    resampled to the input codec's rate and encoded per frame, and the sink
+    gets decoded samples at the output codec's rate, so it has to be built
+    with that as its source rate. Sessions hold no module-level state, so
+    many of them can share one event loop.
+
+    With a ``retriever`` (``retrieval.CachedRetriever``), the server no longer
+    answers on its own when the user stops talking: once the user's transcript
+    arrives, matching passages are added to the conversation and only then is
+    a response requested. If the transcription fails, comes back empty or has
+    not arrived ``transcript_timeout_s`` after the audio was committed, the
+    response is requested without passages, so the turn is still answered.
+
+    ``headers`` is a dict, or an async callable returning one for each
+    connection (e.g. with a fresh ephemeral token).
+
+    With a ``tracer`` (``metrics.TurnTracer``), every turn's milestones are
+    timestamped, including in the audio callbacks; see ``metrics``. With a
+    ``recorder`` (``session_log.SessionRecorder``), every event in both
+    directions and the raw mic audio are logged for replay.
+    """
+
+    def __init__(self, url, headers, source, sink, session_config, *, flush_ms=60,
+                 max_bytes=None, queue_size=16, backpressure="drop_oldest",
+                 vad_threshold=300, preroll_ms=300, hangover_ms=600, echo_gain=1.0,
+                 retriever=None, transcript_timeout_s=3.0, tracer=None, recorder=None,
+                 reconnect=False, backoff_s=0.25, backoff_max_s=8.0, max_retries=None,
+                 buffer_ms=2000, verbose=True):
+        self.url = url
+        self.headers = headers
+        self.source = source
+        self.sink = sink
+        self.session_config = session_config
+        self.queue_size = queue_size
+        self.backpressure = backpressure
+        self.retriever = retriever
+        self.transcript_timeout_s = transcript_timeout_s
+        self.tracer = tracer or NullTracer()
+        self.recorder = recorder
+        self.reconnect = reconnect
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.max_retries = max_retries
+        self.verbose = verbose
+
+        self.input_codec = get_codec(session_config.get("input_audio_format", "pcm16"))
+        self.output_codec = get_codec(session_config.get("output_audio_format", "pcm16"))
+        wire_rate = self.input_codec.rate
+        self.uplink_resampler = Resampler(source.samplerate, wire_rate)
+        self.uplink = UplinkCoalescer(samplerate=wire_rate, flush_ms=flush_ms, max_bytes=max_bytes,
+                                      capacity_ms=buffer_ms, codec=self.input_codec)
+        self.gate = VadGate(
+            self._send_audio,
+            samplerate=wire_rate,
+            threshold=vad_threshold,
+            preroll_ms=preroll_ms,
+            hangover_ms=hangover_ms,
+            # Echo suppression: the speaker's own output must not open the gate
+            echo_level=lambda: sink.far_end_level,
+            echo_gain=echo_gain,
+        )
+        self.ws = None
+        self.sender = None
+        self._loop = None
+        self._session_updated = None
+        # (kind, seconds) from starting to connect to ready, per connection
+        self.ready_times = []
+        self.reconnects = 0
+        self.uplink_dropped = 0
+        self._failures = 0
+
+        # State of the assistant's current reply, shared with barge-in
+        self.turn = {
+            'response_id': None,
+            'item_id': None,
+            'response_active': False,
+            'cancelled_response': None,
+        }
+        self._assistant_text = ""
+        self._assistant_responding = False
+        # Seconds from the last uplink frame of a user turn to the first audio delta
+        self.latencies = []
+        self._turn_started = None
+        self._delta_seen = False
+        # Committed user items waiting for their transcript -> timeout handle
+        self._awaiting_transcript = {}
+        # Items answered by the timeout, whose late transcript must not answer again
+        self._answered_without_transcript = set()
+        self.dispatcher = self._build_dispatcher()
+
+    def log(self, *args, **kwargs):
+        if self.verbose:
+            print(*args, **kwargs)
+
+    async def run(self):
+        """Open the devices while connecting, then stream until cancelled.
+
+        Without ``reconnect`` the run ends when the socket closes. With it, a
+        dropped or failed connection is retried after a jittered exponential
+        backoff: the devices stay open, mic audio waits in the uplink ring (up
+        to ``buffer_ms``) and ``session.update`` is sent again on the new socket.
+        """
+        self._loop = asyncio.get_running_loop()
+        lag_task = None
+        if self.tracer.enabled:
+            self.sink.on_start = self._on_first_played
+            lag_task = asyncio.create_task(self.tracer.watch_loop())
+        devices = asyncio.create_task(self._open_devices())
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    await self._stream(devices, started)
+                    if not self.reconnect:
+                        break
+                    self.log("\n⚠ Connection closed")
+                except Exception as e:
+                    if not self.reconnect or devices.done() and devices.exception():
+                        raise
+                    self._failures += 1
+                    if self.max_retries is not None and self._failures > self.max_retries:
+                        raise
+                    self.log(f"\n⚠ Connection failed: {type(e).__name__}: {e}")
+                started = time.monotonic()
+                # Full jitter, so many clients dropped at once don't come back in step
+                delay = random.uniform(0, min(self.backoff_max_s, self.backoff_s * 2 ** self._failures))
+                self.log(f"🔁 Reconnecting in {delay * 1000:.0f} ms...")
+                await asyncio.sleep(delay)
+                self.reconnects += 1
+        finally:
+            devices.cancel()
+            self.source.close()
+            self.sink.close()
+            if lag_task is not None:
+                lag_task.cancel()
+            self._mark_uplink()
+            self.tracer.finish(self.sink.underruns)
+
+    async def _open_devices(self):
+        """Start playback and capture. PortAudio opens block, so they run in threads
+        (``threaded_open``) and overlap the token fetch and handshake."""
+        jobs = []
+        for device, start in ((self.sink, self.sink.start),
+                              (self.source, lambda: self.source.open(self._on_block))):
+            if getattr(device, "threaded_open", False):
+                jobs.append(asyncio.to_thread(start))
+            else:
+                start()
+        await asyncio.gather(*jobs)
+
+    async def _stream(self, devices, started):
+        """One connection: handshake, ``session.update``, then send and receive until it ends."""
+        headers = self.headers
+        if callable(headers):
+            # Fetched per connection, so a reconnect gets a fresh token
+            headers = await headers()
+        async with websockets.connect(
+            self.url,
+            additional_headers=headers,
+            ping_interval=20,
+            ping_timeout=20
+        ) as ws:
+            if self.recorder is not None:
+                ws = self.recorder.wrap(ws)
+            self.ws = ws
+            self.log("✅ Connected. Listening for audio...\n")
+            self._reset_turn()
+            self._session_updated = asyncio.Event()
+
+            await ws.send(json.dumps({"type": "session.update", "session": self._session_config()}))
+
+            backlog = ()
+            if self.sender is not None:
+                backlog = self.sender.pending()
+                self.uplink_dropped += self.sender.dropped
+            self.sender = UplinkSender(ws, self.uplink, maxsize=self.queue_size,
+                                       policy=self.backpressure, backlog=backlog)
+            # Audio captured before the socket was up goes out first
+            self.sender.drain_backlog()
+            sender_task = asyncio.create_task(self.sender.run())
+            receiver_task = asyncio.create_task(self.receiver())
+            ready_task = asyncio.create_task(self._measure_ready(devices, started))
+
+            try:
+                done, _ = await asyncio.wait(
+                    [sender_task, receiver_task, ready_task],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if done == {ready_task} and ready_task.exception() is None:
+                    await asyncio.wait([sender_task, receiver_task], return_when=asyncio.FIRST_COMPLETED)
+                # Otherwise a device failed to open; awaiting ready_task below raises it
+            finally:
+                # Let the sender push out the last partial frame before tearing down
+                self.sender.stop()
+                try:
+                    await asyncio.wait_for(sender_task, timeout=1)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    pass
+
+                for task in [sender_task, receiver_task, ready_task]:
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+                self._reset_turn()
+                self.ws = None
+
+    async def _measure_ready(self, devices, started):
+        # Ready: devices open and the server has acknowledged the session config
+        await devices
+        await self._session_updated.wait()
+        ready_s = time.monotonic() - started
+        kind = "reconnect" if self.ready_times else "cold"
+        self.ready_times.append((kind, ready_s))
+        self._failures = 0
+        self.log(f"⚡ Ready in {ready_s * 1000:.0f} ms ({kind})")
+
+    def _reset_turn(self):
+        # A new connection is a new conversation: ids from the old one mean nothing
+        self.turn.update(response_id=None, item_id=None, response_active=False, cancelled_response=None)
+        self._turn_started = None
+        for handle in self._awaiting_transcript.values():
+            handle.cancel()
+        self._awaiting_transcript.clear()
+        self._answered_without_transcript.clear()
+
+    def _session_config(self):
+        if self.retriever is None or "turn_detection" not in self.session_config:
+            return self.session_config
+        # Responses are requested by _augment_and_respond once the context is in
+        turn_detection = {**self.session_config["turn_detection"], "create_response": False}
+        return {**self.session_config, "turn_detection": turn_detection}
+
+    # --- audio thread side ---
+
+    def _send_audio(self, samples):
+        # Only copy into the uplink ring here; encoding happens on the event loop.
+        # Before the first connection there is no sender: audio waits in the ring.
+        sender = self.sender
+        if self.uplink.push(samples) and sender is not None:
+            sender.notify_threadsafe()
+
+    def _on_block(self, samples):
+        if self.recorder is not None:
+            self.recorder.mic(samples)
+        # At the wire rate the resampler passes the block through without a copy
+        state = self.gate.process(self.uplink_resampler.process(samples))
+        if state == "open":
+            self._loop.call_soon_threadsafe(self._on_speech_onset, time.monotonic())
+        elif state == "close":
+            self._loop.call_soon_threadsafe(self._on_speech_end, time.monotonic())
+
+    def _on_first_played(self):
+        # Output callback: stamp here, record on the loop
+        self._loop.call_soon_threadsafe(self.tracer.mark, "first_played", time.monotonic())
+
+    # --- event loop side ---
+
+    def _on_speech_onset(self, t):
+        # Nothing of the new utterance has been sent yet, so this is the last turn's tail
+        self._mark_uplink()
+        self.tracer.speech_onset(t, self.sink.underruns)
+        self.log("\n🎤 [Speech detected...]", flush=True)
+        if self.sink.is_active():
+            asyncio.create_task(self.barge_in())
+
+    def _on_speech_end(self, t):
+        self.tracer.mark_last("mic_close", t)
+        # Send the trailing partial frame now instead of waiting for the next onset
+        if self.sender is not None:
+            self.sender.flush()
+
+    def _finish_turn(self, turn):
+        if self.tracer.current is turn:
+            self._mark_uplink()
+            self.tracer.finish(self.sink.underruns)
+
+    def _mark_uplink(self):
+        if self.sender is not None and self.sender.last_sent_at is not None:
+            self.tracer.mark_last("last_uplink", self.sender.last_sent_at)
+
+    async def barge_in(self):
+        """Interrupt the assistant: silence playback, cancel the reply, truncate what was unheard."""
+        if not self.sink.is_active():
+            return
+        turn = self.turn
+        played_ms = self.sink.flush()
+        # Deltas of the cancelled response may still be in flight; drop them
+        turn['cancelled_response'] = turn['response_id']
+        if turn['response_active']:
+            await self.ws.send(json.dumps({"type": "response.cancel"}))
+        if turn['item_id']:
+            await self.ws.send(json.dumps({
+                "type": "conversation.item.truncate",
+                "item_id": turn['item_id'],
+                "content_index": 0,
+                "audio_end_ms": played_ms,
+            }))
+        self.log(f"\n✋ [Interrupted after {played_ms} ms of playback]", flush=True)
+
+    def _build_dispatcher(self):
+        d = EventDispatcher()
+        d.on_raw("response.audio.delta")(self._on_audio_delta)
+        d.on("response.audio.done")(self._on_audio_done)
+        d.on("response.created")(self._on_response_created)
+        d.on("response.text.delta")(self._on_text_delta)
+        d.on("response.audio_transcript.delta")(self._on_text_delta)
+        d.on("response.audio_transcript.done")(self._on_transcript_done)
+        d.on("conversation.item.input_audio_transcription.completed")(self._on_user_transcript)
+        d.on("conversation.item.input_audio_transcription.failed")(self._on_transcription_failed)
+        d.on("input_audio_buffer.committed")(self._on_audio_committed)
+        d.on("input_audio_buffer.speech_started")(self._on_speech_started)
+        d.on("input_audio_buffer.speech_stopped")(self._on_speech_stopped)
+        d.on("session.created")(self._on_session_created)
+        d.on("session.updated")(self._on_session_updated)
+        d.on("response.done")(self._on_response_done)
+        d.on("error")(self._on_error)
+        return d
+
+    async def receiver(self):
+        """Receives messages and dispatches them to the handlers below."""
+        dispatch = self.dispatcher.dispatch
+        try:
+            async for msg in self.ws:
+                result = dispatch(msg)
+                # Handlers that need to talk back to the server return a coroutine
+                if result is not None:
+                    await result
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.log(f"⚠ Receiver error: {e}")
+
+    # Track when assistant starts/stops speaking
+    def _on_audio_delta(self, raw):
+        # Fast path: slice the fields out of the raw text, never building a dict
+        # around the base64 payload. Escaped values fall back to a full parse.
+        audio_b64 = slice_field(raw, "delta")
+        if audio_b64 is None:
+            data = loads(raw)
+            audio_b64 = data.get("delta")
+            response_id, item_id = data.get("response_id"), data.get("item_id")
+        else:
+            response_id, item_id = slice_field(raw, "response_id"), slice_field(raw, "item_id")
+
+        turn = self.turn
+        if turn['cancelled_response'] and response_id == turn['cancelled_response']:
+            return
+        if self._turn_started is not None:
+            self.latencies.append(time.monotonic() - self._turn_started)
+            self._turn_started = None
+        if not self._delta_seen:
+            self._delta_seen = True
+            tracer = self.tracer
+            tracer.mark("first_delta")
+            # Queue depths as the reply starts: leftover playback, unsent mic audio
+            tracer.sample(playback_depth_ms=len(self.sink.ring) * 1000 / self.sink.samplerate,
+                          uplink_queue=self.sender.queue.qsize(),
+                          uplink_ring_ms=len(self.uplink.ring) * 1000 / self.uplink.samplerate)
+        turn['item_id'] = item_id
+        if not audio_b64:
+            return
+        if self.output_codec.name == "pcm16":
+            self.sink.feed_b64(audio_b64, item_id)
+        else:
+            self.sink.feed(self.output_codec.decode(base64.b64decode(audio_b64)), item_id)
+
+    def _on_audio_done(self, data):
+        self.sink.mark_done()
+
+    def _on_response_created(self, data):
+        self.turn['response_id'] = data.get("response", {}).get("id")
+        self.turn['response_active'] = True
+        self._delta_seen = False
+        self.tracer.mark("response_created")
+
+    # ✅ Assistant text output and audio transcript
+    def _on_text_delta(self, data):
+        delta = data.get("delta", "")
+        if delta:
+            if not self._assistant_responding:
+                self.log(f"\n🤖 [Assistant]: ", end="", flush=True)
+                self._assistant_responding = True
+            self.log(f"{delta}", end="", flush=True)
+            self._assistant_text += delta
+
+    def _on_transcript_done(self, data):
+        transcript = data.get("transcript", "").strip()
+        if transcript and not self._assistant_responding and not self._assistant_text:
+            self.log(f"\n🤖 [Assistant]: {transcript}")
+
+    # ✅ User speech transcription
+    def _on_user_transcript(self, data):
+        transcript = (data.get("transcript") or "").strip()
+        if transcript:
+            self.log(f"\n{'-' * 60}")
+            self.log(f"- YOU: {transcript}")
+            self.log(f"{'-' * 60}")
+        # An empty transcript still gets an answer, just without passages
+        self._respond_to(data.get("item_id"), transcript)
+
+    def _on_transcription_failed(self, data):
+        error_msg = (data.get("error") or {}).get("message", "")
+        self.log(f"\n⚠ Transcription failed: {error_msg}")
+        self._respond_to(data.get("item_id"), "")
+
+    def _on_audio_committed(self, data):
+        if self.retriever is None:
+            return
+        item_id = data.get("item_id")
+        self._awaiting_transcript[item_id] = self._loop.call_later(
+            self.transcript_timeout_s, self._on_transcript_timeout, item_id)
+
+    def _on_transcript_timeout(self, item_id):
+        if self._awaiting_transcript.pop(item_id, None) is None:
+            return
+        self.log(f"\n⚠ No transcript after {self.transcript_timeout_s:.1f} s, answering without retrieval")
+        self._answered_without_transcript.add(item_id)
+        asyncio.create_task(self._augment_and_respond(""))
+
+    def _respond_to(self, item_id, transcript):
+        if self.retriever is None:
+            return
+        handle = self._awaiting_transcript.pop(item_id, None)
+        if handle is not None:
+            handle.cancel()
+        elif item_id in self._answered_without_transcript:
+            # The timeout already answered this turn
+            self._answered_without_transcript.discard(item_id)
+            return
+        # A task, not a returned coroutine: the receiver keeps reading meanwhile
+        asyncio.create_task(self._augment_and_respond(transcript))
+
+    async def _augment_and_respond(self, transcript):
+        passages = []
+        if transcript:
+            try:
+                passages = await self.retriever.lookup(transcript)
+            except Exception as e:
+                self.log(f"\n⚠ Retrieval failed: {e}")
+        ws = self.ws
+        if ws is None:
+            # Disconnected meanwhile; the turn is gone with the old conversation
+            return
+        if passages:
+            context = "\n\n".join(passages)
+            await ws.send(json.dumps({
+                "type": "conversation.item.create",
+                "item": {
+                    "type": "message",
+                    "role": "system",
+                    "content": [{
+                        "type": "input_text",
+                        "text": f"Relevant information for the user's last message:\n\n{context}",
+                    }],
+                },
+            }))
+        await ws.send(json.dumps({"type": "response.create"}))
+
+    # Status events
+    def _on_speech_started(self, data):
+        self.log("\n\n👂 Listening...", flush=True)
+        return self.barge_in()
+
+    def _on_speech_stopped(self, data):
+        self.log("⚙️  Processing...", flush=True)
+        self._turn_started = self.sender.last_sent_at
+        self.tracer.mark("speech_stopped")
+
+    def _on_session_created(self, data):
+        self.log("\n" + "=" * 60)
+        self.log("✅ Session established")
+
+    def _on_session_updated(self, data):
+        self._session_updated.set()
+        self.log("✅ Transcription enabled")
+        self.log("=" * 60)
+        self.log("\n🎙️ Start speaking now...\n")
+
+    def _on_response_done(self, data):
+        self.turn['response_active'] = False
+        tracer = self.tracer
+        if tracer.enabled and data.get("response", {}).get("id") != self.turn['cancelled_response']:
+            tracer.mark("response_done")
+            # The turn ends once the reply has played out (or at the next onset)
+            remaining = len(self.sink.ring) / self.sink.samplerate + self.sink.target / self.sink.samplerate
+            self._loop.call_later(remaining + 0.25, self._finish_turn, tracer.current)
+        if self._assistant_responding:
+            self.log("\n")  # Add spacing after response
+            self._assistant_responding = False
+            self._assistant_text = ""
+
+    def _on_error(self, data):
+        error_msg = data.get("error", {}).get("message", "")
+        if "buffer" not in error_msg.lower():
+            self.log(f"\n❌ Error: {error_msg}")
+
+    def stats(self):
+        return {
+            "uplink": self.uplink.stats.snapshot(),
+            "uplink_dropped": self.uplink_dropped + (self.sender.dropped if self.sender else 0),
+            "vad_pass_ratio": self.gate.pass_ratio(),
+            "playback": self.sink.stats(),
+            "latencies": list(self.latencies),
+            "retrieval": self.retriever.stats() if self.retriever else None,
+            "trace": self.tracer.summary(),
+            "ready": list(self.ready_times),
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,396 @@
+"""Compact record/replay log of a realtime session.
+
+A log is an append-only binary file plus an index next to it (``<path>.idx``).
+Each record in the log is a 13-byte header (kind, seconds since the recorder
+started, payload size) followed by the payload:
+
+* ``META``: JSON with the mic rate, the wire formats (``input_audio_format``,
+  ``output_audio_format``) and whatever the caller wants to keep;
+* ``IN`` / ``OUT``: a server event / client event, as the JSON text sent;
+* ``IN_AUDIO`` / ``OUT_AUDIO``: ``response.audio.delta`` and
+  ``input_audio_buffer.append`` events, with the base64 audio cut out of the
+  JSON and stored as the raw wire bytes, int16 or G.711 (3/4 of the size,
+  and no base64 decode on replay);
+* ``MIC``: raw int16 mic blocks at the device rate, before the VAD.
+
+The index holds one fixed-size entry (offset, time, kind, size) per record, so
+a reader can seek without scanning. It is only a cache: ``SessionLog``
+rebuilds it from the log when it is missing.
+
+Replay memory-maps the log. ``LogMicSource`` feeds the recorded mic audio to a
+``RealtimeSession`` and ``serve_replay`` plays the recorded server events to it
+over a local WebSocket, both at the recorded pace or ``speed`` times faster,
+so an incident can be rerun without the network or a sound device:
+
+    SESSION_LOG=incident.rtlog python client.py
+    python session_log.py info incident.rtlog
+    python session_log.py replay incident.rtlog --speed 4
+"""
+import argparse
+import asyncio
+import base64
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import websockets
+
+from events import field_span, peek_type
+from wire_codec import get_codec
+
+MAGIC = b"RTLOG1\n"
+META, IN, OUT, MIC, IN_AUDIO, OUT_AUDIO = range(6)
+KIND_NAMES = ("meta", "in", "out", "mic", "in_audio", "out_audio")
+
+RECORD = struct.Struct("<BdI")      # kind, t, payload size
+AUDIO = struct.Struct("<II")        # JSON envelope size, where the base64 value goes
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("t", "<f8"), ("kind", "u1"), ("size", "<u4")])
+
+# Events whose base64 audio is stored as raw PCM, and the field holding it
+AUDIO_FIELDS = {"response.audio.delta": (IN_AUDIO, "delta"),
+                "input_audio_buffer.append": (OUT_AUDIO, "audio")}
+
+
+def _split_audio(raw, key):
+    """``(envelope, split, pcm_bytes)`` for an audio event, or None if it can't be cut cleanly."""
+    span = field_span(raw, key)
+    if span is None or span[0] == span[1]:
+        return None
+    start, end = span
+    envelope = raw[:start] + raw[end:]
+    return envelope.encode("utf-8"), len(raw[:start].encode("utf-8")), base64.b64decode(raw[start:end])
+
+
+class SessionRecorder:
+    """Appends a session's events and mic audio to ``path``.
+
+    ``mic`` is called from the audio thread and only copies into a buffer under
+    a lock; the file is written from the event loop (``inbound`` / ``outbound``
+    flush once ``flush_bytes`` are pending) and on ``close``.
+    """
+
+    def __init__(self, path, meta=None, flush_bytes=256 * 1024):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.t0 = time.monotonic()
+        self._file = open(path, "wb")
+        self._index = open(path + ".idx", "wb")
+        self._file.write(MAGIC)
+        self._written = len(MAGIC)
+        self._buf = bytearray()
+        self._idx = bytearray()
+        self._lock = threading.Lock()
+        self.records = 0
+        # Size of the logged events as JSON text, for comparison
+        self.json_bytes = 0
+        meta = dict(meta or {})
+        # Audio records hold the raw wire bytes, so the reader needs the formats
+        config = meta.get("session_config", {})
+        for key in ("input_audio_format", "output_audio_format"):
+            meta.setdefault(key, config.get(key, "pcm16"))
+        self._append(META, [json.dumps(meta).encode("utf-8")])
+
+    def _append(self, kind, parts, t=None):
+        t = (time.monotonic() if t is None else t) - self.t0
+        size = sum(len(p) for p in parts)
+        with self._lock:
+            offset = self._written + len(self._buf)
+            self._buf += RECORD.pack(kind, t, size)
+            for part in parts:
+                self._buf += part
+            self._idx += struct.pack("<QdBI", offset, t, kind, size)
+            self.records += 1
+
+    def _event(self, raw, kind):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        self.json_bytes += len(raw)
+        audio = AUDIO_FIELDS.get(peek_type(raw))
+        split = audio and _split_audio(raw, audio[1])
+        if split:
+            envelope, at, pcm = split
+            self._append(audio[0], [AUDIO.pack(len(envelope), at), envelope, pcm])
+        else:
+            self._append(kind, [raw.encode("utf-8")])
+        if len(self._buf) >= self.flush_bytes:
+            self.flush()
+
+    def inbound(self, raw):
+        self._event(raw, IN)
+
+    def outbound(self, raw):
+        self._event(raw, OUT)
+
+    def mic(self, samples):
+        """Audio-thread side: copy one mic block (int16) into the pending buffer."""
+        self._append(MIC, [samples.tobytes()])
+
+    def flush(self):
+        with self._lock:
+            buf, self._buf = self._buf, bytearray()
+            idx, self._idx = self._idx, bytearray()
+            self._written += len(buf)
+        self._file.write(buf)
+        self._index.write(idx)
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._index.close()
+            self._file = None
+
+    def wrap(self, ws):
+        return RecordingSocket(ws, self)
+
+    def stats(self):
+        return {"records": self.records, "bytes": self._written + len(self._buf),
+                "json_bytes": self.json_bytes}
+
+
+class RecordingSocket:
+    """WebSocket proxy that logs every message sent and received."""
+
+    def __init__(self, ws, recorder):
+        self._ws = ws
+        self._recorder = recorder
+
+    async def send(self, message):
+        self._recorder.outbound(message)
+        await self._ws.send(message)
+
+    def __aiter__(self):
+        return self._receive()
+
+    async def _receive(self):
+        async for message in self._ws:
+            self._recorder.inbound(message)
+            yield message
+
+    def __getattr__(self, name):
+        return getattr(self._ws, name)
+
+
+class SessionLog:
+    """Read side: the log memory-mapped, records located through the index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a session log")
+        index_path = path + ".idx"
+        entries = os.path.getsize(index_path) // INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+        if entries:
+            self.index = np.memmap(index_path, dtype=INDEX_DTYPE, mode="r", shape=(entries,))
+        else:
+            self.index = self._scan()
+        # A crash can leave the index ahead of the log; ignore torn records
+        ends = self.index["offset"] + RECORD.size + self.index["size"]
+        self.index = self.index[ends <= len(self.data)]
+        self.meta = json.loads(bytes(self.payload(0))) if len(self.index) else {}
+        config = self.meta.get("session_config", {})
+        formats = {key: self.meta.get(key, config.get(key, "pcm16"))
+                   for key in ("input_audio_format", "output_audio_format")}
+        # Server audio is in the output format, the client's appends in the input one
+        self.codecs = {IN_AUDIO: get_codec(formats["output_audio_format"]),
+                       OUT_AUDIO: get_codec(formats["input_audio_format"])}
+
+    def _scan(self):
+        entries = []
+        offset = len(MAGIC)
+        while offset + RECORD.size <= len(self.data):
+            kind, t, size = RECORD.unpack_from(self.data, offset)
+            entries.append((offset, t, kind, size))
+            offset += RECORD.size + size
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def payload(self, i):
+        """Payload of record ``i`` as a memoryview into the map (no copy)."""
+        entry = self.index[i]
+        start = int(entry["offset"]) + RECORD.size
+        return memoryview(self.data)[start:start + int(entry["size"])]
+
+    def event(self, i):
+        """Record ``i`` as the JSON text that went over the wire."""
+        kind = self.index[i]["kind"]
+        payload = self.payload(i)
+        if kind in (IN_AUDIO, OUT_AUDIO):
+            size, at = AUDIO.unpack_from(payload)
+            envelope = bytes(payload[AUDIO.size:AUDIO.size + size])
+            audio = base64.b64encode(payload[AUDIO.size + size:])
+            return (envelope[:at] + audio + envelope[at:]).decode("utf-8")
+        return bytes(payload).decode("utf-8")
+
+    def pcm(self, i):
+        """Int16 samples of a MIC record or of an audio event's audio.
+
+        MIC records and pcm16 audio are viewed in place; G.711 audio is
+        decoded into a new array.
+        """
+        kind = self.index[i]["kind"]
+        start = int(self.index[i]["offset"]) + RECORD.size
+        size = int(self.index[i]["size"])
+        if kind in (IN_AUDIO, OUT_AUDIO):
+            envelope = AUDIO.unpack_from(self.data, start)[0]
+            start += AUDIO.size + envelope
+            size -= AUDIO.size + envelope
+            codec = self.codecs[kind]
+            if codec.name != "pcm16":
+                return codec.decode(self.data[start:start + size])
+        return np.frombuffer(self.data, dtype=np.int16, count=size // 2, offset=start)
+
+    def select(self, *kinds):
+        """Indices of the records of the given kinds, in order."""
+        return np.flatnonzero(np.isin(self.index["kind"], kinds))
+
+    def start_time(self):
+        """Time of the first server event, which replay aligns to."""
+        inbound = self.select(IN, IN_AUDIO)
+        return float(self.index["t"][inbound[0]]) if len(inbound) else 0.0
+
+    def stats(self):
+        out = {"records": len(self), "bytes": len(self.data),
+               "duration_s": float(self.index["t"][-1]) if len(self) else 0.0}
+        for kind, name in enumerate(KIND_NAMES):
+            mask = self.index["kind"] == kind
+            out[name] = (int(mask.sum()), int(self.index["size"][mask].sum()))
+        return out
+
+    def close(self):
+        self.index = None
+        try:
+            self.data.close()
+        except BufferError:
+            # PCM views handed out by pcm() are still alive; the map goes with them
+            pass
+        self._file.close()
+
+
+class LogMicSource:
+    """Audio source for ``RealtimeSession`` that replays a log's mic blocks on their timestamps."""
+
+    def __init__(self, log, speed=1.0):
+        self.log = log
+        self.speed = speed
+        self.samplerate = log.meta.get("mic_rate", 24000)
+        self._task = None
+
+    def open(self, on_block):
+        self._task = asyncio.get_running_loop().create_task(self._run(on_block))
+
+    async def _run(self, on_block):
+        loop = asyncio.get_running_loop()
+        base = self.log.start_time()
+        start = loop.time()
+        times = self.log.index["t"]
+        for i in self.log.select(MIC):
+            delay = start + (times[i] - base) / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            on_block(self.log.pcm(i))
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+async def serve_replay(log, host="127.0.0.1", port=0, speed=1.0):
+    """WebSocket server that sends each client the log's server events on their timestamps.
+
+    What the client sends is read and counted (``server.received``) but does
+    not change the script.
+    """
+    inbound = log.select(IN, IN_AUDIO)
+    base = log.start_time()
+    # Reconstructed once, so replay cost is sending, not rebuilding JSON
+    script = [(float(log.index["t"][i]) - base, log.event(i)) for i in inbound]
+
+    async def handler(ws):
+        async def drain():
+            async for _ in ws:
+                server.received += 1
+
+        reader = asyncio.create_task(drain())
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            for t, message in script:
+                delay = start + t / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await ws.send(message)
+            await asyncio.sleep(1.0)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            reader.cancel()
+
+    server = await websockets.serve(handler, host, port, max_size=None)
+    server.received = 0
+    return server
+
+
+async def replay(path, speed=1.0, verbose=True):
+    """Run a headless ``RealtimeSession`` against a log's recorded mic audio and server events."""
+    from audio_format import WIRE_RATE
+    from audio_io import NullSink
+    from session import RealtimeSession
+
+    log = SessionLog(path)
+    server = await serve_replay(log, speed=speed)
+    port = server.sockets[0].getsockname()[1]
+    config = log.meta.get("session_config", {})
+    codec = log.codecs[IN_AUDIO]
+    session = RealtimeSession(f"ws://127.0.0.1:{port}", {}, LogMicSource(log, speed),
+                              NullSink(samplerate=WIRE_RATE, source_rate=codec.rate), config,
+                              verbose=verbose)
+    script_s = (float(log.index["t"][-1]) - log.start_time()) / speed
+    task = asyncio.create_task(session.run())
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(task, timeout=script_s + 5)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    server.close()
+    log.close()
+    return session, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or replay a session log")
+    parser.add_argument("command", choices=["info", "replay"])
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        log = SessionLog(args.path)
+        stats = log.stats()
+        print(f"📼 {args.path}: {stats['records']} records, {stats['bytes'] / 1024:.1f} KiB, "
+              f"{stats['duration_s']:.1f} s")
+        for name in KIND_NAMES:
+            count, size = stats[name]
+            print(f"   {name:<10}{count:>8} records {size / 1024:>10.1f} KiB")
+        log.close()
+        return
+
+    from client import print_summary
+
+    session, elapsed = asyncio.run(replay(args.path, args.speed))
+    print(f"\n📼 Replayed {args.path} at {args.speed:g}x in {elapsed:.1f} s")
+    print_summary(session)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,148 @@
 import os
 import base64
+import io
+import json
+import time
+import wave
 from openai import OpenAI
 from dotenv import load_dotenv
 import simpleaudio as sa
 
+from history import ConversationHistory, chat_summarizer
+from semantic_cache import SemanticCache
+
 load_dotenv()
 client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
+SYSTEM_PROMPT = "you are NOA, an AI assistant that responds with both text and audio."
+
+# Conversation sent with each request: recent turns verbatim, older ones folded
+# into a summary once they pass the budget (see history.py)
+HISTORY_BUDGET_TOKENS = 1500
+HISTORY_KEEP_RECENT = 4
+SUMMARY_MODEL = "gpt-4o-mini"
+
+# Replies are played from memory; set to a directory to also keep them as WAV files
+ARCHIVE_DIR = os.getenv("NOA_ARCHIVE_DIR")
+
+# SEMANTIC_CACHE=1: a question close enough to one answered in the last
+# SEMANTIC_CACHE_TTL_S is answered with the same text and audio, without a
+# request (see semantic_cache.py; needs sentence-transformers). The earlier
+# answer was given in another context, so keep the threshold strict.
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_TTL_S = 3600
+SEMANTIC_CACHE_SIZE = 10_000
+# Cached replies keep their WAV (~48 KB per second of speech); past this many
+# MB of audio the least recently used answers are evicted
+SEMANTIC_CACHE_AUDIO_MB = int(os.getenv("SEMANTIC_CACHE_AUDIO_MB", "64"))
+
+
+def play_wav_bytes(data):
+    """Start playing an in-memory WAV; returns the simpleaudio play object."""
+    with wave.open(io.BytesIO(data)) as wav:
+        frames = wav.readframes(wav.getnframes())
+        return sa.play_buffer(frames, wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+
+
+def archive_reply(data, counter):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with open(os.path.join(ARCHIVE_DIR, f"reply_{counter}.wav"), "wb") as f:
+        f.write(data)
+
+
+def print_summary(metrics, history, cache=None):
+    cached = cache.stats() if cache is not None else {"lookups": 0}
+    if cached["lookups"]:
+        print(f"🧠 Answer cache: {cached['hit_ratio']:.0%} of {cached['lookups']} questions answered from it, "
+              f"{cached['saved_s']:.1f} s of requests saved (lookup p50 {cached['p50_ms']:.1f} ms)")
+    if not metrics:
+        return
+    sizes = sorted(m["request_bytes"] for m in metrics)
+    latencies = sorted(m["latency_s"] for m in metrics)
+    stats = history.stats()
+    print(
+        f"📏 {len(metrics)} turns: request {sizes[len(sizes) // 2] / 1024:.1f} KiB median "
+        f"(max {sizes[-1] / 1024:.1f} KiB), latency {latencies[len(latencies) // 2]:.2f} s median "
+        f"(max {latencies[-1]:.2f} s), {stats['compactions']} compactions, "
+        f"{stats['folded']} turns summarized"
+    )
+
+
 def main():
     print("OpenAI Chatbot (type 'exit' to quit)\n")
-    history = []
+    history = ConversationHistory(
+        SYSTEM_PROMPT,
+        budget_tokens=HISTORY_BUDGET_TOKENS,
+        keep_recent=HISTORY_KEEP_RECENT,
+        summarize=chat_summarizer(client, SUMMARY_MODEL),
+    )
+    cache = None
+    if SEMANTIC_CACHE:
+        import models
+
+        models.prewarm("minilm")
+        cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE,
+                              ttl_s=SEMANTIC_CACHE_TTL_S, max_audio_bytes=SEMANTIC_CACHE_AUDIO_MB * 2**20)
+    metrics = []
     counter = 1
 
     while True:
         user_input = input("You: ")
         if user_input.strip().lower() in ["exit", "quit"]:
+            print_summary(metrics, history, cache)
             print("Goodbye")
             break
 
-        history.append({"role": "user", "content": user_input})
+        history.add("user", user_input)
+        hit = query = None
+        if cache is not None:
+            hit, query = cache.lookup(user_input)
+        if hit is not None:
+            print(f"NOA (cached, similarity {hit['score']:.2f}): {hit['answer']}\n")
+            history.add("assistant", hit["answer"])
+            play_obj = play_wav_bytes(hit["audio"])
+            history.compact()
+            play_obj.wait_done()
+            continue
+        messages = history.messages()
 
+        start = time.perf_counter()
         completion = client.chat.completions.create(
             model="gpt-4o-audio-preview",
             modalities=["text", "audio"],
             audio={"voice": "alloy", "format": "wav"},
-            messages=[
-                {"role": "system", "content": "you are NOA, an AI assistant that responds with both text and audio."
-                
-                },
-                *history
-            ]
+            messages=messages,
         )
+        latency = time.perf_counter() - start
 
         message = completion.choices[0].message
-        text = message.content[0].text
+        # With audio output the reply text comes as the audio transcript
+        text = message.content or message.audio.transcript
         print(f"NOA: {text}\n")
 
-        # save and play audio
-        audio_data = message.audio.data
-        wav_bytes = base64.b64decode(audio_data)
-        filename = f"reply_{counter}.wav"
-        with open(filename, "wb") as f:
-            f.write(wav_bytes)
+        wav_bytes = base64.b64decode(message.audio.data)
+        turn = {
+            "request_bytes": len(json.dumps(messages).encode("utf-8")),
+            "history_tokens": history.tokens(),
+            "latency_s": latency,
+            "audio_bytes": len(wav_bytes),
+        }
+        metrics.append(turn)
+        print(f"📏 request {turn['request_bytes'] / 1024:.1f} KiB (~{turn['history_tokens']} tokens), "
+              f"reply in {latency:.2f} s")
 
-        wave_obj = sa.WaveObject.from_wave_file(filename)
-        play_obj = wave_obj.play()
-        play_obj.wait_done()
+        if cache is not None:
+            cache.put(query, text, audio=wav_bytes, cost_s=latency)
+        if ARCHIVE_DIR:
+            archive_reply(wav_bytes, counter)
+        play_obj = play_wav_bytes(wav_bytes)
 
         counter += 1
-        history.append({"role": "assistant", "content": text})
+        history.add("assistant", text)
+        # Summarize while the reply plays, so it never delays the next request
+        history.compact()
+        play_obj.wait_done()
 
 if __name__ == "__main__":
     main()
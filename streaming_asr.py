@@ -0,0 +1,227 @@
+"""Incremental transcription of a live audio stream with faster-whisper.
+
+Audio goes into a preallocated window that holds only the not yet committed
+part of the stream. Each step re-decodes that window, and words that two
+consecutive decodes agree on (local agreement) are committed and their audio
+trimmed away, so decode cost follows the unstable tail instead of a fixed
+10 s window. Silent frames with nothing pending are skipped without decoding,
+and a run of silence after speech finalizes the utterance.
+
+``TranscriptionPipeline`` connects a capture thread to a transcriber through
+a bounded queue, batching frames when decoding falls behind.
+"""
+import collections
+import queue
+import time
+
+import numpy as np
+
+from vad import block_rms
+
+
+def _norm(word):
+    return word.strip().lower().strip(".,!?;:\"'")
+
+
+class StreamingTranscriber:
+    """Feeds float32 mono frames to ``model`` and reports partial and final text.
+
+    ``on_event(kind, text)`` is called with ``kind`` "partial" for the current
+    unstable hypothesis and "final" for newly committed text. ``max_window_s``
+    bounds the pending audio: when the window fills up, everything pending is
+    decoded and committed as if the utterance had ended.
+    """
+
+    def __init__(self, model, on_event, samplerate=16000, min_chunk_s=1.0, max_window_s=15.0,
+                 vad_threshold=0.01, silence_commit_s=0.8, prompt_chars=200, beam_size=1):
+        self.model = model
+        self.on_event = on_event
+        self.samplerate = samplerate
+        self.min_chunk = int(min_chunk_s * samplerate)
+        self.vad_threshold = vad_threshold
+        self.silence_commit = int(silence_commit_s * samplerate)
+        self.prompt_chars = prompt_chars
+        self.beam_size = beam_size
+
+        self.window = np.zeros(int(max_window_s * samplerate), dtype=np.float32)
+        self.pending = 0          # samples in the window
+        self.undecoded = 0        # samples appended since the last decode
+        self.silence = 0          # trailing silent samples
+        self.hypothesis = []      # (start_s, end_s, word) of the last decode, window-relative
+        self.committed = ""
+
+        self.audio_s = 0.0
+        self.decode_s = 0.0
+        self.decodes = 0
+        self.skipped_frames = 0
+
+    def feed(self, frame):
+        """Add one frame; decodes when enough new audio has arrived."""
+        frame = np.asarray(frame, dtype=np.float32).reshape(-1)
+        self.audio_s += len(frame) / self.samplerate
+        silent = block_rms(frame) < self.vad_threshold
+
+        if silent and self.pending == 0:
+            self.skipped_frames += 1
+            return
+        self.silence = self.silence + len(frame) if silent else 0
+
+        if self.pending + len(frame) > len(self.window):
+            self.finish()
+        frame = frame[-len(self.window):]
+        self.window[self.pending:self.pending + len(frame)] = frame
+        self.pending += len(frame)
+        self.undecoded += len(frame)
+
+        if self.silence >= self.silence_commit:
+            self.finish()
+        elif self.undecoded >= self.min_chunk and not silent:
+            self._step()
+
+    def finish(self):
+        """End of utterance or stream: decode what is pending and commit all of it."""
+        if self.pending:
+            if self.undecoded:
+                self.hypothesis = self._decode()
+            self._commit_all()
+
+    def _decode(self):
+        start = time.perf_counter()
+        segments, _ = self.model.transcribe(
+            self.window[:self.pending],
+            beam_size=self.beam_size,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=self.committed[-self.prompt_chars:] or None,
+        )
+        words = [(w.start, w.end, w.word) for s in segments for w in (s.words or [])]
+        self.decode_s += time.perf_counter() - start
+        self.decodes += 1
+        self.undecoded = 0
+        return words
+
+    def _step(self):
+        words = self._decode()
+        # Local agreement: the common prefix of the last two decodes is stable
+        stable = 0
+        for old, new in zip(self.hypothesis, words):
+            if _norm(old[2]) != _norm(new[2]):
+                break
+            stable += 1
+        self.hypothesis = words
+        if stable:
+            self._commit(stable)
+        if self.hypothesis:
+            self.on_event("partial", "".join(w[2] for w in self.hypothesis).strip())
+
+    def _commit(self, count):
+        words, self.hypothesis = self.hypothesis[:count], self.hypothesis[count:]
+        text = "".join(w[2] for w in words).strip()
+        if text:
+            self.committed = f"{self.committed} {text}".strip()
+            self.on_event("final", text)
+        # Trim the committed audio; the remaining hypothesis is shifted to match
+        cut_s = words[-1][1]
+        cut = min(int(cut_s * self.samplerate), self.pending)
+        self.window[:self.pending - cut] = self.window[cut:self.pending]
+        self.pending -= cut
+        self.hypothesis = [(s - cut_s, e - cut_s, w) for s, e, w in self.hypothesis]
+
+    def _commit_all(self):
+        if self.hypothesis:
+            self._commit(len(self.hypothesis))
+        self.pending = 0
+        self.undecoded = 0
+        self.silence = 0
+        self.hypothesis = []
+
+    def stats(self):
+        return {
+            "audio_s": self.audio_s,
+            "decode_s": self.decode_s,
+            "rtf": self.decode_s / self.audio_s if self.audio_s else 0.0,
+            "decodes": self.decodes,
+            "skipped_frames": self.skipped_frames,
+        }
+
+
+_STOP = object()
+
+
+class TranscriptionPipeline:
+    """Bounded hand-off from a capture thread to a ``StreamingTranscriber``.
+
+    The producer calls ``put`` with each captured frame and never blocks: when
+    ``max_frames`` are already queued the oldest one is dropped. The consumer
+    (``run``) blocks on the queue, and when it has fallen behind it drains every
+    queued frame into one decode. Frames captured more than ``max_lag_s`` ago
+    are skipped, so under CPU pressure the transcript jumps forward instead of
+    trailing further and further behind the mic.
+    """
+
+    def __init__(self, transcriber, max_frames=8, max_lag_s=3.0):
+        self.transcriber = transcriber
+        self.queue = queue.Queue(max_frames)
+        self.max_lag_s = max_lag_s
+        self.frames = 0
+        self.batches = 0
+        self.dropped = 0
+        self.skipped = 0
+        # Seconds from capture of the newest frame in a batch to the end of its decode
+        self.lags = collections.deque(maxlen=1024)
+
+    def put(self, frame):
+        """Queue a frame captured just now; safe to call from the capture thread."""
+        item = (time.monotonic(), frame)
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def stop(self):
+        """Let ``run`` finish the queued frames and return."""
+        self.queue.put(_STOP)
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            if not batch:
+                continue
+
+            oldest = time.monotonic() - self.max_lag_s
+            fresh = [item for item in batch if item[0] >= oldest]
+            self.skipped += len(batch) - len(fresh)
+            if not fresh:
+                continue
+            self.frames += len(fresh)
+            self.batches += 1
+            frames = [np.asarray(frame, dtype=np.float32).reshape(-1) for _, frame in fresh]
+            self.transcriber.feed(frames[0] if len(frames) == 1 else np.concatenate(frames))
+            self.lags.append(time.monotonic() - fresh[-1][0])
+        self.transcriber.finish()
+
+    def stats(self):
+        lags = list(self.lags) or [0.0]
+        return {
+            "frames": self.frames,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "lag_p50_s": float(np.percentile(lags, 50)),
+            "lag_max_s": max(lags),
+        }
@@ -0,0 +1,107 @@
+"""Local stub of the OpenAI REST endpoints used by this project, for benchmarks.
+
+Point a component at it with ``OPENAI_BASE_URL=http://127.0.0.1:9000/v1``.
+``STUB_LATENCY_MS`` adds artificial upstream processing time (before the
+first byte, for streaming endpoints). ``/v1/audio/speech`` streams raw 24 kHz
+int16 PCM (``response_format="pcm"``) at ``STUB_TTS_PACE`` times real time,
+``/v1/audio/transcriptions`` returns a fixed transcript and
+``/v1/chat/completions`` answers with ``STUB_REPLY``, streamed word by word
+every ``STUB_TOKEN_MS`` when asked to stream.
+
+    uvicorn stub_openai:app --port 9000
+"""
+import asyncio
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "50"))
+STUB_TTS_PACE = float(os.getenv("STUB_TTS_PACE", "4"))
+TOKEN_TTL_S = 60
+TTS_RATE = 24000
+TTS_CHUNK_MS = 100
+TTS_MS_PER_WORD = 350
+STUB_TRANSCRIPT = os.getenv("STUB_TRANSCRIPT", "How do I sleep better?")
+STUB_REPLY = os.getenv("STUB_REPLY", (
+    "Keep a regular schedule, even on weekends. Avoid screens for an hour before bed. "
+    "Keep the bedroom cool, dark and quiet. If you cannot sleep, get up and read until you feel tired."
+))
+STUB_TOKEN_MS = float(os.getenv("STUB_TOKEN_MS", "30"))
+
+app = FastAPI()
+ids = itertools.count(1)
+
+
+@app.post("/v1/realtime/sessions")
+async def realtime_sessions(body: dict):
+    await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    n = next(ids)
+    return {
+        "id": f"sess_stub_{n}",
+        "object": "realtime.session",
+        "model": body.get("model"),
+        "voice": body.get("voice"),
+        "modalities": body.get("modalities"),
+        "client_secret": {
+            "value": f"ek_stub_{n}",
+            "expires_at": int(time.time()) + TOKEN_TTL_S,
+        },
+    }
+
+
+def _speech_chunks(text):
+    """A tone as long as ``text`` would take to say, in TTS_CHUNK_MS chunks."""
+    duration_ms = max(500, len(text.split()) * TTS_MS_PER_WORD)
+    t = np.arange(TTS_RATE * TTS_CHUNK_MS // 1000) / TTS_RATE
+    chunk = (np.sin(2 * np.pi * 220 * t) * 4000).astype("<i2").tobytes()
+    return [chunk] * (duration_ms // TTS_CHUNK_MS)
+
+
+@app.post("/v1/audio/speech")
+async def audio_speech(body: dict):
+    chunks = _speech_chunks(body.get("input", ""))
+
+    async def stream():
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(TTS_CHUNK_MS / 1000 / STUB_TTS_PACE)
+
+    return StreamingResponse(stream(), media_type="audio/pcm")
+
+
+@app.post("/v1/audio/transcriptions")
+async def audio_transcriptions(request: Request):
+    # The multipart upload is read but not parsed; every recording says the same thing
+    await request.body()
+    await asyncio.sleep(STUB_LATENCY_MS / 1000)
+    return {"text": STUB_TRANSCRIPT}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict):
+    n = next(ids)
+    base = {"id": f"chatcmpl-stub-{n}", "created": int(time.time()), "model": body.get("model")}
+    if not body.get("stream"):
+        await asyncio.sleep(STUB_LATENCY_MS / 1000 + len(STUB_REPLY.split()) * STUB_TOKEN_MS / 1000)
+        return {**base, "object": "chat.completion", "choices": [{
+            "index": 0, "finish_reason": "stop",
+            "message": {"role": "assistant", "content": STUB_REPLY},
+        }]}
+
+    async def stream():
+        await asyncio.sleep(STUB_LATENCY_MS / 1000)
+        for i, word in enumerate(STUB_REPLY.split(" ")):
+            delta = {"content": word if i == 0 else " " + word}
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(STUB_TOKEN_MS / 1000)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
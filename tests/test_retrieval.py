@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pytest
+
+from retrieval import EmbeddingStore
+
+DIM = 16
+
+
+def encode(texts):
+    """Deterministic stand-in for MiniLM: a random unit vector seeded by the text."""
+    rows = []
+    for text in texts:
+        seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:4], "little")
+        rows.append(np.random.default_rng(seed).normal(size=DIM))
+    return np.array(rows, dtype=np.float32)
+
+
+def crash_before_docs(store, texts, monkeypatch):
+    """Run ``store.add`` but fail when it opens docs.jsonl, after the vectors were appended."""
+    real_open = open
+
+    def failing_open(path, *args, **kwargs):
+        if str(path).endswith("docs.jsonl"):
+            raise OSError("simulated crash")
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", failing_open)
+    with pytest.raises(OSError):
+        store.add(texts)
+    monkeypatch.undo()
+
+
+def test_crash_between_appends_does_not_shift_later_documents(tmp_path, monkeypatch):
+    store = EmbeddingStore(str(tmp_path), encode=encode)
+    store.add(["alpha", "beta"])
+    crash_before_docs(store, ["orphan one", "orphan two"], monkeypatch)
+
+    store = EmbeddingStore(str(tmp_path), encode=encode)
+    assert len(store) == 2
+    assert os.path.getsize(tmp_path / "vectors.bin") == 2 * DIM * 4
+    store.add(["gamma", "delta"])
+    for text in ["alpha", "beta", "gamma", "delta"]:
+        score, doc = store.search([text], k=1)[0][0]
+        assert doc["text"] == text
+        assert score == pytest.approx(1.0, abs=1e-5)
+
+    # The orphans were never stored, so adding them again embeds them
+    assert store.add(["orphan one"]) == 1
+
+
+def test_torn_docs_line_is_dropped(tmp_path):
+    store = EmbeddingStore(str(tmp_path), encode=encode)
+    store.add(["alpha", "beta"])
+    with open(tmp_path / "vectors.bin", "ab") as f:
+        f.write(np.zeros(DIM, dtype=np.float32).tobytes())
+    with open(tmp_path / "docs.jsonl", "a") as f:
+        f.write(json.dumps({"hash": "x", "text": "torn"})[:10])
+
+    store = EmbeddingStore(str(tmp_path), encode=encode)
+    assert [doc["text"] for doc in store.docs] == ["alpha", "beta"]
+    store.add(["gamma"])
+    assert store.search(["gamma"], k=1)[0][0][1]["text"] == "gamma"
+
+
+def test_missing_vectors_raise(tmp_path):
+    store = EmbeddingStore(str(tmp_path), encode=encode)
+    store.add(["alpha", "beta"])
+    with open(tmp_path / "vectors.bin", "r+b") as f:
+        f.truncate(DIM * 4)
+    with pytest.raises(ValueError):
+        EmbeddingStore(str(tmp_path), encode=encode)
@@ -1,7 +1,9 @@
-from sentence_transformers import SentenceTransformer, util
+import os
 
-# Load a pre-trained Sentence Transformer model
-model = SentenceTransformer('all-MiniLM-L6-v2')
+from retrieval import EmbeddingStore
+
+# Persistent embedding store (see retrieval.py)
+INDEX_DIR = os.getenv("INDEX_DIR", "kb_index")
 
 # Additional queries
 test_queries = [
@@ -31,21 +33,23 @@ documents = [
     "Quantum computing uses qubits to perform complex calculations faster."
 ]
 
-doc_embeddings = model.encode(documents, convert_to_tensor=True)
-
-# Example of running semantic search for multiple queries
-for query in test_queries:
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    results = util.semantic_search(query_embedding, doc_embeddings, top_k=1)
-    most_similar_doc = documents[results[0][0]['corpus_id']]
-    print(f"Query: {query}\nMost similar document: {most_similar_doc}\n")
 
+def main():
+    # Documents already in the index are not embedded again
+    store = EmbeddingStore(INDEX_DIR)
+    added = store.add(documents)
+    print(f"Index: {len(store)} documents ({added} new)\n")
 
+    # All queries are embedded in one batch and searched together
+    for query, results in zip(test_queries, store.search(test_queries, k=1)):
+        score, doc = results[0]
+        print(f"Query: {query}\nMost similar document: {doc['text']}\n")
 
-query_embedding = model.encode(query)
+    query = test_queries[-1]
+    # Find the most similar document to the query
+    score, doc = store.search([query], k=1)[0][0]
+    print(f"Most similar document to the query: \"{doc['text']}\"")
 
 
-# Find the most similar document to the query
-results = util.semantic_search(query_embedding, doc_embeddings, top_k=1)
-most_similar_doc = documents[results[0][0]['corpus_id']]
-print(f"Most similar document to the query: \"{most_similar_doc}\"")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
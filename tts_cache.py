@@ -0,0 +1,199 @@
+"""Content-addressed cache of synthesized speech.
+
+Entries are keyed by a hash of (text, voice, model, format), so the same phrase
+said with the same settings is synthesized once. Two tiers:
+
+* memory: an LRU of int16 arrays, bounded by ``memory_bytes``;
+* disk (optional): one raw little-endian 16-bit PCM file per entry in
+  ``directory``, bounded by ``disk_bytes`` and evicted least recently used
+  first. A disk hit is opened as a read-only memory map, so playing it copies
+  straight from the page cache into the player's ring; the map then stands
+  in for the entry in the memory tier.
+
+Recency on disk is the file's mtime, bumped on every hit, so the eviction
+order survives restarts. Files are written to a temporary name and renamed,
+so a crash never leaves a truncated entry behind.
+"""
+import collections
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+
+class TtsCache:
+    """Two-tier (memory, disk) cache of TTS audio as int16 PCM.
+
+    ``get`` returns the samples or None; ``put`` stores what was synthesized
+    on a miss. Both are safe to call from several threads (``prewarm`` fills
+    the cache from one). ``samplerate`` only feeds the seconds of audio served
+    reported by ``stats``. With no ``directory`` and ``memory_bytes=0`` nothing
+    is kept, which benchmarks use as the uncached baseline.
+    """
+
+    def __init__(self, directory=None, memory_bytes=32 * 2**20, disk_bytes=512 * 2**20,
+                 samplerate=24000):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.samplerate = samplerate
+        self.memory = collections.OrderedDict()   # key -> int16 array, oldest first
+        self.disk = collections.OrderedDict()     # key -> file size, oldest first
+        self.memory_used = 0
+        self.disk_used = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self.served_samples = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    @staticmethod
+    def key(text, voice, model, fmt="pcm"):
+        return hashlib.sha256("\x1f".join((text.strip(), voice, model, fmt)).encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pcm")
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pcm"):
+                st = os.stat(os.path.join(self.directory, name))
+                entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_used += size
+        self._evict_disk()
+
+    def _find(self, key):
+        """``(tier, samples)`` without touching the hit counters; call under the lock."""
+        pcm = self.memory.get(key)
+        if pcm is not None:
+            self.memory.move_to_end(key)
+            return "memory", pcm
+        if key in self.disk:
+            path = self._path(key)
+            try:
+                pcm = np.memmap(path, dtype="<i2", mode="r")
+                os.utime(path)
+            except (OSError, ValueError):
+                # Deleted or emptied behind our back
+                self.disk_used -= self.disk.pop(key)
+                return None, None
+            self.disk.move_to_end(key)
+            self._remember(key, pcm)
+            return "disk", pcm
+        return None, None
+
+    def get(self, key):
+        """The cached samples for ``key`` (an int16 array or memory map), or None.
+
+        Cheap enough for an event loop: a memory hit is a dict lookup and a
+        disk hit maps the file and touches its mtime without reading it.
+        ``put`` writes a file and belongs in a thread there.
+        """
+        with self._lock:
+            tier, pcm = self._find(key)
+            if tier == "memory":
+                self.memory_hits += 1
+            elif tier == "disk":
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                return None
+            self.served_samples += len(pcm)
+            return pcm
+
+    def put(self, key, data):
+        """Store raw int16 PCM bytes (or an int16 array) under ``key``; returns the samples."""
+        if isinstance(data, np.ndarray):
+            pcm = data.astype("<i2", copy=False)
+        else:
+            pcm = np.frombuffer(data, dtype="<i2", count=len(data) // 2)
+        if not len(pcm):
+            return pcm
+        written = False
+        if self.directory and pcm.nbytes <= self.disk_bytes:
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(pcm.tobytes())
+            os.replace(tmp, path)
+            written = True
+        with self._lock:
+            if written:
+                self.disk_used += pcm.nbytes - self.disk.pop(key, 0)
+                self.disk[key] = pcm.nbytes
+                self._evict_disk()
+            self._remember(key, pcm)
+        return pcm
+
+    def _remember(self, key, pcm):
+        if pcm.nbytes > self.memory_bytes:
+            return
+        old = self.memory.pop(key, None)
+        if old is not None:
+            self.memory_used -= old.nbytes
+        self.memory[key] = pcm
+        self.memory_used += pcm.nbytes
+        while self.memory_used > self.memory_bytes:
+            _, dropped = self.memory.popitem(last=False)
+            self.memory_used -= dropped.nbytes
+            self.memory_evictions += 1
+
+    def _evict_disk(self):
+        while self.disk_used > self.disk_bytes and self.disk:
+            key, size = self.disk.popitem(last=False)
+            self.disk_used -= size
+            self.disk_evictions += 1
+            try:
+                # Open memory maps of the file stay valid on POSIX
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def prewarm(self, texts, synthesize, voice, model, fmt="pcm"):
+        """Make sure stock phrases are cached, on a background thread; returns the thread.
+
+        Phrases on disk are mapped into the memory tier, missing ones are
+        synthesized with ``synthesize(text)`` (raw int16 PCM bytes). Neither
+        counts as a hit or a miss.
+        """
+        def run():
+            for text in texts:
+                key = self.key(text, voice, model, fmt)
+                with self._lock:
+                    tier, _ = self._find(key)
+                if tier is not None:
+                    continue
+                try:
+                    self.put(key, synthesize(text))
+                except Exception as e:
+                    print(f"⚠ TTS prewarm of {text!r} failed: {e}")
+
+        thread = threading.Thread(target=run, name="tts-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "served_s": self.served_samples / self.samplerate,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_used,
+            "disk_entries": len(self.disk),
+            "disk_bytes": self.disk_used,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+        }
@@ -0,0 +1,192 @@
+"""Coalescing uplink for the realtime client.
+
+The audio callback only copies PCM into a preallocated ring. Codec, base64 and
+JSON encoding happen once per flush on the event loop, so a session sends one
+``input_audio_buffer.append`` per flush budget instead of one per device block.
+"""
+import asyncio
+import base64
+import json
+import time
+
+import numpy as np
+from websockets.exceptions import ConnectionClosed
+
+from ringbuffer import PcmRing
+
+
+class UplinkStats:
+    """Counters for what the uplink actually puts on the wire."""
+
+    def __init__(self):
+        self.frames = 0
+        self.pcm_bytes = 0
+        self.wire_bytes = 0
+        self.started = time.monotonic()
+
+    def record(self, pcm_bytes, wire_bytes):
+        self.frames += 1
+        self.pcm_bytes += pcm_bytes
+        self.wire_bytes += wire_bytes
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "frames": self.frames,
+            "frames_per_s": self.frames / elapsed,
+            "pcm_bytes": self.pcm_bytes,
+            "wire_bytes": self.wire_bytes,
+            "wire_bytes_per_s": self.wire_bytes / elapsed,
+        }
+
+
+class UplinkCoalescer:
+    """Collects mic PCM and hands out one append event per flush budget.
+
+    ``flush_ms`` is the time budget (40, 60, 100 ms ...). ``max_bytes`` optionally
+    caps the encoded payload per frame, whichever budget is smaller wins.
+    ``codec`` (``wire_codec``) encodes each frame; pcm16 when None.
+    """
+
+    def __init__(self, samplerate=24000, flush_ms=60, max_bytes=None, capacity_ms=2000, codec=None):
+        self.samplerate = samplerate
+        self.codec = codec
+        bytes_per_sample = codec.bytes_per_sample if codec is not None else 2
+        self.flush_samples = max(1, samplerate * flush_ms // 1000)
+        if max_bytes:
+            self.flush_samples = max(1, min(self.flush_samples, max_bytes // bytes_per_sample))
+        capacity = max(samplerate * capacity_ms // 1000, self.flush_samples * 2)
+        self.ring = PcmRing(capacity)
+        self._scratch = np.empty(self.flush_samples, dtype=np.int16)
+        self._due = False
+        self.stats = UplinkStats()
+
+    def push(self, samples):
+        """Audio-thread side: copy PCM into the ring.
+
+        Returns True only when a frame became due since the last ``pop_message``,
+        so the caller wakes the event loop once per frame rather than once per block.
+        """
+        self.ring.write(samples)
+        if not self._due and len(self.ring) >= self.flush_samples:
+            self._due = True
+            return True
+        return False
+
+    def ready(self):
+        return len(self.ring) >= self.flush_samples
+
+    def pop_message(self, partial=False):
+        """Encode one flush worth of audio into an append event, or return None.
+
+        With ``partial=True`` whatever is buffered is sent even if it is short of
+        the budget (used when the stream stops).
+        """
+        # Re-arm before reading so a push racing with this drain signals again
+        self._due = False
+        pending = len(self.ring)
+        if pending == 0 or (pending < self.flush_samples and not partial):
+            return None
+        n = self.ring.read_into(self._scratch)
+        payload = self._scratch[:n] if self.codec is None else self.codec.encode(self._scratch[:n])
+        audio_b64 = base64.b64encode(payload).decode("ascii")
+        message = json.dumps({"type": "input_audio_buffer.append", "audio": audio_b64})
+        self.stats.record(n * 2, len(message))
+        return message
+
+
+_STOP = object()
+
+
+class UplinkSender:
+    """Event-driven sender: the loop only wakes when a frame is due or on flush/stop.
+
+    Encoded frames go through a bounded outbound queue. When the socket stalls and
+    the queue is full, ``policy="drop_oldest"`` discards the oldest queued frame,
+    while ``policy="block"`` stops draining the coalescer so audio waits in its
+    fixed-size ring instead. Either way memory stays bounded.
+
+    A sender lives for one connection. Frames it had queued but not sent when
+    the socket dropped can be handed to the next one (``pending`` / ``backlog``).
+    """
+
+    POLICIES = ("drop_oldest", "block")
+
+    def __init__(self, ws, uplink, maxsize=16, policy="drop_oldest", backlog=()):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy!r}")
+        self.ws = ws
+        self.uplink = uplink
+        self.maxsize = maxsize
+        self.policy = policy
+        self.sent = 0
+        self.dropped = 0
+        self.last_sent_at = None
+        # Unbounded on purpose: the limit is enforced in _pump so the stop
+        # sentinel always fits.
+        self.queue = asyncio.Queue()
+        for message in backlog:
+            self.queue.put_nowait(message)
+        self._loop = asyncio.get_running_loop()
+        self._stopped = False
+
+    def notify_threadsafe(self):
+        """Audio-thread side: wake the loop to encode the frame that became due."""
+        self._loop.call_soon_threadsafe(self._pump)
+
+    def flush(self):
+        """Queue whatever is buffered, including a partial frame."""
+        self._pump(partial=True)
+
+    def drain_backlog(self):
+        """Queue everything the ring holds, e.g. audio buffered while reconnecting.
+
+        The ring's capacity bounds how much that is, so the queue limit is waived.
+        """
+        self._pump(partial=True, bounded=False)
+
+    def pending(self):
+        """Take the frames that were queued but never sent."""
+        messages = []
+        while not self.queue.empty():
+            message = self.queue.get_nowait()
+            if message is not _STOP:
+                messages.append(message)
+        return messages
+
+    def stop(self):
+        """Flush pending audio and let ``run`` exit once it has been sent."""
+        # The tail of the ring is bounded, so it may bypass the queue limit once
+        self._pump(partial=True, bounded=False)
+        self._stopped = True
+        self.queue.put_nowait(_STOP)
+
+    def _pump(self, partial=False, bounded=True):
+        while not self._stopped:
+            full = bounded and self.queue.qsize() >= self.maxsize
+            if full and self.policy == "block":
+                return
+            message = self.uplink.pop_message(partial)
+            if message is None:
+                return
+            if full:
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(message)
+
+    async def run(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is _STOP:
+                    break
+                await self.ws.send(message)
+                self.sent += 1
+                self.last_sent_at = time.monotonic()
+                if self.policy == "block" and self.uplink.ready():
+                    self._pump()
+        except (asyncio.CancelledError, ConnectionClosed):
+            # A closed socket is the session's to report (and reconnect)
+            pass
+        except Exception as e:
+            print(f"⚠ Sender error: {e}")
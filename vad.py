@@ -0,0 +1,90 @@
+"""Energy-based client-side VAD gate with pre-roll and hangover."""
+import numpy as np
+
+from ringbuffer import PcmRing
+
+
+def block_rms(samples):
+    """RMS of an int16 block, accumulated in float64 without a float copy of the block."""
+    n = len(samples)
+    if n == 0:
+        return 0.0
+    return float(np.sqrt(np.einsum("i,i->", samples, samples, dtype=np.float64) / n))
+
+
+class VadGate:
+    """Decides which mic blocks reach the uplink.
+
+    While closed, blocks only go into a short pre-roll ring. After ``onset_blocks``
+    consecutive blocks above ``threshold`` the gate opens and releases the pre-roll
+    followed by the current block, so the first syllable is not clipped. While
+    open everything passes until ``hangover_ms`` of trailing silence, then the
+    gate closes again.
+
+    Echo suppression: when ``echo_level`` is given it is called per block and
+    returns the current speaker output RMS; the threshold is raised to
+    ``echo_gain`` times that level so the assistant's own voice leaking into the
+    mic neither opens the gate nor triggers a false barge-in.
+
+    Runs on the audio thread: ``emit`` is called with the samples to send and no
+    memory is allocated per block.
+    """
+
+    def __init__(self, emit, samplerate=24000, threshold=300, preroll_ms=300,
+                 hangover_ms=600, onset_blocks=2, echo_level=None, echo_gain=1.0):
+        self.emit = emit
+        self.threshold = threshold
+        self.echo_level = echo_level
+        self.echo_gain = echo_gain
+        self.onset_blocks = onset_blocks
+        self.hangover_samples = samplerate * hangover_ms // 1000
+        self.preroll = PcmRing(max(1, samplerate * preroll_ms // 1000))
+        self._preroll_out = np.empty(self.preroll.capacity, dtype=np.int16)
+        self.is_open = False
+        self.last_energy = 0.0
+        self._loud_blocks = 0
+        self._silent_samples = 0
+        self.samples_in = 0
+        self.samples_sent = 0
+
+    def process(self, samples):
+        """Feed one block; returns "open" or "close" when the gate changes state, else None."""
+        energy = block_rms(samples)
+        self.last_energy = energy
+        threshold = self.threshold
+        if self.echo_level is not None:
+            threshold = max(threshold, self.echo_gain * self.echo_level())
+        loud = energy >= threshold
+        self.samples_in += len(samples)
+
+        if self.is_open:
+            self._send(samples)
+            if loud:
+                self._silent_samples = 0
+                return None
+            self._silent_samples += len(samples)
+            if self._silent_samples >= self.hangover_samples:
+                self.is_open = False
+                self._loud_blocks = 0
+                return "close"
+            return None
+
+        self._loud_blocks = self._loud_blocks + 1 if loud else 0
+        if self._loud_blocks < self.onset_blocks:
+            self.preroll.write(samples)
+            return None
+
+        self.is_open = True
+        self._silent_samples = 0
+        n = self.preroll.read_into(self._preroll_out)
+        if n:
+            self._send(self._preroll_out[:n])
+        self._send(samples)
+        return "open"
+
+    def _send(self, samples):
+        self.samples_sent += len(samples)
+        self.emit(samples)
+
+    def pass_ratio(self):
+        return self.samples_sent / self.samples_in if self.samples_in else 0.0
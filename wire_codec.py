@@ -0,0 +1,101 @@
+"""Audio codecs for the realtime API wire: pcm16 at 24 kHz, G.711 μ-law and A-law at 8 kHz.
+
+A codec turns int16 samples at its ``rate`` into the bytes that get base64'd
+into ``input_audio_buffer.append`` and back out of ``response.audio.delta``.
+G.711 is one byte per sample at 8 kHz, a sixth of pcm16's bytes per second.
+
+The G.711 codecs are lookup tables built once at import (the ITU G.711
+segment arithmetic, as in the reference ``g711.c``): encoding indexes a
+65536-entry byte table with the samples viewed as uint16, decoding indexes a
+256-entry int16 table with the bytes, so both are a single ``take``.
+
+Rate conversion to and from the device rate stays with the callers'
+``Resampler``; they ask the codec for its ``rate``.
+"""
+import numpy as np
+
+# Segment end points of the 14-bit (μ-law) and 13-bit (A-law) magnitudes
+_ULAW_SEG_END = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_ALAW_SEG_END = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+_ULAW_BIAS = 0x84
+_ULAW_CLIP = 8159
+
+
+def _ulaw_encode_table():
+    pcm = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    mag = np.minimum(np.abs(pcm), _ULAW_CLIP) + (_ULAW_BIAS >> 2)
+    seg = np.searchsorted(_ULAW_SEG_END, mag)
+    code = (seg << 4) | ((mag >> (seg + 1)) & 0xF)
+    return (np.where(seg >= 8, 0x7F, code) ^ mask).astype(np.uint8)
+
+
+def _ulaw_decode_table():
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0xF) << 3) + _ULAW_BIAS) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, _ULAW_BIAS - t, t - _ULAW_BIAS).astype(np.int16)
+
+
+def _alaw_encode_table():
+    pcm = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    mag = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(_ALAW_SEG_END, mag)
+    low = np.where(seg < 2, mag >> 1, mag >> np.maximum(seg, 1)) & 0xF
+    code = np.where(seg >= 8, 0x7F, (seg << 4) | low)
+    return (code ^ mask).astype(np.uint8)
+
+
+def _alaw_decode_table():
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = ((a & 0xF) << 4) + np.where(seg == 0, 8, 0x108)
+    t = np.where(seg > 1, t << np.maximum(seg - 1, 0), t)
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+
+class Pcm16:
+    """16-bit little-endian PCM at 24 kHz, the API's default format."""
+
+    name = "pcm16"
+    rate = 24000
+    bytes_per_sample = 2
+
+    def encode(self, pcm):
+        return pcm.astype("<i2", copy=False).tobytes()
+
+    def decode(self, data):
+        return np.frombuffer(data, dtype="<i2")
+
+
+class G711:
+    """G.711 at 8 kHz, one byte per sample, through the lookup tables."""
+
+    rate = 8000
+    bytes_per_sample = 1
+
+    def __init__(self, name, encode_table, decode_table):
+        self.name = name
+        self.encode_table = encode_table
+        self.decode_table = decode_table
+
+    def encode(self, pcm):
+        return self.encode_table.take(np.asarray(pcm, dtype=np.int16).view(np.uint16)).tobytes()
+
+    def decode(self, data):
+        return self.decode_table.take(np.frombuffer(data, dtype=np.uint8))
+
+
+CODECS = {
+    "pcm16": Pcm16(),
+    "g711_ulaw": G711("g711_ulaw", _ulaw_encode_table(), _ulaw_decode_table()),
+    "g711_alaw": G711("g711_alaw", _alaw_encode_table(), _alaw_decode_table()),
+}
+
+
+def get_codec(name):
+    """Codec for an ``input_audio_format`` / ``output_audio_format`` value."""
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown audio format: {name!r} (expected one of {', '.join(CODECS)})") from None